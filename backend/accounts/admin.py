@@ -1,5 +1,10 @@
+import json
 from django import forms
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.utils.functional import cached_property
 from django.contrib.auth.admin import UserAdmin, GroupAdmin as BaseGroupAdmin
 from django.contrib.auth.models import Group
 from django.utils.html import format_html
@@ -10,6 +15,82 @@ from .models import User, File
 from .validators import PasswordValidator
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: на PostgreSQL вместо точного COUNT(*)
+    использует оценку планировщика, если она превышает ESTIMATE_THRESHOLD.
+    Небольшие выборки по-прежнему считаются точно.
+    """
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        if connection.vendor != 'postgresql' or not hasattr(self.object_list, 'query'):
+            return super().count
+        estimate = self._estimate()
+        if estimate is None or estimate < self.ESTIMATE_THRESHOLD:
+            return super().count
+        return estimate
+
+    def _estimate(self):
+        queryset = self.object_list
+        try:
+            if not queryset.query.where:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                    return row[0] if row and row[0] >= 0 else None
+            plan = queryset.order_by().explain(format='json')
+            return int(json.loads(plan)[0]['Plan']['Plan Rows'])
+        except Exception:
+            return None
+
+
+class ScalableAdminMixin:
+    """Общие настройки списков админки для таблиц с миллионами строк."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class OwnerFilter(admin.SimpleListFilter):
+    """
+    Фильтр по владельцу через поле ввода имени пользователя вместо списка
+    всех пользователей, который на больших базах строится слишком долго.
+    """
+    title = 'owner'
+    parameter_name = 'owner__username'
+    template = 'admin/accounts/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(owner__username=self.value())
+        return queryset
+
+    def choices(self, changelist):
+        query_params = changelist.get_filters_params()
+        query_params.pop(self.parameter_name, None)
+        other_params = [
+            (key, value)
+            for key, values in query_params.items()
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield {
+            'value': self.value() or '',
+            'parameter_name': self.parameter_name,
+            'other_params': other_params,
+            'reset_url': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
 class CustomUserCreationForm(forms.ModelForm):
     password1 = forms.CharField(
         label="Password",
@@ -50,7 +131,7 @@ class CustomUserCreationForm(forms.ModelForm):
         return user
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ScalableAdminMixin, UserAdmin):
     add_form = CustomUserCreationForm
     form = forms.ModelForm
     fieldsets = (
@@ -77,6 +158,12 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('-date_joined',)
     filter_horizontal = ('groups', 'user_permissions')
     readonly_fields = ('date_joined', 'last_login')
+
+    def get_queryset(self, request):
+        # Группы и права подгружаются пачкой для всей страницы списка
+        return super().get_queryset(request).prefetch_related(
+            'groups__permissions', 'user_permissions'
+        )
     
     def get_group_names(self, obj):
         """
@@ -113,12 +200,16 @@ class CustomUserAdmin(UserAdmin):
     get_user_permissions_display.short_description = 'User Permissions'
 
 
-class GroupAdmin(BaseGroupAdmin):
+class GroupAdmin(ScalableAdminMixin, BaseGroupAdmin):
     list_display = ('name', 'get_user_count', 'user_actions')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(user_count=Count('user', distinct=True))
     
     def get_user_count(self, obj):
-        return obj.custom_user_set.count() 
+        return obj.user_count
     get_user_count.short_description = 'Users'
+    get_user_count.admin_order_field = 'user_count'
     
     def user_actions(self, obj):
         return format_html(
@@ -158,9 +249,8 @@ class GroupAdmin(BaseGroupAdmin):
             group = Group.objects.get(id=object_id)
             
             if action == 'remove_from_group' and user_ids:
-                users = User.objects.filter(id__in=user_ids)
-                for user in users:
-                    user.groups.remove(group)
+                # Одно удаление и одна синхронизация прав для всех выбранных пользователей
+                group.custom_user_set.remove(*User.objects.filter(id__in=user_ids))
             
             return redirect(reverse('admin:group-users', args=[object_id]))
         
@@ -169,11 +259,13 @@ class GroupAdmin(BaseGroupAdmin):
 
 # Админка для модели File
 @admin.register(File)
-class FileAdmin(admin.ModelAdmin):
+class FileAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('original_name', 'owner', 'size', 'upload_date', 'file_type', 'shared_link', 'is_public')
-    list_filter = ('file_type', 'upload_date', 'owner', 'is_public')
+    list_filter = ('file_type', 'upload_date', OwnerFilter, 'is_public')
+    list_select_related = ('owner',)
+    autocomplete_fields = ('owner',)
     search_fields = ('original_name', 'comment', 'shared_link')
-    readonly_fields = ('upload_date', 'size', 'file_type', 'shared_link')
+    readonly_fields = ('upload_date', 'size', 'sha256', 'file_type', 'shared_link')
 
     def has_delete_permission(self, request, obj=None):
         # Можно настроить права на удаление файлов, если нужно
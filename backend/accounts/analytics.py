@@ -0,0 +1,211 @@
+import logging
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from .models import File, StorageUsageRollup, StorageUsageDaily
+
+logger = logging.getLogger(__name__)
+
+def _bucket(state):
+    """Ключ агрегата для состояния файла или None, если данных недостаточно."""
+    upload_date = state.get('upload_date')
+    if state.get('owner_id') is None or upload_date is None:
+        return None
+    return {
+        'user_id': state['owner_id'],
+        'file_type': state.get('file_type') or File.FileType.OTHER,
+        'month': timezone.localdate(upload_date).replace(day=1),
+        'is_public': bool(state.get('is_public')),
+        'is_deleted': bool(state.get('is_deleted')),
+    }
+
+
+def _increment(model, lookup, create=True, **deltas):
+    """Атомарно прибавляет deltas к строке агрегата, создавая ее при необходимости."""
+    changes = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**changes)
+
+
+def _apply_bucket(state, sign, create=True):
+    bucket = _bucket(state)
+    if bucket is None:
+        return
+    size = state.get('size') or 0
+    _increment(StorageUsageRollup, bucket, create=create, bytes=sign * size, files_count=sign)
+
+
+def _apply_daily(user_id, added=0, removed=0, files_added=0, files_removed=0, create=True):
+    _increment(
+        StorageUsageDaily,
+        {'user_id': user_id, 'day': timezone.localdate()},
+        create=create,
+        bytes_added=added,
+        bytes_removed=removed,
+        files_added=files_added,
+        files_removed=files_removed,
+    )
+
+
+def record_file_saved(instance, created):
+    """Переносит файл между агрегатами после сохранения."""
+    new = instance._tracked_state()
+    if created:
+        _apply_bucket(new, +1)
+        if not new.get('is_deleted'):
+            _apply_daily(new['owner_id'], added=new.get('size') or 0, files_added=1)
+        return
+
+    old = dict(new, **getattr(instance, '_loaded_values', {}))
+    if _bucket(old) == _bucket(new) and old.get('size') == new.get('size'):
+        return
+
+    _apply_bucket(old, -1)
+    _apply_bucket(new, +1)
+
+    was_live, is_live = not old.get('is_deleted'), not new.get('is_deleted')
+    old_size, new_size = old.get('size') or 0, new.get('size') or 0
+    if was_live and not is_live:
+        _apply_daily(new['owner_id'], removed=old_size, files_removed=1)
+    elif is_live and not was_live:
+        _apply_daily(new['owner_id'], added=new_size, files_added=1)
+    elif is_live and new_size != old_size:
+        delta = new_size - old_size
+        _apply_daily(new['owner_id'], added=max(delta, 0), removed=max(-delta, 0))
+
+
+def record_file_deleted(instance):
+    """Убирает удаленный из БД файл из агрегатов."""
+    state = dict(instance._tracked_state(), **getattr(instance, '_loaded_values', {}))
+    _apply_bucket(state, -1, create=False)
+    if not state.get('is_deleted') and state.get('owner_id') is not None:
+        _apply_daily(state['owner_id'], removed=state.get('size') or 0, files_removed=1)
+
+
+def rebuild(user_ids=None):
+    """
+    Пересчитывает агрегаты по таблице File (для начального заполнения
+    и после массовых операций в обход сигналов). Дневная история
+    восстанавливается только по датам загрузки живых файлов.
+    """
+    files = File.objects.all()
+    rollups = StorageUsageRollup.objects.all()
+    daily = StorageUsageDaily.objects.all()
+    if user_ids is not None:
+        files = files.filter(owner_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+        daily = daily.filter(user_id__in=user_ids)
+
+    buckets = files.annotate(month=TruncMonth('upload_date', tzinfo=timezone.get_current_timezone())).values(
+        'owner_id', 'file_type', 'month', 'is_public', 'is_deleted'
+    ).annotate(total=Sum('size'), count=Count('id')).order_by()
+
+    days = files.filter(is_deleted=False).annotate(
+        day=TruncDate('upload_date', tzinfo=timezone.get_current_timezone())
+    ).values('owner_id', 'day').annotate(total=Sum('size'), count=Count('id')).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        daily.delete()
+        StorageUsageRollup.objects.bulk_create([
+            StorageUsageRollup(
+                user_id=row['owner_id'],
+                file_type=row['file_type'],
+                month=_as_date(row['month']),
+                is_public=row['is_public'],
+                is_deleted=row['is_deleted'],
+                bytes=row['total'] or 0,
+                files_count=row['count'],
+            )
+            for row in buckets.iterator()
+        ], batch_size=1000)
+        StorageUsageDaily.objects.bulk_create([
+            StorageUsageDaily(
+                user_id=row['owner_id'],
+                day=row['day'],
+                bytes_added=row['total'] or 0,
+                files_added=row['count'],
+            )
+            for row in days.iterator()
+        ], batch_size=1000)
+
+
+def _as_date(value):
+    return timezone.localdate(value) if hasattr(value, 'hour') else value
+
+
+def _totals(rows):
+    return {
+        'bytes': sum(row.bytes for row in rows),
+        'files': sum(row.files_count for row in rows),
+    }
+
+
+def _group(rows, key):
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return groups
+
+
+def user_storage_analytics(user, days=30):
+    """
+    Сводка использования хранилища пользователем. Читает только таблицы
+    агрегатов, поэтому время ответа не зависит от количества файлов.
+    """
+    rows = list(StorageUsageRollup.objects.filter(user=user).exclude(files_count=0))
+    live = [row for row in rows if not row.is_deleted]
+
+    by_type = _group(live, lambda row: row.file_type)
+    by_month = _group(live, lambda row: row.month)
+    by_visibility = _group(live, lambda row: 'public' if row.is_public else 'private')
+    by_state = _group(rows, lambda row: 'deleted' if row.is_deleted else 'live')
+
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    daily = {
+        row.day: row
+        for row in StorageUsageDaily.objects.filter(user=user, day__gte=start)
+    }
+
+    history = []
+    bytes_used = _totals(live)['bytes']
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        row = daily.get(day)
+        added = row.bytes_added if row else 0
+        removed = row.bytes_removed if row else 0
+        history.append({
+            'date': day.isoformat(),
+            'bytes_used': bytes_used,
+            'bytes_added': added,
+            'bytes_removed': removed,
+        })
+        bytes_used -= added - removed
+    history.reverse()
+
+    return {
+        'user': user.pk,
+        'storage_quota': user.storage_quota,
+        'totals': _totals(live),
+        'by_file_type': [
+            dict(file_type=key, **_totals(group)) for key, group in sorted(by_type.items())
+        ],
+        'by_month': [
+            dict(month=key.strftime('%Y-%m'), **_totals(group)) for key, group in sorted(by_month.items())
+        ],
+        'by_visibility': {
+            key: _totals(by_visibility.get(key, [])) for key in ('public', 'private')
+        },
+        'by_state': {
+            key: _totals(by_state.get(key, [])) for key in ('live', 'deleted')
+        },
+        'history': history,
+    }
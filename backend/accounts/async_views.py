@@ -0,0 +1,200 @@
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import AnonRateThrottle
+from . import changes, events, metrics
+from .exceptions import ChangeCursorExpired, PasswordHasherBusy
+from .hashing import acheck_password, amake_password
+from .models import User
+from .serializers import AuthUserSerializer, RegisterSerializer
+
+logger = logging.getLogger(__name__)
+
+INVALID_CREDENTIALS = 'Неверные учетные данные или пользователь неактивен.'
+
+# Асинхронные вход и регистрация для запуска под ASGI. Хеширование паролей
+# выполняется в пуле процессов (hashing.py), поэтому цикл событий не блокируется
+# на PBKDF2; при заполненной очереди пула запрос сразу получает 503.
+# Ответы совпадают с /api/auth/login/ и /api/auth/register/.
+
+
+def _error(detail, status, headers=None):
+    return JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=status, headers=headers)
+
+
+def _busy():
+    return _error(str(PasswordHasherBusy.default_detail), PasswordHasherBusy.status_code, {'Retry-After': '1'})
+
+
+def _read_data(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+async def _throttled(request):
+    throttle = AnonRateThrottle()
+    allowed = await sync_to_async(throttle.allow_request)(request, None)
+    return None if allowed else _error('Слишком много запросов.', 429, {'Retry-After': str(int(throttle.wait() or 1))})
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    throttled = await _throttled(request)
+    if throttled:
+        return throttled
+
+    data = _read_data(request)
+    if not data or not data.get('username') or not data.get('password'):
+        return _error({'non_field_errors': [INVALID_CREDENTIALS]}, 400)
+
+    user = await User.objects.filter(username=data['username']).afirst()
+    try:
+        valid, new_hash = await acheck_password(data['password'], user.password if user else None)
+    except PasswordHasherBusy:
+        return _busy()
+
+    if not valid or not user.is_active:
+        return _error({'non_field_errors': [INVALID_CREDENTIALS]}, 400)
+
+    if new_hash:
+        await User.objects.filter(pk=user.pk).aupdate(password=new_hash)
+    token, _created = await Token.objects.aget_or_create(user=user)
+
+    return JsonResponse({'user': AuthUserSerializer(user).data, 'token': token.key})
+
+
+@csrf_exempt
+@require_POST
+async def register_view(request):
+    throttled = await _throttled(request)
+    if throttled:
+        return throttled
+
+    data = _read_data(request)
+    if data is None:
+        return _error('Некорректное тело запроса.', 400)
+
+    serializer = RegisterSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return _error(serializer.errors, 400)
+
+    try:
+        password_hash = await amake_password(serializer.validated_data['password'])
+    except PasswordHasherBusy:
+        return _busy()
+
+    @sync_to_async
+    def create():
+        with transaction.atomic():
+            return serializer.save(password_hash=password_hash)
+
+    user = await create()
+    logger.info(f"User registered via async endpoint: {user.username}")
+    return JsonResponse({'user': AuthUserSerializer(user).data, 'token': user.auth_token.key}, status=201)
+
+
+# Поток событий Server-Sent Events (accounts/events.py). EventSource в браузере
+# не передает заголовки, поэтому в параметре ?ticket= принимается короткоживущий
+# билет (POST /api/events/ticket/), а постоянный токен — только в заголовке.
+
+
+async def _authenticate(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        token = await Token.objects.select_related('user').filter(key=header[len('Token '):]).afirst()
+        return token.user if token and token.user.is_active else None
+
+    user_id = events.ticket_user_id(request.GET.get('ticket', ''))
+    if user_id is None:
+        return None
+    return await User.objects.filter(pk=user_id, is_active=True).afirst()
+
+
+def _replay(user, last_event_id):
+    """
+    Начальные события соединения: изменения после Last-Event-ID из журнала,
+    снимок квоты и событие sync с курсором, от которого продолжится поток.
+    Если пропущено больше страницы журнала или курсор устарел, вместо
+    изменений отправляется reset — клиент заново загружает список файлов.
+    """
+    initial = []
+    try:
+        since = int(last_event_id) if last_event_id else None
+        if since is not None and since < 0:
+            raise ValueError(last_event_id)
+        if since is not None:
+            # Без задержки CHANGE_FEED_SETTLE_SECONDS: запоздавшие записи придут
+            # в поток, на который клиент уже подписан (повторы безопасны)
+            cursor, has_more, entries = changes.changes_since(
+                user, since, settings.CHANGE_FEED_PAGE_SIZE, settle=False
+            )
+            if has_more:
+                raise ChangeCursorExpired()
+            initial.extend(events.file_event(None, file_id, action) for file_id, action, _file in entries)
+    except (ValueError, ChangeCursorExpired):
+        since = None
+        initial.append({'event': 'reset', 'data': {}})
+    if since is None:
+        cursor = changes.latest_cursor(user)
+
+    quota = events.quota_event(user.pk)
+    if quota is not None:
+        initial.append(quota)
+    initial.append({'id': cursor, 'event': 'sync', 'data': {'cursor': cursor}})
+    return initial
+
+
+async def _stream(user, last_event_id):
+    broker = events.get_broker()
+    # Подписка до чтения журнала: изменения, зафиксированные во время чтения, не теряются
+    subscription = broker.subscribe(user.pk)
+    metrics.EVENT_STREAMS.inc()
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        for event in await sync_to_async(_replay)(user, last_event_id):
+            yield events.encode(event)
+        # Открытый поток не должен удерживать подключение к БД
+        await sync_to_async(connections.close_all)()
+
+        while True:
+            event = await subscription.get(settings.EVENTS_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ': ping\n\n'
+            elif event is events.OVERFLOW:
+                break
+            else:
+                yield events.encode(event)
+    finally:
+        broker.unsubscribe(subscription)
+        metrics.EVENT_STREAMS.dec()
+
+
+@require_GET
+async def events_view(request):
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI каждое соединение заняло бы поток сервера на все время работы вкладки
+        return _error('Поток событий доступен только при запуске под ASGI.', 501)
+
+    user = await _authenticate(request)
+    if user is None:
+        return _error('Недопустимый или истекший билет.', 401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(_stream(user, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
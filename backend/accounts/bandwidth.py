@@ -0,0 +1,178 @@
+import time
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ограничение скорости передачи файлов в байтах в секунду (token bucket).
+#
+# Корзина хранится в кеше Django одним числом — моментом (в микросекундах),
+# когда она снова станет полной (алгоритм GCRA). Передача каждого блока
+# атомарно сдвигает этот момент на размер блока и ждет, если корзина пуста,
+# поэтому состояние общее для всех процессов при общем кеше (REDIS_URL).
+# Одновременные передачи одной корзины получают блоки по очереди запросов,
+# и каждая из N передач получает около 1/N скорости.
+#
+# Корзины: скачивания пользователя, скачивания по публичной ссылке и загрузки
+# пользователя. Нулевая скорость отключает ограничение. Асинхронные ответы
+# (ASGI) обращаются к кешу через асинхронный API и не блокируют цикл событий.
+
+BUCKET_KEY = 'bandwidth:{}'
+# Ключ простаивающей корзины удаляется из кеша; отсутствующая корзина полна
+BUCKET_TIMEOUT = 3600
+# incr не продлевает время жизни ключа, и непрерывно занятая корзина исчезла бы
+# через BUCKET_TIMEOUT, снова став полной. Момент наполнения занятой корзины
+# не отстает от часов, поэтому ключ продлевается, когда этот момент переходит
+# границу REFRESH_US — примерно раз в BUCKET_TIMEOUT / 2, а не на каждом блоке.
+REFRESH_US = BUCKET_TIMEOUT // 2 * 1_000_000
+# Байты, списываемые за одно обращение к кешу (FileResponse читает блоками по 4 КБ)
+QUANTUM = 64 * 1024
+
+
+def _now_us():
+    return int(time.time() * 1_000_000)
+
+
+class TokenBucket:
+    """Корзина со средней скоростью rate байт/с и запасом burst байт."""
+
+    def __init__(self, scope, rate, burst):
+        self.key = BUCKET_KEY.format(scope)
+        self.rate = rate
+        # Запас в единицах времени: за сколько микросекунд корзина наполняется полностью
+        self.tolerance_us = int(max(burst, 0) * 1_000_000 / rate) if rate > 0 else 0
+
+    def _cost(self, amount):
+        return int(amount * 1_000_000 / self.rate)
+
+    def _idle(self, full_at, cost, now):
+        # Корзина простаивала и полна. Одновременная передача может
+        # перезаписать значение — это лишь чуть больше запаса, не блокировка
+        return full_at is None or full_at - cost < now
+
+    def _expiring(self, full_at, cost):
+        return full_at // REFRESH_US != (full_at - cost) // REFRESH_US
+
+    def _delay(self, full_at, now):
+        return max(0, full_at - now - self.tolerance_us) / 1_000_000
+
+    def consume(self, amount):
+        """Списывает amount байт и возвращает, сколько секунд нужно подождать перед передачей."""
+        now = _now_us()
+        cost = self._cost(amount)
+        try:
+            full_at = cache.incr(self.key, cost)
+        except ValueError:
+            full_at = None
+        if self._idle(full_at, cost, now):
+            full_at = now + cost
+            cache.set(self.key, full_at, BUCKET_TIMEOUT)
+        elif self._expiring(full_at, cost):
+            cache.touch(self.key, BUCKET_TIMEOUT)
+        return self._delay(full_at, now)
+
+    async def aconsume(self, amount):
+        """consume для асинхронных ответов: обращения к кешу не блокируют цикл событий."""
+        now = _now_us()
+        cost = self._cost(amount)
+        try:
+            full_at = await cache.aincr(self.key, cost)
+        except ValueError:
+            full_at = None
+        if self._idle(full_at, cost, now):
+            full_at = now + cost
+            await cache.aset(self.key, full_at, BUCKET_TIMEOUT)
+        elif self._expiring(full_at, cost):
+            await cache.atouch(self.key, BUCKET_TIMEOUT)
+        return self._delay(full_at, now)
+
+
+class Throttle:
+    """Набор корзин одной передачи; блок ждет самую медленную корзину."""
+
+    def __init__(self, direction, buckets):
+        self.direction = direction
+        self.buckets = [bucket for bucket in buckets if bucket.rate > 0]
+
+    def __bool__(self):
+        return bool(self.buckets)
+
+    def _waited(self, delay):
+        if delay > 0:
+            metrics.BANDWIDTH_WAIT.labels(direction=self.direction).inc(delay)
+        return delay
+
+    def delay(self, amount):
+        """Списывает amount байт и возвращает паузу в секундах."""
+        return self._waited(max(bucket.consume(amount) for bucket in self.buckets))
+
+    async def adelay(self, amount):
+        """delay для асинхронных ответов (FileRegion.ablocks)."""
+        return self._waited(max([await bucket.aconsume(amount) for bucket in self.buckets]))
+
+    def wait(self, amount):
+        delay = self.delay(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ThrottledFile:
+    """
+    Файл для FileResponse, отдающий данные со скоростью корзин.
+    Метода fileno нет намеренно: иначе сервер (wsgi.file_wrapper) отправил бы
+    файл через sendfile в обход ограничения.
+    """
+
+    def __init__(self, file, throttle):
+        self.file = file
+        self.throttle = throttle
+        self.pending = 0
+
+    @property
+    def name(self):
+        return self.file.name
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.pending += len(data)
+        if self.pending >= QUANTUM:
+            self.throttle.wait(self.pending)
+            self.pending = 0
+        return data
+
+    def seekable(self):
+        return self.file.seekable()
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def throttled(file, throttle):
+    """Файл с ограничением скорости или сам файл, если ограничение не задано."""
+    return ThrottledFile(file, throttle) if throttle else file
+
+
+def download_throttle(user):
+    return Throttle('download', [
+        TokenBucket(f'user:{user.pk}:download', settings.BANDWIDTH_USER_RATE, settings.BANDWIDTH_USER_BURST),
+    ])
+
+
+def link_throttle(shared_link):
+    return Throttle('public', [
+        TokenBucket(f'link:{shared_link}', settings.BANDWIDTH_LINK_RATE, settings.BANDWIDTH_LINK_BURST),
+    ])
+
+
+def upload_throttle(user):
+    return Throttle('upload', [
+        TokenBucket(f'user:{user.pk}:upload', settings.BANDWIDTH_UPLOAD_RATE, settings.BANDWIDTH_UPLOAD_BURST),
+    ])
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import statistics
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(func, repeat=5, warmup=1):
+    """
+    Замеряет время выполнения и количество SQL-запросов функции.
+    Возвращает словарь с медианой, минимумом, p95 (в миллисекундах)
+    и числом запросов последнего прогона.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = len(context.captured_queries)
+
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(timings[0], 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'queries': queries,
+        'repeat': repeat,
+    }
+
+
+def write_report(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_regressions(results, baseline, threshold, min_delta_ms=0.05):
+    """
+    Сравнивает результаты с базовыми по имени замера. Регрессия — рост медианы
+    больше чем на threshold процентов (и больше чем на min_delta_ms, чтобы шум
+    не давал ложных срабатываний на микросекундных замерах) или рост числа
+    SQL-запросов. Возвращает список строк с описанием регрессий.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['median_ms'] > base['median_ms'] * (1 + threshold / 100)
+        if base['median_ms'] and slower and result['median_ms'] - base['median_ms'] > min_delta_ms:
+            change = (result['median_ms'] / base['median_ms'] - 1) * 100
+            regressions.append(f"{name}: {base['median_ms']} -> {result['median_ms']} мс ({change:+.0f}%)")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {result['queries']} SQL-запросов")
+    return regressions
+
+
+def format_table(rows, columns):
+    """Простая текстовая таблица для вывода в консоль."""
+    widths = [
+        max(len(str(column)), *(len(str(row.get(column, ''))) for row in rows)) if rows else len(column)
+        for column in columns
+    ]
+    lines = ['  '.join(str(column).ljust(width) for column, width in zip(columns, widths))]
+    for row in rows:
+        lines.append('  '.join(str(row.get(column, '')).ljust(width) for column, width in zip(columns, widths)))
+    return '\n'.join(lines)
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import connection
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Бюджеты SQL-запросов и времени ответа для представлений.
+#
+# Бюджет объявляется декоратором query_budget на функции представления
+# или действии ViewSet, словарем query_budgets на классе представления
+# (для унаследованных действий вроде list/create) или в settings.QUERY_BUDGETS
+# по имени URL (например, для страниц админки). QueryBudgetMiddleware
+# проверяет бюджет каждого запроса: нарушения пишутся в лог со стеком вызова
+# лишних запросов, а при QUERY_BUDGETS_STRICT=True приводят к исключению
+# QueryBudgetExceeded (для прогонов в CI). В тестах тот же контроль доступен
+# через контекстный менеджер enforce().
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class Budget:
+    queries: int = None      # максимум SQL-запросов
+    duplicates: int = None   # максимум повторов одного и того же SQL (без учета параметров)
+    ms: float = None         # максимум времени ответа в миллисекундах
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Нарушение бюджета в строгом режиме. Наследует AssertionError, чтобы проваливать тесты."""
+
+
+def query_budget(queries=None, duplicates=None, ms=None):
+    """Декоратор, объявляющий бюджет для функции представления или действия ViewSet."""
+    def decorator(func):
+        func.query_budget = Budget(queries, duplicates, ms)
+        return func
+    return decorator
+
+
+def budget_for(request, view_func):
+    """Находит бюджет для представления, обрабатывающего запрос."""
+    method = request.method.lower()
+    cls = getattr(view_func, 'cls', None)
+    if cls is not None:
+        actions = getattr(view_func, 'actions', None) or {}
+        handler_name = actions.get(method, method)
+        handler = getattr(cls, handler_name, None)
+        budget = getattr(handler, 'query_budget', None)
+        if budget is None:
+            budget = getattr(cls, 'query_budgets', {}).get(handler_name)
+    else:
+        budget = getattr(view_func, 'query_budget', None)
+
+    if budget is None and request.resolver_match is not None:
+        configured = settings.QUERY_BUDGETS.get(request.resolver_match.view_name)
+        if configured:
+            budget = Budget(**configured)
+    return budget
+
+
+def _project_stack():
+    """Кадры стека, относящиеся к коду проекта (без Django, DRF и самого модуля бюджетов)."""
+    frames = []
+    for frame in traceback.extract_stack()[:-3]:
+        if not frame.filename.startswith(PROJECT_ROOT) or frame.filename == __file__:
+            continue
+        if os.sep + 'site-packages' + os.sep in frame.filename:
+            continue
+        frames.append(f'{os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}')
+    return frames
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL, запоминающая запросы, их длительность и стек вызова."""
+
+    def __init__(self, capture_stacks=True):
+        self.capture_stacks = capture_stacks
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = _project_stack() if self.capture_stacks else None
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'ms': (time.perf_counter() - started) * 1000,
+                'stack': stack,
+            })
+
+    def duplicates(self):
+        """SQL-шаблоны, выполненные больше одного раза: {sql: количество}."""
+        counts = Counter(query['sql'] for query in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count > 1}
+
+
+def check(budget, recorder, elapsed_ms, label):
+    """Возвращает список нарушений бюджета (пустой, если бюджет соблюден)."""
+    violations = []
+    if budget.queries is not None and len(recorder.queries) > budget.queries:
+        violations.append(('queries', f'{len(recorder.queries)} SQL-запросов при бюджете {budget.queries}'))
+
+    duplicates = recorder.duplicates()
+    worst = max(duplicates.values(), default=1) - 1
+    if budget.duplicates is not None and worst > budget.duplicates:
+        violations.append(('duplicates', f'{worst} повторов одного запроса при бюджете {budget.duplicates}'))
+
+    if budget.ms is not None and elapsed_ms > budget.ms:
+        violations.append(('ms', f'{elapsed_ms:.0f} мс при бюджете {budget.ms:.0f} мс'))
+
+    for kind, _message in violations:
+        metrics.QUERY_BUDGET_VIOLATIONS.labels(view=label, kind=kind).inc()
+    return violations
+
+
+def report(recorder, violations, label, limit=3):
+    """Текст отчета: нарушения и стеки самых частых повторяющихся запросов."""
+    lines = [f'Query budget exceeded for {label}: ' + '; '.join(message for _kind, message in violations)]
+    duplicates = recorder.duplicates()
+    shown = list(duplicates.items())[:limit] or [(query['sql'], 1) for query in recorder.queries[-limit:]]
+    for sql, count in shown:
+        first = next(query for query in recorder.queries if query['sql'] == sql)
+        lines.append(f'  x{count}: {sql[:300]}')
+        for frame in first['stack'] or []:
+            lines.append(f'      {frame}')
+    return '\n'.join(lines)
+
+
+def handle_violations(recorder, violations, label, strict):
+    if not violations:
+        return
+    message = report(recorder, violations, label)
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def enforce(queries=None, duplicates=None, ms=None, label='block', strict=True):
+    """
+    Проверка бюджета для произвольного блока кода, например в тестах:
+
+        with enforce(queries=3, duplicates=0):
+            client.get('/api/files/')
+
+    По умолчанию нарушение вызывает QueryBudgetExceeded.
+    """
+    budget = Budget(queries, duplicates, ms)
+    recorder = QueryRecorder()
+    started = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    handle_violations(recorder, check(budget, recorder, elapsed_ms, label), label, strict)
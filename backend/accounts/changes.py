@@ -0,0 +1,162 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+from . import events
+from .exceptions import ChangeCursorExpired
+from .models import File, FileChange, FileChangeWatermark
+
+logger = logging.getLogger(__name__)
+
+# Журнал изменений файлов для инкрементальной синхронизации клиентов.
+#
+# Каждое изменение файла (создание, переименование, комментарий, публикация,
+# удаление в корзину, восстановление, окончательное удаление) добавляет запись
+# в журнал владельца. Клиент запрашивает изменения после своего курсора и
+# получает по одному элементу на файл: текущее состояние или tombstone, если
+# файла больше нет. Запрос без изменений — один поиск по индексу (user, id).
+#
+# ID записей выдаются при вставке, а видимыми становятся при фиксации
+# транзакции, поэтому запись с меньшим ID может появиться позже записи с
+# большим. Чтобы курсор не перескочил такую запись, отдаются только записи
+# старше CHANGE_FEED_SETTLE_SECONDS.
+#
+# Сжатие журнала: записи, за которыми есть более поздняя запись того же файла,
+# удаляются без последствий для клиентов (им важна только последняя). Записи
+# старше срока хранения удаляются, а граница сжатия пользователя поднимается —
+# курсор ниже границы считается устаревшим (410), и клиент выполняет полную
+# синхронизацию.
+
+Action = FileChange.Action
+
+
+def _actions(old, new):
+    """Действия журнала для изменения состояния файла old -> new (одного владельца)."""
+    if old.get('is_deleted') != new.get('is_deleted'):
+        return [Action.DELETED if new.get('is_deleted') else Action.RESTORED]
+
+    actions = []
+    if old.get('original_name') != new.get('original_name'):
+        actions.append(Action.RENAMED)
+    if old.get('comment') != new.get('comment'):
+        actions.append(Action.COMMENTED)
+    if old.get('is_public') != new.get('is_public') or old.get('shared_link') != new.get('shared_link'):
+        actions.append(Action.SHARED)
+    if not actions and (old.get('size') != new.get('size') or old.get('file_type') != new.get('file_type')):
+        actions.append(Action.UPDATED)
+    return actions
+
+
+def record(user_id, file_id, *actions):
+    if actions:
+        entries = FileChange.objects.bulk_create(
+            [FileChange(user_id=user_id, file_id=file_id, action=action) for action in actions]
+        )
+        events.publish_file_changes(user_id, [(entry.id, file_id, entry.action) for entry in entries])
+
+
+def record_file_saved(instance, created):
+    """Добавляет в журнал изменения файла после сохранения."""
+    new = instance._tracked_state()
+    if created:
+        record(new['owner_id'], instance.pk, Action.CREATED)
+        return
+
+    old = dict(new, **getattr(instance, '_loaded_values', {}))
+    if old['owner_id'] != new['owner_id']:
+        # Передача файла другому пользователю: для прежнего владельца файл исчез
+        record(old['owner_id'], instance.pk, Action.PURGED)
+        record(new['owner_id'], instance.pk, Action.CREATED)
+        return
+    record(new['owner_id'], instance.pk, *_actions(old, new))
+
+
+def record_file_deleted(instance):
+    state = dict(instance._tracked_state(), **getattr(instance, '_loaded_values', {}))
+    if state.get('owner_id') is not None:
+        record(state['owner_id'], instance.pk, Action.PURGED)
+
+
+def _watermark(user):
+    return FileChangeWatermark.objects.filter(user=user).values_list('compacted_through', flat=True).first() or 0
+
+
+def _settled(user, settle=True):
+    if not settle:
+        return FileChange.objects.filter(user=user)
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    return FileChange.objects.filter(user=user, created_at__lte=settled)
+
+
+def latest_cursor(user):
+    """
+    Начальный курсор для клиента, который выполняет полную синхронизацию:
+    курсор запрашивается до получения полного списка файлов.
+    """
+    latest = _settled(user).aggregate(latest=Max('id'))['latest'] or 0
+    # После сжатия журнала курсор не может быть ниже границы, иначе клиент получит 410
+    return max(latest, _watermark(user))
+
+
+def changes_since(user, since, limit, settle=True):
+    """
+    Изменения файлов пользователя после курсора since.
+    Возвращает (курсор, есть ли еще изменения, [(ID файла, действие, File или None)]).
+    Файлы перечислены в порядке последнего изменения; None — tombstone.
+    settle=False отдает и самые свежие записи (для клиента, который уже
+    подписан на события и получит запоздавшие записи вместе с ними).
+    """
+    if since < _watermark(user):
+        raise ChangeCursorExpired()
+
+    entries = list(
+        _settled(user, settle).filter(id__gt=since)
+        .order_by('id')
+        .values_list('id', 'file_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return since, False, []
+
+    latest = {}
+    for _id, file_id, action in entries:
+        latest.pop(file_id, None)
+        latest[file_id] = action
+    files = File.objects.filter(owner=user, is_deleted=False, pk__in=latest).select_related('owner').in_bulk()
+    return entries[-1][0], has_more, [(file_id, action, files.get(file_id)) for file_id, action in latest.items()]
+
+
+def compact(retention_days, batch_size=10000):
+    """
+    Сжимает журнал: удаляет записи, перекрытые более поздними записями того же
+    файла, и записи старше retention_days с подъемом границы сжатия.
+    Возвращает (удалено перекрытых, удалено устаревших).
+    """
+    superseded = FileChange.objects.filter(Exists(
+        FileChange.objects.filter(user=OuterRef('user'), file_id=OuterRef('file_id'), id__gt=OuterRef('id'))
+    ))
+    superseded_total = 0
+    while True:
+        ids = list(superseded.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        superseded_total += FileChange.objects.filter(pk__in=ids).delete()[0]
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired_total = 0
+    with transaction.atomic():
+        expired = FileChange.objects.filter(created_at__lt=cutoff)
+        marks = dict(expired.values('user_id').annotate(through=Max('id')).values_list('user_id', 'through'))
+        for user_id, through in marks.items():
+            watermark, _created = FileChangeWatermark.objects.select_for_update().get_or_create(user_id=user_id)
+            if through > watermark.compacted_through:
+                watermark.compacted_through = through
+                watermark.save(update_fields=['compacted_through'])
+        if marks:
+            expired_total = expired.delete()[0]
+
+    logger.info(f"Compacted file change feed: {superseded_total} superseded, {expired_total} expired")
+    return superseded_total, expired_total
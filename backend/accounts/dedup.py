@@ -0,0 +1,140 @@
+import os
+import hashlib
+import logging
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from . import metrics, quota
+from .exceptions import UploadProofInvalid
+from .models import File
+from .storage import link_or_copy
+
+logger = logging.getLogger(__name__)
+
+# Загрузка без передачи данных.
+#
+# Клиент сообщает SHA-256 и размер файла. Если такое содержимое уже хранится,
+# сервер выдает проверку: случайный фрагмент [offset, offset + length) и nonce.
+# Клиент присылает SHA-256 от nonce и байтов фрагмента — это невозможно без
+# самого файла, поэтому знание хеша не дает доступа к чужому содержимому.
+# После проверки создается запись File, физический файл — жесткая ссылка на
+# найденный (или копия), квота списывается как при обычной загрузке.
+#
+# Ответ на precheck не раскрывает, хранится ли содержимое: без совпадения
+# выдается такая же проверка-пустышка, и claim отклоняет ее так же, как
+# неверное доказательство. Иначе по хешу можно было бы узнать, есть ли
+# известный файл у других пользователей. Если проверка не удалась, клиент
+# загружает файл полностью.
+
+CHALLENGE_KEY = 'dedup:challenge:{}'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """SHA-256 файла на диске, чтением блоками."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def range_proof(path, nonce, offset, length):
+    """Ожидаемое доказательство: SHA-256 от nonce и фрагмента файла."""
+    digest = hashlib.sha256(bytes.fromhex(nonce))
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        digest.update(f.read(length))
+    return digest.hexdigest()
+
+
+def find_blob(sha256, size):
+    """Сохраненный файл с тем же содержимым, физически присутствующий на диске."""
+    candidates = File.objects.filter(sha256=sha256, size=size, is_deleted=False).only('id', 'file', 'size')
+    for candidate in candidates[:3]:
+        if os.path.isfile(candidate.file.path):
+            return candidate
+    return None
+
+
+def issue_challenge(user, sha256, size):
+    """
+    Ищет содержимое по хешу и размеру и возвращает параметры проверки для клиента.
+    Без совпадения проверка выдается тоже, но пройти ее нельзя.
+    """
+    blob = find_blob(sha256, size)
+    metrics.INSTANT_UPLOADS.labels(result='challenge' if blob else 'miss').inc()
+
+    length = min(size, settings.DEDUP_PROOF_RANGE)
+    challenge = {
+        'challenge_id': secrets.token_urlsafe(16),
+        'offset': secrets.randbelow(size - length + 1),
+        'length': length,
+        'nonce': secrets.token_hex(16),
+    }
+    cache.set(
+        CHALLENGE_KEY.format(challenge['challenge_id']),
+        dict(challenge, user_id=user.pk, blob_id=str(blob.pk) if blob else None, sha256=sha256, size=size),
+        settings.DEDUP_CHALLENGE_TTL,
+    )
+    return challenge
+
+
+def claim(user, challenge_id, proof, original_name, comment=''):
+    """
+    Проверяет доказательство и создает файл пользователя из найденного содержимого.
+    Проверка одноразовая. Возвращает созданный File или None, если содержимое
+    за это время было удалено и файл нужно загрузить полностью.
+    """
+    key = CHALLENGE_KEY.format(challenge_id)
+    challenge = cache.get(key)
+    cache.delete(key)
+    if challenge is None or challenge['user_id'] != user.pk:
+        metrics.INSTANT_UPLOADS.labels(result='expired').inc()
+        raise ValidationError({'challenge_id': _('Проверка не найдена или истекла. Повторите запрос.')})
+    if challenge['blob_id'] is None:
+        # Проверка-пустышка: ответ тот же, что и при неверном доказательстве
+        metrics.INSTANT_UPLOADS.labels(result='decoy').inc()
+        raise UploadProofInvalid()
+
+    blob = File.objects.filter(pk=challenge['blob_id'], is_deleted=False).only('id', 'file').first()
+    try:
+        expected = range_proof(blob.file.path, challenge['nonce'], challenge['offset'], challenge['length'])
+    except (AttributeError, OSError):
+        metrics.INSTANT_UPLOADS.labels(result='miss').inc()
+        return None
+    if not constant_time_compare(proof.lower(), expected):
+        logger.warning(f"Instant upload proof mismatch for user {user.username} (blob: {blob.pk})")
+        metrics.INSTANT_UPLOADS.labels(result='proof_failed').inc()
+        raise UploadProofInvalid()
+
+    size = challenge['size']
+    file = File(owner=user, original_name=original_name, comment=comment, size=size, sha256=challenge['sha256'])
+    file.file.name = File._meta.get_field('file').generate_filename(file, original_name)
+    path = file.file.path
+
+    reservation = quota.reserve(user, size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        link_or_copy(blob.file.path, path)
+    except FileNotFoundError:
+        quota.release(reservation)
+        metrics.INSTANT_UPLOADS.labels(result='miss').inc()
+        return None
+    try:
+        with quota.commit(reservation):
+            file.save()
+    except Exception as e:
+        quota.release(reservation)
+        os.remove(path)
+        if isinstance(e, DjangoValidationError):
+            raise ValidationError(e.message_dict)
+        raise
+
+    metrics.INSTANT_UPLOADS.labels(result='linked').inc()
+    logger.info(f"User {user.username} uploaded file {original_name} without transfer (blob: {blob.pk})")
+    return file
@@ -0,0 +1,236 @@
+import json
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils.module_loading import import_string
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Push-уведомления клиентам через Server-Sent Events (GET /api/events/, только ASGI).
+#
+# Изменения файлов публикуются после фиксации транзакции вместе с записью
+# журнала синхронизации (accounts/changes.py), ID события — ID записи журнала.
+# Переподключившийся клиент передает Last-Event-ID и получает пропущенные
+# изменения из журнала. Подписчик — очередь asyncio в цикле событий сервера:
+# соединение без событий не занимает ни потока, ни подключения к БД, поэтому
+# один процесс держит тысячи открытых соединений.
+#
+# LocalBroker доставляет события внутри процесса. Если API и SSE обслуживают
+# разные процессы (gunicorn + uvicorn, несколько воркеров), события передаются
+# через Redis: EVENTS_BACKEND = 'accounts.events.RedisBroker'.
+
+# Билет подключения к потоку: EventSource не передает заголовки, а постоянный
+# токен в адресе запроса попал бы в журналы доступа и историю браузера
+TICKET_SALT = 'accounts.events.ticket'
+
+# Тип события для каждого действия журнала изменений
+FILE_EVENTS = {
+    'created': 'file.added',
+    'restored': 'file.added',
+    'renamed': 'file.renamed',
+    'commented': 'file.updated',
+    'updated': 'file.updated',
+    'shared': 'file.shared',
+    'deleted': 'file.removed',
+    'purged': 'file.removed',
+}
+# Действия, меняющие занятое место
+QUOTA_ACTIONS = {'created', 'restored', 'updated', 'deleted', 'purged'}
+
+# Сигнал подписчику закрыть соединение: очередь переполнена, клиент
+# переподключится и получит пропущенное из журнала
+OVERFLOW = object()
+
+
+def encode(event):
+    """Событие в формате text/event-stream."""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Очередь событий одного соединения; используется только в своем цикле событий."""
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Event queue overflow for user {self.user_id}, closing stream")
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self, timeout):
+        """Следующее событие или None, если за timeout секунд событий не было."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Подписчики текущего процесса. publish можно вызывать из любого потока."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Цикл событий уже остановлен (завершение процесса)
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    События всех процессов через канал Redis (REDIS_URL, нужен пакет redis).
+    Каждый процесс с открытыми соединениями слушает канал и раздает события
+    своим подписчикам.
+    """
+    channel = 'cloud_storage:events'
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self._client = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+
+    def has_subscribers(self, user_id):
+        # Подписчики могут быть в других процессах
+        return True
+
+    def subscribe(self, user_id):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        self._client.publish(self.channel, json.dumps({'user_id': user_id, 'event': event}))
+
+    async def _listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        async with client.pubsub() as pubsub:
+            await pubsub.subscribe(self.channel)
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                payload = json.loads(message['data'])
+                self.deliver(payload['user_id'], payload['event'])
+
+
+def issue_ticket(user):
+    """Подписанный билет для подключения к потоку, действует EVENTS_TICKET_MAX_AGE секунд."""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def ticket_user_id(ticket):
+    """ID пользователя из билета или None, если подпись неверна или срок истек."""
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=settings.EVENTS_TICKET_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENTS_BACKEND)()
+
+
+def _publish(user_id, event):
+    try:
+        get_broker().publish(user_id, event)
+        metrics.EVENTS_PUBLISHED.labels(event=event['event']).inc()
+    except Exception as e:
+        # Клиенты получат изменение из журнала при переподключении
+        logger.error(f"Failed to publish event {event['event']} for user {user_id}: {str(e)}")
+
+
+def quota_snapshot(user_id):
+    from .models import User
+
+    usage = User.objects.with_usage().filter(pk=user_id).values(
+        'storage_quota', 'storage_used_total', 'files_count_total'
+    ).first()
+    if usage is None:
+        return None
+    return {
+        'storage_quota': usage['storage_quota'],
+        'storage_used': usage['storage_used_total'],
+        'storage_left': max(0, usage['storage_quota'] - usage['storage_used_total']),
+        'files_count': usage['files_count_total'],
+    }
+
+
+def quota_event(user_id):
+    snapshot = quota_snapshot(user_id)
+    return snapshot and {'event': 'quota.changed', 'data': snapshot}
+
+
+def file_event(change_id, file_id, action):
+    return {'id': change_id, 'event': FILE_EVENTS[action], 'data': {'id': str(file_id), 'action': action}}
+
+
+def publish_file_changes(user_id, entries):
+    """
+    Публикует записи журнала изменений [(ID записи, ID файла, действие)]
+    после фиксации транзакции; при изменении занятого места — и квоту.
+    """
+    def send():
+        if not get_broker().has_subscribers(user_id):
+            return
+        for change_id, file_id, action in entries:
+            _publish(user_id, file_event(change_id, file_id, action))
+        if any(action in QUOTA_ACTIONS for _id, _file_id, action in entries):
+            publish_quota(user_id)
+
+    transaction.on_commit(send)
+
+
+def publish_quota(user_id):
+    if get_broker().has_subscribers(user_id):
+        event = quota_event(user_id)
+        if event is not None:
+            _publish(user_id, event)
@@ -0,0 +1,52 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    """Загружаемый файл больше MAX_UPLOAD_SIZE."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Файл превышает максимально допустимый размер.')
+    default_code = 'upload_too_large'
+
+
+class StorageQuotaExceeded(APIException):
+    """Загрузка не помещается в оставшуюся квоту пользователя."""
+    status_code = status.HTTP_507_INSUFFICIENT_STORAGE
+    default_detail = _('Недостаточно места в хранилище.')
+    default_code = 'storage_quota_exceeded'
+
+
+class PasswordHasherBusy(APIException):
+    """Очередь пула хеширования паролей заполнена, запрос отклонен без ожидания."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Сервер перегружен, повторите попытку позже.')
+    default_code = 'password_hasher_busy'
+
+
+class UploadProofInvalid(APIException):
+    """Хеш фрагмента файла не совпал: клиент не доказал, что владеет содержимым."""
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = _('Не удалось подтвердить содержимое файла. Загрузите файл полностью.')
+    default_code = 'upload_proof_invalid'
+
+
+class ChangeCursorExpired(APIException):
+    """Курсор журнала изменений старше границы сжатия: нужна полная синхронизация."""
+    status_code = status.HTTP_410_GONE
+    default_detail = _('Курсор изменений устарел. Выполните полную синхронизацию.')
+    default_code = 'change_cursor_expired'
+
+
+class PartChecksumMismatch(APIException):
+    """SHA-256 принятой части не совпал с присланным клиентом: часть нужно загрузить заново."""
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = _('Контрольная сумма части не совпала. Загрузите часть заново.')
+    default_code = 'part_checksum_mismatch'
+
+
+class MultipartUploadBusy(APIException):
+    """Загрузка частями уже завершается другим запросом."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('Загрузка уже завершается.')
+    default_code = 'multipart_upload_busy'
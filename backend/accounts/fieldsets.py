@@ -0,0 +1,98 @@
+import hashlib
+from rest_framework.exceptions import ValidationError
+
+# Выборочные наборы полей для запросов чтения: ?fields=id,original_name,size
+# оставляет только перечисленные поля, ?omit=comment исключает поля из полного
+# набора. Набор сокращает не только ответ, но и SQL-запрос: ViewSet загружает
+# через only() лишь столбцы, нужные выбранным полям (fieldset_columns).
+
+
+def serializer_field_names(serializer_class):
+    """Имена полей сериализатора в порядке вывода, без создания экземпляра."""
+    meta = getattr(serializer_class, 'Meta', None)
+    fields = getattr(meta, 'fields', None)
+    if isinstance(fields, (list, tuple)):
+        return tuple(fields)
+    return tuple(serializer_class._declared_fields)
+
+
+def _split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fields(query_params, available):
+    """
+    Выбранные поля в порядке сериализатора или None, если набор не задан.
+    Неизвестные поля и пустой итоговый набор — ошибка 400.
+    """
+    fields = _split(query_params.get('fields'))
+    omit = _split(query_params.get('omit'))
+    if not fields and not omit:
+        return None
+
+    unknown = (fields | omit) - set(available)
+    if unknown:
+        raise ValidationError({'fields': f"Неизвестные поля: {', '.join(sorted(unknown))}"})
+    selected = tuple(name for name in available if (not fields or name in fields) and name not in omit)
+    if not selected:
+        raise ValidationError({'fields': 'Не выбрано ни одного поля'})
+    return selected
+
+
+def fieldset_key(fields):
+    """
+    Часть ключа кеша для набора полей. Наборы, отличающиеся только порядком
+    в запросе или способом задания (fields/omit), дают один ключ.
+    """
+    if fields is None:
+        return 'all'
+    return hashlib.md5(','.join(fields).encode()).hexdigest()[:12]
+
+
+class SparseFieldsMixin:
+    """Сериализатор с аргументом fields: остаются только перечисленные поля."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    ViewSet с поддержкой ?fields= / ?omit= для действий из fieldset_actions.
+    fieldset_columns сопоставляет полю сериализатора поля модели для only();
+    поле без записи загружает одноименный столбец, пустой кортеж — ни одного
+    (например, для аннотаций). fieldset_required загружается всегда.
+    """
+    fieldset_actions = ('list', 'retrieve')
+    fieldset_columns = {}
+    fieldset_required = ()
+
+    def get_fieldset(self):
+        if self.action not in self.fieldset_actions:
+            return None
+        if not hasattr(self, '_fieldset'):
+            available = serializer_field_names(self.get_serializer_class())
+            self._fieldset = requested_fields(self.request.query_params, available)
+        return self._fieldset
+
+    def get_fieldset_key(self):
+        return fieldset_key(self.get_fieldset())
+
+    def prune_columns(self, queryset):
+        """Ограничивает загружаемые столбцы выбранным набором полей."""
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+        columns = {queryset.model._meta.pk.name, *self.fieldset_required}
+        for name in fieldset:
+            columns.update(self.fieldset_columns.get(name, (name,)))
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault('fields', fieldset)
+        return super().get_serializer(*args, **kwargs)
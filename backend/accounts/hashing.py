@@ -0,0 +1,103 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from .exceptions import PasswordHasherBusy
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def _init_worker(settings_module):
+    """Инициализация Django в дочернем процессе пула (для метода запуска spawn)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def get_pool():
+    """
+    Общий пул процессов для вычисления хешей паролей.
+    Размер задается PASSWORD_HASHER_WORKERS (по умолчанию — число ядер).
+    """
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.PASSWORD_HASHER_WORKERS or os.cpu_count() or 1
+                _slots = threading.BoundedSemaphore(workers * settings.PASSWORD_HASHER_QUEUE_PER_WORKER)
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'),),
+                )
+                logger.info(f"Password hasher pool started with {workers} workers")
+    return _pool
+
+
+def hash_passwords(passwords, chunksize=16):
+    """
+    Хеширует список паролей параллельно в пуле процессов.
+    Порядок результатов совпадает с порядком входных паролей.
+    """
+    if not passwords:
+        return []
+    if len(passwords) == 1:
+        return [make_password(passwords[0])]
+    return list(get_pool().map(make_password, passwords, chunksize=chunksize))
+
+
+def _verify(password, encoded):
+    """Проверка пароля в процессе пула: (совпадает, нужно ли пересчитать хеш)."""
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, False
+    valid = hasher.verify(password, encoded)
+    return valid, valid and hasher.must_update(encoded)
+
+
+def submit(func, *args):
+    """
+    Ставит вычисление в пул с контролем допуска: если число ожидающих
+    задач достигло PASSWORD_HASHER_QUEUE_PER_WORKER на процесс, новая
+    задача не ставится в очередь, а сразу отклоняется PasswordHasherBusy.
+    """
+    pool = get_pool()
+    if not _slots.acquire(blocking=False):
+        logger.warning("Password hasher pool is saturated, request rejected")
+        raise PasswordHasherBusy()
+    try:
+        future = pool.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _future: _slots.release())
+    return future
+
+
+async def amake_password(password):
+    """Асинхронный make_password: хеширование выполняется в пуле процессов."""
+    return await asyncio.wrap_future(submit(make_password, password))
+
+
+async def acheck_password(password, encoded):
+    """
+    Асинхронная проверка пароля в пуле процессов.
+    Возвращает (совпадает, новый_хеш или None, если пересчет не нужен).
+    Для отсутствующего хеша (неизвестный пользователь) все равно выполняется
+    хеширование, чтобы время ответа не выдавало существование имени.
+    """
+    if not encoded:
+        await amake_password(password)
+        return False, None
+    valid, must_update = await asyncio.wrap_future(submit(_verify, password, encoded))
+    if must_update:
+        return True, await amake_password(password)
+    return valid, None
@@ -0,0 +1,128 @@
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Кеш содержимого небольших файлов, популярных по публичным ссылкам.
+#
+# Файлы до HOT_FILE_MAX_SIZE байт хранятся в памяти процесса (LRU с общим
+# лимитом HOT_FILE_CACHE_SIZE), и повторные скачивания отдаются без обращения
+# к диску. В кеш попадают только файлы, запрошенные не менее HOT_FILE_MIN_HITS
+# раз, а при нехватке места новый файл вытесняет старый, только если
+# запрашивается чаще него (TinyLFU): однократные скачивания не вытесняют
+# популярные файлы. Счетчики обращений периодически уменьшаются вдвое, чтобы
+# учитывалась недавняя популярность.
+#
+# Запись проверяется по версии файла (путь, размер, SHA-256): замененный
+# файл не будет отдан из кеша другого процесса, даже если удаление видел
+# только один процесс.
+
+# Число обращений, после которого счетчики уменьшаются вдвое
+AGING_PERIOD = 10000
+
+
+def version(file):
+    return (file.file.name, file.size, file.sha256)
+
+
+class HotFileCache:
+    """LRU содержимого файлов с допуском по частоте обращений; потокобезопасен."""
+
+    def __init__(self, capacity, max_size, min_hits):
+        self.capacity = capacity
+        self.max_size = max_size
+        self.min_hits = min_hits
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._frequency = {}
+        self._accesses = 0
+        self.size = 0
+
+    def _touch(self, key):
+        self._frequency[key] = self._frequency.get(key, 0) + 1
+        self._accesses += 1
+        if self._accesses >= AGING_PERIOD:
+            self._accesses = 0
+            self._frequency = {k: count // 2 for k, count in self._frequency.items() if count > 1}
+
+    def get(self, key, file_version):
+        """Содержимое файла или None. Каждый вызов учитывается как обращение."""
+        with self._lock:
+            self._touch(key)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != file_version:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.cache_result('hot_files', entry is not None)
+        return entry[1] if entry is not None else None
+
+    def wants(self, key, size):
+        """Стоит ли прочитать файл в память для put."""
+        return self.capacity > 0 and size <= self.max_size and self._frequency.get(key, 0) >= self.min_hits
+
+    def put(self, key, file_version, data):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            frequency = self._frequency.get(key, 0)
+            victims = []
+            free = self.capacity - self.size
+            for victim in self._entries:
+                if free >= len(data):
+                    break
+                if self._frequency.get(victim, 0) > frequency:
+                    # Вытесняемые файлы популярнее нового
+                    return False
+                victims.append(victim)
+                free += len(self._entries[victim][1])
+            if free < len(data):
+                return False
+            for victim in victims:
+                self._remove(victim)
+            self._entries[key] = (file_version, data)
+            self.size += len(data)
+        metrics.HOT_FILE_CACHE_BYTES.set(self.size)
+        return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+            self._frequency.pop(key, None)
+        metrics.HOT_FILE_CACHE_BYTES.set(self.size)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+files_cache = HotFileCache(settings.HOT_FILE_CACHE_SIZE, settings.HOT_FILE_MAX_SIZE, settings.HOT_FILE_MIN_HITS)
+
+
+def read(file):
+    """
+    Содержимое публичного файла из кеша или None, если файл нужно отдать с диска.
+    Популярный файл подходящего размера читается с диска и сохраняется в кеше.
+    """
+    if files_cache.capacity <= 0 or file.size > files_cache.max_size:
+        return None
+    file_version = version(file)
+    data = files_cache.get(file.pk, file_version)
+    if data is None and files_cache.wants(file.pk, file.size):
+        with open(file.file.path, 'rb') as handle:
+            data = handle.read()
+        if len(data) != file.size:
+            # Размер в БД не совпадает с файлом на диске: отдаем файл обычным путем
+            return None
+        if files_cache.put(file.pk, file_version, data):
+            logger.debug(f"Hot file cached: {file.pk} ({file.size} bytes)")
+    return data
+
+
+def invalidate(file_id):
+    files_cache.invalidate(file_id)
@@ -0,0 +1,69 @@
+import os
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts import analytics, response_cache
+from accounts.dedup import hash_file
+from accounts.models import File
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размер файлов, сохраненных без него (size = 0), по данным файловой системы. '
+        'Раньше размер дописывался при сериализации списка файлов; теперь это разовая операция. '
+        'С --hashes также считает SHA-256 файлов без хеша (для загрузки без передачи данных).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--hashes', action='store_true', help='Посчитать SHA-256 файлов без хеша')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, без записи в БД')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        prefix = 'Будет обновлено' if self.dry_run else 'Обновлено'
+
+        sizes = File.objects.filter(size=0)
+        updated, missing, owners = self.backfill(sizes, 'size', lambda path: os.path.getsize(path) or None)
+        if owners and not self.dry_run:
+            # bulk_update обходит сигналы, поэтому агрегаты пересчитываются явно
+            analytics.rebuild(owners)
+            response_cache.invalidate(*owners)
+        self.stdout.write(self.style.SUCCESS(f'{prefix} размеров: {updated}, не найдено на диске: {missing}'))
+
+        if options['hashes']:
+            hashes = File.objects.filter(sha256__isnull=True, is_deleted=False)
+            updated, missing, _owners = self.backfill(hashes, 'sha256', hash_file)
+            self.stdout.write(self.style.SUCCESS(f'{prefix} хешей: {updated}, не найдено на диске: {missing}'))
+
+    def backfill(self, queryset, field, compute):
+        """
+        Вычисляет значение поля по физическому файлу и сохраняет пачками.
+        Возвращает (обновлено, не найдено на диске, ID владельцев обновленных файлов).
+        """
+        updated, missing = 0, 0
+        owners = set()
+        batch = []
+        for file in queryset.only('id', 'owner_id', 'file', field).order_by('pk').iterator(chunk_size=self.batch_size):
+            try:
+                value = compute(file.file.path)
+            except (OSError, ValueError):
+                missing += 1
+                continue
+            if value is None:
+                continue
+            setattr(file, field, value)
+            batch.append(file)
+            owners.add(file.owner_id)
+            if len(batch) >= self.batch_size:
+                updated += self.flush(batch, field)
+                batch = []
+        if batch:
+            updated += self.flush(batch, field)
+        return updated, missing, owners
+
+    def flush(self, batch, field):
+        if not self.dry_run:
+            with transaction.atomic():
+                File.objects.bulk_update(batch, [field])
+        return len(batch)
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from accounts.benchmarks import measure, write_report, format_table
+from accounts.models import User, File
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и количество SQL-запросов страниц списков админки. '
+        'Для оценки на больших объемах сначала заполните базу командой seed_dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True,
+                            help='Суперпользователь, от имени которого открываются страницы')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        try:
+            admin_user = User.objects.get(username=options['username'], is_superuser=True)
+        except User.DoesNotExist:
+            raise CommandError('Суперпользователь не найден')
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*'), 'localhost').lstrip('.')
+        client = Client(HTTP_HOST=host)
+        client.force_login(admin_user)
+
+        sample_owner = File.objects.values_list('owner__username', flat=True).first() or admin_user.username
+        pages = [
+            ('users', reverse('admin:accounts_user_changelist')),
+            ('users_search', reverse('admin:accounts_user_changelist') + '?q=user'),
+            ('groups', reverse('admin:auth_group_changelist')),
+            ('files', reverse('admin:accounts_file_changelist')),
+            ('files_by_owner', reverse('admin:accounts_file_changelist') + f'?owner__username={sample_owner}'),
+            ('files_by_type', reverse('admin:accounts_file_changelist') + '?file_type__exact=PDF'),
+        ]
+
+        rows = []
+        for name, url in pages:
+            def request(url=url):
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: HTTP {response.status_code}')
+            result = measure(request, repeat=options['repeat'])
+            rows.append(dict(page=name, url=url, **result))
+
+        report = {
+            'database': settings.DATABASES['default']['ENGINE'],
+            'users': User.objects.count(),
+            'files': File.objects.count(),
+            'pages': rows,
+        }
+        self.stdout.write(f"Пользователей: {report['users']}, файлов: {report['files']}")
+        self.stdout.write(format_table(rows, ['page', 'median_ms', 'p95_ms', 'queries']))
+        if options['output']:
+            write_report(options['output'], report)
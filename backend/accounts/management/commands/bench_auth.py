@@ -0,0 +1,83 @@
+import os
+import uuid
+import shutil
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.test import APIClient
+from accounts.benchmarks import measure, write_report, format_table
+from accounts.models import User
+
+# Допустимое число SQL-запросов на запрос к эндпоинту. Регистрация:
+# проверка уникальности, вставка пользователя, группа по умолчанию,
+# членство, синхронизация прав группы и токен. Вход: пользователь и токен.
+QUERY_BUDGETS = {
+    'register': 10,
+    'login': 2,
+}
+
+PASSWORD = 'Bench-Passw0rd!'
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и количество SQL-запросов регистрации и входа. '
+        'Завершается с ошибкой, если число запросов превышает зафиксированный бюджет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        prefix = f'bench{uuid.uuid4().hex[:6]}'
+        counter = iter(range(10 ** 6))
+
+        def register():
+            cache.clear()  # сброс счетчиков ограничения частоты запросов
+            number = next(counter)
+            response = client.post(reverse('register'), {
+                'username': f'{prefix}{number}',
+                'email': f'{prefix}{number}@bench.local',
+                'full_name': 'Bench User',
+                'password': PASSWORD,
+                'confirm_password': PASSWORD,
+            }, format='json')
+            if response.status_code != 201:
+                raise CommandError(f'register: HTTP {response.status_code} {response.data}')
+
+        try:
+            rows = [dict(endpoint='register', **measure(register, repeat=options['repeat']))]
+            username = User.objects.filter(username__startswith=prefix).values_list('username', flat=True).first()
+
+            def login():
+                cache.clear()
+                response = client.post(reverse('login'), {'username': username, 'password': PASSWORD}, format='json')
+                if response.status_code != 200:
+                    raise CommandError(f'login: HTTP {response.status_code} {response.data}')
+
+            rows.append(dict(endpoint='login', **measure(login, repeat=options['repeat'])))
+        finally:
+            users = User.objects.filter(username__startswith=prefix)
+            for storage_directory in users.values_list('storage_directory', flat=True):
+                shutil.rmtree(os.path.join(settings.MEDIA_ROOT, storage_directory), ignore_errors=True)
+            users.delete()
+
+        for row in rows:
+            row['budget'] = QUERY_BUDGETS[row['endpoint']]
+
+        self.stdout.write(format_table(rows, ['endpoint', 'median_ms', 'p95_ms', 'queries', 'budget']))
+        if options['output']:
+            write_report(options['output'], {
+                'database': settings.DATABASES['default']['ENGINE'],
+                'endpoints': rows,
+            })
+
+        exceeded = [row for row in rows if row['queries'] > row['budget']]
+        if exceeded:
+            raise CommandError(', '.join(
+                f"{row['endpoint']}: {row['queries']} запросов при бюджете {row['budget']}" for row in exceeded
+            ))
+        self.stdout.write(self.style.SUCCESS('Количество запросов в пределах бюджета'))
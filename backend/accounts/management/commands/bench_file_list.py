@@ -0,0 +1,104 @@
+import os
+import shutil
+import statistics
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+from accounts import seeding
+from accounts.benchmarks import measure, write_report, format_table
+from accounts.budgets import QueryRecorder
+from accounts.models import File, User
+from accounts.serializers import FileListSerializer, FileSerializer
+
+# Наборы полей типичных экранов фронтенда (см. FILE_LIST_FIELDS в services/files.js)
+FILE_VIEWS = {
+    'files_full': {},
+    'files_dashboard': {'fields': 'id,original_name,file_type,human_readable_size,upload_date,last_download,comment'},
+    'files_names': {'fields': 'id,original_name'},
+}
+USER_VIEWS = {
+    'users_full': {},
+    'users_names': {'fields': 'id,username,full_name'},
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию списка файлов полным FileSerializer и облегченным '
+        'FileListSerializer, а также время ответа, время БД и размер ответа списков '
+        'файлов и пользователей для типичных наборов полей (?fields=), в том числе '
+        'из кеша ответов. Данные создаются во временной транзакции и удаляются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        self.username = f'benchlist{os.getpid() % 10 ** 6}'
+        try:
+            with transaction.atomic():
+                results = self.run(options['files'], options['repeat'])
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'user_{self.username}'), ignore_errors=True)
+
+        rows = [dict(name=name, **result) for name, result in results.items()]
+        self.stdout.write(format_table(rows, ['name', 'median_ms', 'p95_ms', 'queries', 'db_ms', 'bytes']))
+        if options['output']:
+            write_report(options['output'], {'files': options['files'], 'benchmarks': results})
+
+    def run(self, files_count, repeat):
+        user = User.objects.create_user(
+            username=self.username,
+            email=f'{self.username}@bench.local',
+            full_name='Bench User',
+            password='Bench-Passw0rd!',
+            storage_quota=10 ** 13,
+            is_admin=True,
+        )
+        generator = seeding.Generator([user], deleted_ratio=0)
+        seeding.create_files([user], files_count, generator, physical='small')
+
+        client = APIClient()
+        client.force_authenticate(user)
+        files = list(File.objects.filter(owner=user).select_related('owner'))
+        context = {'request': None}
+        results = {
+            'file_serializer': measure(lambda: FileSerializer(files, many=True, context=context).data, repeat=repeat),
+            'file_list_serializer': measure(
+                lambda: FileListSerializer(files, many=True, context=context).data, repeat=repeat
+            ),
+        }
+        for name, params in FILE_VIEWS.items():
+            params = dict(params, owner=user.pk, page_size=files_count)
+            results[name] = self.endpoint(client, '/api/files/', params, repeat)
+        # Повторный запрос того же списка из кеша ответов (accounts/response_cache.py)
+        with override_settings(RESPONSE_CACHE_ENABLED=True):
+            params = dict(FILE_VIEWS['files_dashboard'], owner=user.pk, page_size=files_count)
+            results['files_dashboard_cached'] = self.endpoint(client, '/api/files/', params, repeat)
+        for name, params in USER_VIEWS.items():
+            results[name] = self.endpoint(client, '/api/users/', dict(params, page_size=100), repeat)
+        return results
+
+    def endpoint(self, client, url, params, repeat):
+        """Время ответа, время выполнения SQL (медиана) и размер тела ответа."""
+        result = measure(lambda: client.get(url, params), repeat=repeat)
+        db_timings = []
+        for _ in range(repeat):
+            recorder = QueryRecorder(capture_stacks=False)
+            with connection.execute_wrapper(recorder):
+                response = client.get(url, params)
+            db_timings.append(sum(query['ms'] for query in recorder.queries))
+        result['db_ms'] = round(statistics.median(db_timings), 3)
+        result['bytes'] = len(response.content)
+        return result
@@ -0,0 +1,88 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from accounts.benchmarks import write_report, format_table
+from accounts.hashing import get_pool
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность входа: синхронный /api/auth/login/ в пуле потоков '
+        'и асинхронный /api/auth/async/login/ с хешированием в пуле процессов. '
+        'Результат приводится в том числе в пересчете на одно ядро.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на каждый режим')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных запросов')
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(username=options['username']).exists():
+            raise CommandError('Пользователь не найден')
+
+        self.credentials = {'username': options['username'], 'password': options['password']}
+        self.total = options['requests']
+        self.concurrency = options['concurrency']
+        cores = os.cpu_count() or 1
+        workers = settings.PASSWORD_HASHER_WORKERS or cores
+        get_pool()  # запуск пула не входит в замер
+
+        rows = [
+            self._row('sync', cores, *self._run_sync()),
+            self._row('async', min(workers, cores), *asyncio.run(self._run_async())),
+        ]
+
+        self.stdout.write(f'Ядер: {cores}, процессов хеширования: {workers}, одновременных запросов: {self.concurrency}')
+        self.stdout.write(format_table(rows, ['mode', 'ok', 'rejected', 'failed', 'seconds', 'rps', 'rps_per_core']))
+        if options['output']:
+            write_report(options['output'], {'cores': cores, 'hasher_workers': workers, 'modes': rows})
+
+    def _row(self, mode, cores, statuses, elapsed):
+        ok = statuses.count(200)
+        rejected = statuses.count(503)
+        return {
+            'mode': mode,
+            'ok': ok,
+            'rejected': rejected,
+            'failed': len(statuses) - ok - rejected,
+            'seconds': round(elapsed, 2),
+            'rps': round(ok / elapsed, 2),
+            'rps_per_core': round(ok / elapsed / cores, 2),
+        }
+
+    def _run_sync(self):
+        url = reverse('login')
+        cache.clear()  # сброс счетчиков ограничения частоты запросов
+
+        def login(_):
+            return Client().post(url, self.credentials, content_type='application/json').status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            statuses = list(executor.map(login, range(self.total)))
+        return statuses, time.perf_counter() - started
+
+    async def _run_async(self):
+        url = reverse('async-login')
+        await cache.aclear()
+        client = AsyncClient()
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def login():
+            async with limit:
+                response = await client.post(url, self.credentials, content_type='application/json')
+                return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*[login() for _ in range(self.total)])
+        return list(statuses), time.perf_counter() - started
@@ -0,0 +1,118 @@
+import os
+import shutil
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from accounts.benchmarks import measure, write_report, load_report, find_regressions, format_table
+from accounts.models import File, User, username_validator, email_validator, full_name_validator
+from accounts.validators import PasswordValidator
+
+BASELINE_DIR = os.path.join(settings.BASE_DIR, 'benchmarks', 'baselines')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки горячих путей моделей (File.save, human_readable_size, '
+        'storage_used, генерация ссылок, переименование, валидаторы). Результаты '
+        'сравниваются с базовыми для текущей СУБД; при регрессии команда завершается с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--files', type=int, default=200, help='Файлов у тестового пользователя')
+        parser.add_argument('--threshold', type=float, default=25, help='Допустимый рост медианы, %%')
+        parser.add_argument('--baseline', help='Файл базовых результатов (по умолчанию — для текущей СУБД)')
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как базовые')
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        baseline_path = options['baseline'] or os.path.join(BASELINE_DIR, f'models-{connection.vendor}.json')
+        self.storage_directory = f'bench_models_{os.getpid()}'
+
+        # Все данные создаются в транзакции, которая откатывается в конце
+        try:
+            with transaction.atomic():
+                results = self.run(options['repeat'], options['files'])
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, self.storage_directory), ignore_errors=True)
+
+        rows = [dict(name=name, **result) for name, result in results.items()]
+        self.stdout.write(f'СУБД: {connection.vendor}')
+        self.stdout.write(format_table(rows, ['name', 'median_ms', 'p95_ms', 'queries']))
+
+        report = {'database': connection.vendor, 'benchmarks': results}
+        if options['output']:
+            write_report(options['output'], report)
+        if options['save_baseline']:
+            write_report(baseline_path, report)
+            self.stdout.write(self.style.SUCCESS(f'Базовые результаты сохранены в {baseline_path}'))
+            return
+
+        if not os.path.exists(baseline_path):
+            self.stdout.write(self.style.WARNING(f'Нет базовых результатов {baseline_path}, сравнение пропущено'))
+            return
+        regressions = find_regressions(results, load_report(baseline_path)['benchmarks'], options['threshold'])
+        if regressions:
+            raise CommandError('Регрессии относительно базовых результатов:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий относительно базовых результатов нет'))
+
+    def run(self, repeat, files_count):
+        user = User.objects.create_user(
+            username=f'benchmodels{os.getpid() % 10 ** 6}',
+            email=f'bench{os.getpid()}@bench.local',
+            full_name='Bench User',
+            password='Bench-Passw0rd!',
+            storage_directory=self.storage_directory,
+            storage_quota=10 ** 12,
+        )
+        files = [
+            File(owner=user, file=ContentFile(b'x' * 1024, name=f'file{number}.txt'), original_name=f'file{number}.txt')
+            for number in range(files_count)
+        ]
+        for file in files:
+            file.save()
+        file = files[0]
+        counter = iter(range(10 ** 9))
+        password_validator = PasswordValidator()
+
+        def file_save_create():
+            with transaction.atomic():
+                created = File(owner=user, file=ContentFile(b'x' * 1024, name='new.txt'), original_name='new.txt')
+                created.save()
+                os.remove(created.file.path)
+                transaction.set_rollback(True)
+
+        def human_readable_size_unknown():
+            # Неизвестный размер (0) не должен приводить к обращению к диску
+            file.size = 0
+            return file.human_readable_size
+
+        def rename():
+            file.rename(f'renamed{next(counter)}.txt')
+
+        def validators():
+            username_validator('benchuser1')
+            email_validator('bench@example.com')
+            full_name_validator('Bench User')
+            password_validator.validate('Bench-Passw0rd!')
+            File._meta.get_field('original_name').clean('report (final).pdf', file)
+
+        benchmarks = {
+            'file_save_create': file_save_create,
+            'file_save_update': lambda: file.save(),
+            'human_readable_size': lambda: file.human_readable_size,
+            'human_readable_size_unknown': human_readable_size_unknown,
+            'user_storage_used': lambda: user.storage_used,
+            'generate_shared_link': lambda: (setattr(file, 'shared_link', None), file._generate_shared_link()),
+            'rename': rename,
+            'validators': validators,
+        }
+        return {name: measure(func, repeat=repeat, warmup=2) for name, func in benchmarks.items()}
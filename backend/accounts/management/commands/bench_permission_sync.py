@@ -0,0 +1,89 @@
+import time
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed
+from django.test.utils import CaptureQueriesContext
+from accounts.benchmarks import format_table, write_report
+from accounts.models import User
+from accounts.signals import (
+    update_user_permissions_on_group_change,
+    update_user_permissions_on_group_permissions_change,
+)
+
+
+def legacy_sync_user_permissions(user):
+    """Прежний построчный алгоритм синхронизации — только для сравнения."""
+    permissions = set()
+    for group in user.groups.all():
+        permissions.update(group.permissions.all())
+    user.user_permissions.set(permissions)
+    user.save()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает количество запросов и время синхронизации прав при массовых '
+        'изменениях группы: множественный алгоритм против прежнего построчного. '
+        'Все данные создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--permissions', type=int, default=5)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        rows = []
+        with transaction.atomic():
+            group = Group.objects.create(name='bench-permission-sync')
+            permissions = list(Permission.objects.all()[:options['permissions']])
+            group.permissions.set(permissions[:-1])
+            users = User.objects.bulk_create([
+                User(
+                    username=f'bench{i}', email=f'bench{i}@bench.local',
+                    full_name='Bench', storage_directory=f'bench_sync_{i}'
+                )
+                for i in range(options['users'])
+            ])
+
+            rows.append(self._run('add_users', lambda: group.custom_user_set.add(*users)))
+            rows.append(self._run('add_group_permission', lambda: group.permissions.add(permissions[-1])))
+            rows.append(self._run('remove_users', lambda: group.custom_user_set.remove(*users)))
+
+            m2m_changed.disconnect(update_user_permissions_on_group_change, sender=User.groups.through)
+            m2m_changed.disconnect(
+                update_user_permissions_on_group_permissions_change, sender=Group.permissions.through
+            )
+            try:
+                def legacy_add():
+                    for user in users:
+                        user.groups.add(group)
+                        legacy_sync_user_permissions(user)
+
+                def legacy_remove():
+                    for user in users:
+                        user.groups.remove(group)
+                        legacy_sync_user_permissions(user)
+
+                rows.append(self._run('legacy_add_users', legacy_add))
+                rows.append(self._run('legacy_remove_users', legacy_remove))
+            finally:
+                m2m_changed.connect(update_user_permissions_on_group_change, sender=User.groups.through)
+                m2m_changed.connect(
+                    update_user_permissions_on_group_permissions_change, sender=Group.permissions.through
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Пользователей в группе: {options['users']}")
+        self.stdout.write(format_table(rows, ['operation', 'queries', 'ms']))
+        if options['output']:
+            write_report(options['output'], {'users': options['users'], 'operations': rows})
+
+    def _run(self, name, func):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+        return {'operation': name, 'queries': len(context.captured_queries), 'ms': round(elapsed, 1)}
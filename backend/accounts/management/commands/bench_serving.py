@@ -0,0 +1,119 @@
+import os
+import socket
+import tempfile
+import threading
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import FileResponse
+from accounts.benchmarks import write_report, format_table
+from accounts.serving import FileRegion
+
+SINK_BUFFER = 4 * 1024 * 1024
+
+
+class Sink:
+    """Сокет, данные из которого вычитываются в отдельном потоке (как клиентом)."""
+
+    def __init__(self):
+        self.sender, self.receiver = socket.socketpair()
+        self.received = 0
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        buffer = bytearray(SINK_BUFFER)
+        while True:
+            received = self.receiver.recv_into(buffer)
+            if not received:
+                break
+            self.received += received
+
+    def close(self):
+        self.sender.close()
+        self.thread.join()
+        self.receiver.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пути отдачи файла: прежний FileResponse (копирование блоками по 4 КБ), '
+        'срезы memoryview над mmap (ASGI) и os.sendfile (WSGI с wsgi.file_wrapper). '
+        'Для каждого пути — скорость (МБ/с) и процессорное время отправляющего потока на 1 ГБ. '
+        'Файл читается из страничного кеша, получатель — локальный сокет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--block-size', type=int, default=settings.FILE_SERVING_BLOCK_SIZE)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        block_size = options['block_size']
+        with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, suffix='.bin') as file:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(options['size_mb']):
+                file.write(chunk)
+            file.flush()
+            path = file.name
+
+            senders = {
+                'django_file_response': lambda sink: self.iterate(sink, FileResponse(open(path, 'rb'))),
+                'mmap_memoryview': lambda sink: self.iterate(sink, FileRegion(0, size, block_size, file=open(path, 'rb'))),
+                'sendfile': lambda sink: self.sendfile(sink, FileRegion(0, size, block_size, file=open(path, 'rb'))),
+                'sendfile_range': lambda sink: self.sendfile(
+                    sink, FileRegion(size // 4, size // 2, block_size, file=open(path, 'rb'))
+                ),
+            }
+            # Прогрев страничного кеша
+            self.run(senders['django_file_response'])
+            results = {name: self.measure(sender, options['repeat']) for name, sender in senders.items()}
+
+        rows = [dict(name=name, **result) for name, result in results.items()]
+        self.stdout.write(f"Файл: {options['size_mb']} МБ, блок mmap: {block_size} байт")
+        self.stdout.write(format_table(rows, ['name', 'mb_per_s', 'cpu_s_per_gb', 'wall_ms']))
+        if options['output']:
+            write_report(options['output'], {
+                'size_mb': options['size_mb'], 'block_size': block_size, 'benchmarks': results,
+            })
+
+    def iterate(self, sink, content):
+        """Отправка блоков ответа, как это делает сервер без sendfile."""
+        try:
+            for block in content:
+                sink.sender.sendall(block)
+        finally:
+            content.close()
+
+    def sendfile(self, sink, region):
+        """Отправка участка через os.sendfile, как gunicorn для wsgi.file_wrapper."""
+        try:
+            fd = region.fileno()
+            offset, sent = os.lseek(fd, 0, os.SEEK_CUR), 0
+            while sent < region.length:
+                sent += os.sendfile(sink.sender.fileno(), fd, offset + sent, region.length - sent)
+        finally:
+            region.close()
+
+    def run(self, sender):
+        sink = Sink()
+        started_wall, started_cpu = time.perf_counter(), time.thread_time()
+        sender(sink)
+        wall, cpu = time.perf_counter() - started_wall, time.thread_time() - started_cpu
+        sink.close()
+        return sink.received, wall, cpu
+
+    def measure(self, sender, repeat):
+        runs = [self.run(sender) for _ in range(repeat)]
+        sent = runs[0][0]
+        wall = statistics.median(run[1] for run in runs)
+        cpu = statistics.median(run[2] for run in runs)
+        return {
+            'mb_per_s': round(sent / wall / 1024 / 1024, 1),
+            'cpu_s_per_gb': round(cpu / (sent / 1024 ** 3), 3),
+            'wall_ms': round(wall * 1000, 1),
+            'bytes': sent,
+        }
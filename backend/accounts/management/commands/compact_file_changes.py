@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает журнал изменений файлов: удаляет записи, перекрытые более поздними '
+        'изменениями того же файла, и записи старше срока хранения. Клиенты с курсором '
+        'старше срока хранения получат 410 и выполнят полную синхронизацию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.CHANGE_FEED_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        superseded, expired = changes.compact(options['retention_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено перекрытых записей: {superseded}, устаревших: {expired}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from accounts import multipart
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет незавершенные загрузки частями старше MULTIPART_UPLOAD_TTL: '
+        'временные файлы, принятые части и резервы квоты. Загрузки, завершение которых '
+        'прервалось дольше MULTIPART_COMPLETE_TIMEOUT назад, снова принимают части.'
+    )
+
+    def handle(self, *args, **options):
+        expired, recovered, orphans = multipart.expire()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {expired}, возвращено после прерванного завершения: {recovered}, '
+            f'временных файлов без записи: {orphans}'
+        ))
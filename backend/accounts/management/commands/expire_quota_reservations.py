@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from accounts import quota
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие резервы квоты незавершенных загрузок.'
+
+    def handle(self, *args, **options):
+        deleted = quota.expire_stale()
+        self.stdout.write(self.style.SUCCESS(f'Удалено резервов: {deleted}'))
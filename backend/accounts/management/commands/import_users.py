@@ -0,0 +1,43 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from accounts.provisioning import import_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовое создание пользователей из CSV (с заголовком) или JSONL. '
+        'Пароли хешируются в пуле процессов, записи сохраняются пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу импорта')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки')
+        parser.add_argument('--workers', type=int, default=8, help='Потоков для создания каталогов')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить записи, ничего не создавать')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Укажите --format csv или jsonl')
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                stats = import_file(
+                    f, fmt,
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in stats['errors']:
+            self.stderr.write(f"Строка {error['line']}: {error['error']}")
+
+        prefix = 'Проверено' if options['dry_run'] else 'Создано'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: {stats['created']}, пропущено: {stats['skipped']}, "
+            f"время: {stats['seconds']} с, {stats['users_per_second']} пользователей/с"
+        ))
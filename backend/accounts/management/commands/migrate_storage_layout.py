@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.models import File, user_directory_path
+from accounts.storage import relocate
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = '.storage_layout_checkpoint'
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит существующие файлы в шардированную раскладку каталогов. '
+        'Работает пачками без остановки сервиса и может быть продолжена после прерывания.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество записей в одной пачке')
+        parser.add_argument('--limit', type=int, default=0,
+                            help='Максимальное количество файлов для переноса (0 — без ограничений)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Пауза между пачками в секундах')
+        parser.add_argument('--restart', action='store_true',
+                            help='Игнорировать сохраненную контрольную точку и начать сначала')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, какие файлы будут перенесены')
+
+    def handle(self, *args, **options):
+        checkpoint_path = os.path.join(settings.MEDIA_ROOT, CHECKPOINT_NAME)
+        last_pk = None if options['restart'] else self._read_checkpoint(checkpoint_path)
+        if last_pk:
+            self.stdout.write(f'Продолжение с контрольной точки после {last_pk}')
+
+        moved = skipped = failed = 0
+        limit = options['limit']
+
+        while True:
+            queryset = File.objects.select_related('owner').only(
+                'id', 'file', 'owner__storage_directory'
+            ).order_by('pk')
+            if last_pk:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[:options['batch_size']])
+            if not batch:
+                break
+
+            for file in batch:
+                result = self._migrate_file(file, options['dry_run'])
+                if result is True:
+                    moved += 1
+                elif result is None:
+                    skipped += 1
+                else:
+                    failed += 1
+
+            last_pk = batch[-1].pk
+            if not options['dry_run']:
+                self._write_checkpoint(checkpoint_path, last_pk)
+            self.stdout.write(f'Перенесено: {moved}, пропущено: {skipped}, ошибок: {failed}')
+
+            if limit and moved >= limit:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        finished = not (limit and moved >= limit)
+
+        if not options['dry_run'] and finished and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Перенесено: {moved}, пропущено: {skipped}, ошибок: {failed}'
+        ))
+
+    def _migrate_file(self, file, dry_run):
+        if not file.file:
+            return None
+        old_name = file.file.name
+        new_name = user_directory_path(file, os.path.basename(old_name))
+        if old_name == new_name:
+            return None
+        if not os.path.exists(os.path.join(settings.MEDIA_ROOT, old_name)):
+            logger.warning(f"Physical file missing, skipping: {old_name}")
+            return False
+        if dry_run:
+            self.stdout.write(f'{old_name} -> {new_name}')
+            return True
+
+        try:
+            cleanup = relocate(old_name, new_name)
+        except OSError as e:
+            logger.error(f"Failed to relocate {old_name}: {str(e)}")
+            return False
+
+        updated = File.objects.filter(pk=file.pk, file=old_name).update(file=new_name)
+        if not updated:
+            # Запись изменилась или удалена во время переноса — откатываем копию
+            relocate(new_name, old_name)()
+            return None
+        cleanup()
+        return True
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_checkpoint(self, path, pk):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(pk))
+        os.replace(tmp_path, path)
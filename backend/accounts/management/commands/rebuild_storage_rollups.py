@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from accounts import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает агрегаты аналитики хранилища по таблице файлов. '
+        'Нужна для начального заполнения и после массовых операций в обход сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='ID пользователя (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        analytics.rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS('Агрегаты хранилища пересчитаны'))
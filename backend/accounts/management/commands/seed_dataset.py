@@ -0,0 +1,74 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts import analytics, seeding
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями и файлами с реалистичными '
+        'распределениями размера, типа, публичности, удаления и дат загрузки. '
+        'Строки вставляются пачками (COPY на PostgreSQL) в обход File.save и сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Создать пользователей')
+        parser.add_argument('--files', type=int, default=10000, help='Создать файлов')
+        parser.add_argument('--prefix', default='seed', help='Префикс имен пользователей')
+        parser.add_argument('--existing', action='store_true',
+                            help='Распределить файлы по уже созданным пользователям с префиксом')
+        parser.add_argument('--physical', choices=['none', 'sparse', 'small'], default='sparse',
+                            help='Физические файлы: нет, разреженные полного размера или маленькие')
+        parser.add_argument('--small-max', type=int, default=4096, help='Максимальный размер в режиме small')
+        parser.add_argument('--months', type=int, default=24, help='Глубина дат загрузки, месяцев')
+        parser.add_argument('--public-ratio', type=float, default=0.1)
+        parser.add_argument('--deleted-ratio', type=float, default=0.05)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--workers', type=int, default=8, help='Потоков для записи файлов на диск')
+        parser.add_argument('--seed', type=int, default=1, help='Seed генератора')
+        parser.add_argument('--skip-rollups', action='store_true', help='Не пересчитывать агрегаты аналитики')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = []
+        if options['users'] and not options['existing']:
+            users = seeding.create_users(options['users'], prefix=options['prefix'], workers=options['workers'])
+            self.stdout.write(f"Пользователей создано: {len(users)} за {time.perf_counter() - started:.1f} с")
+        if options['existing'] or not users:
+            users = list(User.objects.filter(username__startswith=options['prefix']).order_by('pk'))
+        if not users:
+            raise CommandError('Нет пользователей для распределения файлов')
+
+        generator = seeding.Generator(
+            users,
+            seed=options['seed'],
+            months=options['months'],
+            public_ratio=options['public_ratio'],
+            deleted_ratio=options['deleted_ratio'],
+        )
+        files_started = time.perf_counter()
+
+        def progress(created):
+            elapsed = time.perf_counter() - files_started
+            self.stdout.write(f'  файлов: {created} ({created / elapsed:.0f} строк/с)')
+
+        created = seeding.create_files(
+            users,
+            options['files'],
+            generator,
+            batch_size=options['batch_size'],
+            physical=options['physical'],
+            small_max=options['small_max'],
+            workers=options['workers'],
+            progress=progress,
+        )
+
+        user_ids = [user.pk for user in users]
+        seeding.fit_quotas(user_ids)
+        if not options['skip_rollups']:
+            analytics.rebuild(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано файлов: {created}, пользователей: {len(users)}, '
+            f'всего {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from django.conf import settings
+from prometheus_client import (
+    CollectorRegistry,
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+# Метрики в формате Prometheus. При работе нескольких процессов (gunicorn)
+# задайте переменную окружения PROMETHEUS_MULTIPROC_DIR до запуска сервера:
+# каждый процесс пишет значения в свои файлы в этом каталоге, а /metrics
+# собирает их вместе (см. хук child_exit в gunicorn.conf.py). Без переменной
+# используется реестр текущего процесса.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_LATENCY = Histogram(
+    'cloud_storage_request_duration_seconds',
+    'Время обработки запроса по представлениям',
+    ['view', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_BYTES = Counter(
+    'cloud_storage_request_bytes_total',
+    'Принятые байты тела запросов по представлениям',
+    ['view'],
+)
+RESPONSE_BYTES = Counter(
+    'cloud_storage_response_bytes_total',
+    'Отправленные байты ответов по представлениям',
+    ['view'],
+)
+REQUEST_QUERIES = Histogram(
+    'cloud_storage_request_db_queries',
+    'Количество SQL-запросов на один HTTP-запрос',
+    ['view'],
+    buckets=QUERY_BUCKETS,
+)
+ACTIVE_TRANSFERS = Gauge(
+    'cloud_storage_active_transfers',
+    'Загрузки и скачивания, выполняющиеся в данный момент',
+    ['direction'],
+    multiprocess_mode='livesum',
+)
+QUOTA_REJECTIONS = Counter(
+    'cloud_storage_quota_rejections_total',
+    'Загрузки, отклоненные по размеру или квоте',
+    ['reason'],
+)
+CACHE_REQUESTS = Counter(
+    'cloud_storage_cache_requests_total',
+    'Обращения к кешам приложения',
+    ['cache', 'result'],
+)
+QUERY_BUDGET_VIOLATIONS = Counter(
+    'cloud_storage_query_budget_violations_total',
+    'Нарушения бюджетов SQL-запросов и времени ответа',
+    ['view', 'kind'],
+)
+INSTANT_UPLOADS = Counter(
+    'cloud_storage_instant_uploads_total',
+    'Загрузки без передачи данных по хешу содержимого',
+    ['result'],
+)
+EVENT_STREAMS = Gauge(
+    'cloud_storage_event_streams',
+    'Открытые соединения Server-Sent Events',
+    multiprocess_mode='livesum',
+)
+EVENTS_PUBLISHED = Counter(
+    'cloud_storage_events_published_total',
+    'Опубликованные события Server-Sent Events',
+    ['event'],
+)
+BANDWIDTH_WAIT = Counter(
+    'cloud_storage_bandwidth_wait_seconds_total',
+    'Время ожидания передач из-за ограничения скорости',
+    ['direction'],
+)
+HOT_FILE_CACHE_BYTES = Gauge(
+    'cloud_storage_hot_file_cache_bytes',
+    'Объем содержимого файлов в кеше публичных скачиваний',
+    multiprocess_mode='livesum',
+)
+MULTIPART_UPLOADS = Counter(
+    'cloud_storage_multipart_uploads_total',
+    'Этапы загрузок частями: начатые, завершенные, отмененные и истекшие',
+    ['result'],
+)
+MULTIPART_PARTS = Counter(
+    'cloud_storage_multipart_parts_total',
+    'Принятые и отклоненные части загрузок',
+    ['result'],
+)
+FILE_SAVE_PHASE = Histogram(
+    'cloud_storage_file_save_phase_seconds',
+    'Длительность этапов File.save',
+    ['phase'],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Замеряет время выполнения блока и записывает его в гистограмму."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def file_save_phase(phase, instance):
+    """
+    Замер этапа File.save. Этапы дольше FILE_SAVE_SLOW_MS дополнительно
+    пишутся в лог с идентификатором файла.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        FILE_SAVE_PHASE.labels(phase=phase).observe(elapsed)
+        if elapsed * 1000 >= settings.FILE_SAVE_SLOW_MS:
+            logger.warning(f"Slow File.save phase '{phase}': {elapsed * 1000:.0f} ms (ID: {instance.id})")
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def render():
+    """Возвращает (тело, content-type) ответа /metrics."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
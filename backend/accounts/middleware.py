@@ -0,0 +1,176 @@
+import time
+from functools import partial
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from . import budgets, metrics
+
+# Типы тела запросов, которые учитываются как активные загрузки файлов
+UPLOAD_CONTENT_TYPES = ('multipart/form-data', 'application/octet-stream')
+
+
+class QueryCounter:
+    """Обертка выполнения SQL (connection.execute_wrapper), считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов: время обработки по представлениям, принятые
+    и отправленные байты, количество SQL-запросов и активные передачи файлов.
+
+    Для потоковых ответов (скачивания) передача считается активной до закрытия
+    ответа сервером. Отправленные байты берутся из Content-Length, а если его
+    нет — считаются по мере отдачи. Количество SQL-запросов считается только
+    при синхронной обработке: под ASGI запросы к БД выполняются в других потоках.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        counter = QueryCounter()
+        upload = self._start(request)
+        try:
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+        finally:
+            if upload:
+                metrics.ACTIVE_TRANSFERS.labels(direction='upload').dec()
+        return self._finish(request, response, started, counter.count)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        upload = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if upload:
+                metrics.ACTIVE_TRANSFERS.labels(direction='upload').dec()
+        return self._finish(request, response, started, None)
+
+    def _start(self, request):
+        """
+        Отмечает начало загрузки файла. Возвращает True для multipart-запросов
+        и частей загрузок частями (тело — содержимое части).
+        """
+        if request.method in ('POST', 'PUT') and request.content_type in UPLOAD_CONTENT_TYPES:
+            metrics.ACTIVE_TRANSFERS.labels(direction='upload').inc()
+            return True
+        return False
+
+    def _finish(self, request, response, started, queries):
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else 'unmatched'
+
+        metrics.REQUEST_LATENCY.labels(
+            view=view, method=request.method, status=response.status_code
+        ).observe(time.perf_counter() - started)
+        if queries is not None:
+            metrics.REQUEST_QUERIES.labels(view=view).observe(queries)
+
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length:
+            metrics.REQUEST_BYTES.labels(view=view).inc(content_length)
+
+        if not response.streaming:
+            metrics.RESPONSE_BYTES.labels(view=view).inc(len(response.content))
+            return response
+
+        # Потоки событий учитываются отдельно (cloud_storage_event_streams)
+        if not response.get('Content-Type', '').startswith('text/event-stream'):
+            metrics.ACTIVE_TRANSFERS.labels(direction='download').inc()
+            response._resource_closers.append(metrics.ACTIVE_TRANSFERS.labels(direction='download').dec)
+
+        if response.has_header('Content-Length'):
+            metrics.RESPONSE_BYTES.labels(view=view).inc(int(response['Content-Length']))
+        elif response.is_async:
+            response.streaming_content = self._acount(response.streaming_content, view)
+        else:
+            response.streaming_content = self._count(response.streaming_content, view)
+        return response
+
+    def _count(self, chunks, view):
+        counter = metrics.RESPONSE_BYTES.labels(view=view)
+        for chunk in chunks:
+            counter.inc(len(chunk))
+            yield chunk
+
+    async def _acount(self, chunks, view):
+        counter = metrics.RESPONSE_BYTES.labels(view=view)
+        async for chunk in chunks:
+            counter.inc(len(chunk))
+            yield chunk
+
+
+class QueryBudgetMiddleware:
+    """
+    Проверяет бюджеты SQL-запросов и времени ответа (см. accounts.budgets).
+    Запросы записываются со стеком вызова только для представлений,
+    у которых объявлен бюджет. Под ASGI бюджеты не проверяются (как и
+    количество запросов в MetricsMiddleware): асинхронные представления не
+    должны уходить в поток ради записи запросов.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Синхронный process_view Django выполнил бы в потоке
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        request._query_budget = None
+        started = time.perf_counter()
+        with connection.execute_wrapper(partial(self._record, request)):
+            response = self.get_response(request)
+
+        state = request._query_budget
+        if state is not None:
+            budget, recorder = state
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            label = request.resolver_match.view_name if request.resolver_match else request.path
+            violations = budgets.check(budget, recorder, elapsed_ms, label)
+            budgets.handle_violations(recorder, violations, label, settings.QUERY_BUDGETS_STRICT)
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def _record(request, execute, sql, params, many, context):
+        # Бюджет известен только после разрешения URL (process_view)
+        state = request._query_budget
+        if state is None:
+            return execute(sql, params, many, context)
+        return state[1](execute, sql, params, many, context)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = budgets.budget_for(request, view_func)
+        if budget is not None:
+            request._query_budget = (budget, budgets.QueryRecorder())
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return None
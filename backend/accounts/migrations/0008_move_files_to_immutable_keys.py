@@ -0,0 +1,54 @@
+import os
+import logging
+from django.conf import settings
+from django.db import migrations
+
+from accounts.storage import relocate, sharded_name, storage_key
+
+logger = logging.getLogger(__name__)
+
+
+def move_files_to_immutable_keys(apps, schema_editor):
+    """
+    Переносит физические файлы на неизменяемые ключи хранения.
+    Каждая строка обновляется отдельно, поэтому прерванную миграцию
+    можно безопасно запустить повторно.
+    """
+    File = apps.get_model('accounts', 'File')
+    queryset = File.objects.select_related('owner').only(
+        'id', 'file', 'owner__storage_directory'
+    ).order_by('pk')
+
+    for file in queryset.iterator(chunk_size=500):
+        old_name = file.file.name
+        if not old_name:
+            continue
+        new_name = sharded_name(
+            file.owner.storage_directory, file.id, storage_key(file.id, old_name)
+        )
+        if old_name == new_name:
+            continue
+        if not os.path.exists(os.path.join(settings.MEDIA_ROOT, old_name)):
+            logger.warning(f"Physical file missing, key not assigned: {old_name}")
+            continue
+
+        try:
+            cleanup = relocate(old_name, new_name)
+        except FileExistsError:
+            # По новому ключу лежит другой файл: строку оставляем на старом пути
+            logger.warning(f"Target already exists with different content, key not assigned: {old_name} -> {new_name}")
+            continue
+        File.objects.filter(pk=file.pk).update(file=new_name)
+        cleanup()
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0007_file_is_deleted'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_files_to_immutable_keys, migrations.RunPython.noop),
+    ]
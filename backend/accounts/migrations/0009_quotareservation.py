@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:24
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_move_files_to_immutable_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaReservation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='id')),
+                ('size', models.BigIntegerField(help_text='Зарезервированный объем в байтах', verbose_name='reserved size')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('expires_at', models.DateTimeField(verbose_name='expires at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quota_reservations', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'quota reservation',
+                'verbose_name_plural': 'quota reservations',
+                'indexes': [models.Index(fields=['user', 'expires_at'], name='accounts_qu_user_id_9d0730_idx'), models.Index(fields=['expires_at'], name='accounts_qu_expires_36d2a0_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('size__gte', 0)), name='quota_reservation_size_positive')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def fill_storage_rollups(apps, schema_editor):
+    File = apps.get_model('accounts', 'File')
+    StorageUsageRollup = apps.get_model('accounts', 'StorageUsageRollup')
+
+    buckets = File.objects.annotate(
+        month=TruncMonth('upload_date', tzinfo=timezone.get_current_timezone())
+    ).values(
+        'owner_id', 'file_type', 'month', 'is_public', 'is_deleted'
+    ).annotate(total=Sum('size'), count=Count('id')).order_by()
+
+    StorageUsageRollup.objects.bulk_create([
+        StorageUsageRollup(
+            user_id=row['owner_id'],
+            file_type=row['file_type'],
+            month=timezone.localdate(row['month']) if hasattr(row['month'], 'hour') else row['month'],
+            is_public=row['is_public'],
+            is_deleted=row['is_deleted'],
+            bytes=row['total'] or 0,
+            files_count=row['count'],
+        )
+        for row in buckets.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_quotareservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('bytes_added', models.BigIntegerField(default=0, verbose_name='bytes added')),
+                ('bytes_removed', models.BigIntegerField(default=0, verbose_name='bytes removed')),
+                ('files_added', models.BigIntegerField(default=0, verbose_name='files added')),
+                ('files_removed', models.BigIntegerField(default=0, verbose_name='files removed')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='storage_daily', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'daily storage usage',
+                'verbose_name_plural': 'daily storage usage',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='storage_daily_unique_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(choices=[('PDF', 'PDF Document'), ('WORD', 'Word Document'), ('IMAGE', 'Image'), ('TEXT', 'Text File'), ('OTHER', 'Other')], max_length=50, verbose_name='file type')),
+                ('month', models.DateField(verbose_name='upload month')),
+                ('is_public', models.BooleanField(verbose_name='is public')),
+                ('is_deleted', models.BooleanField(verbose_name='is deleted')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='bytes')),
+                ('files_count', models.BigIntegerField(default=0, verbose_name='files count')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='storage_rollups', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'storage usage rollup',
+                'verbose_name_plural': 'storage usage rollups',
+                'constraints': [models.UniqueConstraint(fields=('user', 'file_type', 'month', 'is_public', 'is_deleted'), name='storage_rollup_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_storage_rollups, migrations.RunPython.noop),
+    ]
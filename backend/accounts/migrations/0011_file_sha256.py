@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_storage_usage_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш содержимого для загрузки без передачи данных', max_length=64, null=True, verbose_name='SHA-256'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['sha256', 'size'], name='accounts_fi_sha256_e99f38_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_file_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileChangeWatermark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='file_change_watermark', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('compacted_through', models.BigIntegerField(default=0, verbose_name='compacted through')),
+            ],
+            options={
+                'verbose_name': 'file change watermark',
+                'verbose_name_plural': 'file change watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='FileChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('file_id', models.UUIDField(verbose_name='file id')),
+                ('action', models.CharField(choices=[('created', 'Created'), ('renamed', 'Renamed'), ('commented', 'Comment changed'), ('shared', 'Sharing changed'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('restored', 'Restored'), ('purged', 'Purged')], max_length=20, verbose_name='action')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_changes', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'file change',
+                'verbose_name_plural': 'file changes',
+                'indexes': [models.Index(fields=['user', 'id'], name='accounts_fi_user_id_b9a470_idx'), models.Index(fields=['user', 'file_id'], name='accounts_fi_user_id_750bdb_idx'), models.Index(fields=['created_at'], name='accounts_fi_created_29c476_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:11
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_file_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MultipartUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='id')),
+                ('original_name', models.CharField(max_length=255, verbose_name='original filename')),
+                ('comment', models.TextField(blank=True, max_length=500, verbose_name='comment')),
+                ('size', models.BigIntegerField(help_text='Полный размер файла в байтах', verbose_name='file size')),
+                ('part_size', models.BigIntegerField(help_text='Размер каждой части, кроме последней, в байтах', verbose_name='part size')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('completing', 'Completing')], default='uploading', max_length=20, verbose_name='status')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('expires_at', models.DateTimeField(verbose_name='expires at')),
+                ('quota_reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.quotareservation', verbose_name='quota reservation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='multipart_uploads', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'multipart upload',
+                'verbose_name_plural': 'multipart uploads',
+            },
+        ),
+        migrations.CreateModel(
+            name='MultipartUploadPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='part number')),
+                ('size', models.BigIntegerField(verbose_name='part size')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='created at')),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='accounts.multipartupload', verbose_name='upload')),
+            ],
+            options={
+                'verbose_name': 'multipart upload part',
+                'verbose_name_plural': 'multipart upload parts',
+                'ordering': ['number'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='multipartupload',
+            index=models.Index(fields=['expires_at'], name='accounts_mu_expires_4f0aae_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='multipartupload',
+            constraint=models.CheckConstraint(condition=models.Q(('size__gt', 0)), name='multipart_upload_size_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='multipartupload',
+            constraint=models.CheckConstraint(condition=models.Q(('part_size__gt', 0)), name='multipart_upload_part_size_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='multipartuploadpart',
+            constraint=models.UniqueConstraint(fields=('upload', 'number'), name='multipart_upload_part_unique'),
+        ),
+    ]
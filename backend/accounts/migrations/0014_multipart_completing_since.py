@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_multipart_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='multipartupload',
+            name='completing_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='completing since'),
+        ),
+    ]
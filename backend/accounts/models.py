@@ -1,16 +1,44 @@
 import os
 import uuid
+import hashlib
 import logging
 from django.db import models
+from django.dispatch import Signal
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group
 from django.conf import settings
 from django.core.validators import FileExtensionValidator, RegexValidator
-from django.db.models import Sum
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from .storage import sharded_name, storage_key
+from .metrics import file_save_phase
+from . import response_cache
 
 logger = logging.getLogger(__name__)
 
+# Валидаторы создаются один раз на уровне модуля и переиспользуются
+# менеджером, полями модели и массовым импортом пользователей
+username_validator = RegexValidator(
+    regex=r'^[a-zA-Z][a-zA-Z0-9]{3,19}$',
+    message=_('Username должен начинаться с буквы, содержать только буквы и цифры, длина 4-20 символов.')
+)
+
+email_validator = RegexValidator(
+    regex=r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$',
+    message=_('Введите корректный email.')
+)
+
+full_name_validator = RegexValidator(
+    regex=r'^[a-zA-Zа-яА-ЯёЁ\s\-]+$',
+    message=_('Полное имя может содержать только буквы, пробелы и дефисы.')
+)
+
+# Переименование файла выполняется через update() в обход post_save,
+# поэтому обработчики (журнал изменений) подписываются на отдельный сигнал
+file_renamed = Signal()
+
 class UserManager(BaseUserManager):
     def create_user(self, username, email, full_name, password=None, **extra_fields):        
         if not email:
@@ -50,26 +78,26 @@ class UserManager(BaseUserManager):
 
         return self.create_user(username, email, full_name, password, **extra_fields)
 
+    def with_usage(self):
+        """
+        Пользователи с аннотациями занятого места и количества файлов,
+        чтобы списки не выполняли по два агрегирующих запроса на каждую строку.
+        """
+        live = Q(files__is_deleted=False)
+        # Meta.ordering не применяется к запросам с GROUP BY, задаем явно
+        return self.get_queryset().annotate(
+            storage_used_total=Coalesce(Sum('files__size', filter=live), Value(0)),
+            files_count_total=Count('files', filter=live),
+        ).order_by(*self.model._meta.ordering)
+
     def _validate_username(self, username):
-        validator = RegexValidator(
-            regex=r'^[a-zA-Z][a-zA-Z0-9]{3,19}$',
-            message=_('Username должен начинаться с буквы, содержать только буквы и цифры, длина 4-20 символов.')
-        )
-        validator(username)
+        username_validator(username)
 
     def _validate_email(self, email):
-        validator = RegexValidator(
-            regex=r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$',
-            message=_('Введите корректный email.')
-        )
-        validator(email)
+        email_validator(email)
 
     def _validate_full_name(self, full_name):
-        validator = RegexValidator(
-            regex=r'^[a-zA-Zа-яА-ЯёЁ\s\-]+$',
-            message=_('Полное имя может содержать только буквы, пробелы и дефисы.')
-        )
-        validator(full_name)
+        full_name_validator(full_name)
 
     def _validate_password(self, password):
         from .validators import PasswordValidator
@@ -81,12 +109,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         _('username'),
         max_length=20,
         unique=True,
-        validators=[
-            RegexValidator(
-                regex=r'^[a-zA-Z][a-zA-Z0-9]{3,19}$',
-                message=_('Username должен начинаться с буквы, содержать только буквы и цифры, длина 4-20 символов.')
-            )
-        ],
+        validators=[username_validator],
         help_text=_('Обязательное поле. 4-20 символов. Только буквы и цифры. Первый символ — буква.'),
     )
 
@@ -94,23 +117,13 @@ class User(AbstractBaseUser, PermissionsMixin):
         _('email address'),
         max_length=255,
         unique=True,
-        validators=[
-            RegexValidator(
-                regex=r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$',
-                message=_('Введите корректный email.')
-            )
-        ],
+        validators=[email_validator],
     )
 
     full_name = models.CharField(
         _('full name'),
         max_length=255,
-        validators=[
-            RegexValidator(
-                regex=r'^[a-zA-Zа-яА-ЯёЁ\s\-]+$',
-                message=_('Полное имя может содержать только буквы, пробелы и дефисы.')
-            )
-        ]
+        validators=[full_name_validator]
     )
 
     storage_directory = models.CharField(
@@ -183,8 +196,16 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     @property
     def storage_used(self):
+        if hasattr(self, 'storage_used_total'):
+            return self.storage_used_total
         return self.files.filter(is_deleted=False).aggregate(total=Sum('size'))['total'] or 0
 
+    @property
+    def files_count(self):
+        if hasattr(self, 'files_count_total'):
+            return self.files_count_total
+        return self.files.filter(is_deleted=False).count()
+
     @property
     def storage_left(self):
         return max(0, self.storage_quota - self.storage_used)
@@ -201,8 +222,18 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.storage_left >= file_size
 
 
+def format_size(size):
+    """Размер в байтах в удобочитаемом виде. Чистое вычисление, без обращения к диску."""
+    size = size or 0
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
 def user_directory_path(instance, filename):
-    return os.path.join(instance.owner.storage_directory, filename)
+    return sharded_name(instance.owner.storage_directory, instance.id, storage_key(instance.id, filename))
 
 
 class File(models.Model):
@@ -255,6 +286,15 @@ class File(models.Model):
         help_text=_('Размер файла в байтах'),
     )
 
+    sha256 = models.CharField(
+        _('SHA-256'),
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Хеш содержимого для загрузки без передачи данных'),
+    )
+
     upload_date = models.DateTimeField(
         _('upload date'),
         auto_now_add=True,
@@ -312,14 +352,35 @@ class File(models.Model):
             models.Index(fields=['owner']),
             models.Index(fields=['upload_date']),
             models.Index(fields=['file_type']),
+            models.Index(fields=['sha256', 'size']),
         ]
         constraints = [
             models.CheckConstraint(check=models.Q(size__gte=0), name='file_size_positive')
         ]
 
+    # Поля, значения которых запоминаются при загрузке из БД,
+    # чтобы обработчики сигналов видели изменения без повторного запроса
+    TRACKED_FIELDS = (
+        'owner_id', 'file_type', 'upload_date', 'is_public', 'is_deleted', 'size',
+        'original_name', 'comment', 'shared_link',
+    )
+
     def __str__(self):
         return f"{self.original_name} (Владелец: {self.owner.username})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_state()
+        return instance
+
+    def _tracked_state(self):
+        return {
+            name: self.__dict__[name]
+            for name in self.TRACKED_FIELDS
+            if name in self.__dict__
+        }
+
     def clean(self):
         if not self.pk and not self.is_deleted:  
             file_size = self.size if self.size > 0 else (self.file.size if hasattr(self.file, 'size') else 0)
@@ -354,6 +415,16 @@ class File(models.Model):
         else:
             self.size = 0
 
+    def _calculate_sha256(self):
+        # Загрузки через API приходят с хешем, посчитанным при приеме данных;
+        # здесь — только новые файлы из других источников (например, админки)
+        if self.sha256 or not self.file or self.file._committed:
+            return
+        digest = hashlib.sha256()
+        for chunk in self.file.chunks():
+            digest.update(chunk)
+        self.sha256 = digest.hexdigest()
+
     def _generate_shared_link(self):
         if not self.shared_link:            
             self.shared_link = uuid.uuid4().hex[:16]            
@@ -383,59 +454,51 @@ class File(models.Model):
                 logger.error(f"Error deleting file {self.file.path}: {str(e)}")
                 raise ValidationError(_("Ошибка при удалении файла"))
             
-    def rename_physical_file(self, new_name):
-        if self.file and hasattr(self.file, 'path'):
-            try:
-                old_path = self.file.path                
-                
-                if not os.path.exists(old_path):
-                    return                
-                
-                directory = os.path.dirname(old_path)
-                current_filename = os.path.basename(old_path)                
-                
-                current_name_without_ext, current_ext = os.path.splitext(current_filename)                
-                
-                new_name_without_ext, new_ext = os.path.splitext(new_name)
-                
-                if new_ext:                    
-                    final_filename = new_name
-                else:                    
-                    final_filename = new_name + current_ext
-                
-                new_path = os.path.join(directory, final_filename)                
-                
-                if old_path == new_path:
-                    return                
-                
-                os.rename(old_path, new_path)                
-                
-                self.file.name = os.path.relpath(new_path, settings.MEDIA_ROOT)
-                
-            except (FileNotFoundError, OSError) as e:
-                logger.error(f"Error renaming file: {str(e)}")
-                raise ValidationError(_("Ошибка при переименовании файла"))
-            except Exception as e:
-                logger.error(f"Unexpected error renaming file: {str(e)}")
-                raise ValidationError(_("Неожиданная ошибка при переименовании файла"))
+    def rename(self, new_name):
+        """
+        Переименование файла без обращения к диску.
+        Меняется только отображаемое имя, физический ключ хранения неизменен.
+        """
+        new_name = new_name.strip()
+        if not os.path.splitext(new_name)[1]:
+            new_name += os.path.splitext(self.file.name)[1]
+
+        self._meta.get_field('original_name').clean(new_name, self)
+        File.objects.filter(pk=self.pk).update(original_name=new_name)
+        self.original_name = new_name
+        # update() обходит post_save, поэтому кеш ответов сбрасывается явно,
+        # а журнал изменений обновляет обработчик file_renamed
+        response_cache.invalidate(self.owner_id)
+        if hasattr(self, '_loaded_values'):
+            self._loaded_values['original_name'] = new_name
+        file_renamed.send(sender=File, instance=self)
+        logger.info(f"File renamed: {new_name} (ID: {self.id})")
+
+    def mark_downloaded(self):
+        """
+        Отмечает время скачивания одним UPDATE, без пересчета размера по диску
+        и валидации полного сохранения. Журнал изменений и агрегаты не зависят
+        от last_download, а кеш ответов сбрасывается явно.
+        """
+        self.last_download = timezone.now()
+        File.objects.filter(pk=self.pk).update(last_download=self.last_download)
+        response_cache.invalidate(self.owner_id)
 
     def save(self, *args, **kwargs):
         if not self.is_deleted:
-            self._set_original_name()
-            self._determine_file_type()
-            self._calculate_file_size()
-            self._generate_shared_link()  
-    
-        if self.pk and not self.is_deleted:
-            try:
-                old_file = File.objects.get(pk=self.pk)
-                if old_file.original_name != self.original_name:
-                    self.rename_physical_file(self.original_name)
-            except File.DoesNotExist:
-                pass
-
-        self.full_clean()
-        super().save(*args, **kwargs)    
+            with file_save_phase('prepare', self):
+                self._set_original_name()
+                self._determine_file_type()
+                self._calculate_file_size()
+                self._calculate_sha256()
+                self._generate_shared_link()
+
+        with file_save_phase('validate', self):
+            self.full_clean()
+        # Запись содержимого в хранилище, INSERT/UPDATE и обработчики post_save
+        with file_save_phase('write', self):
+            super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_state()
 
     def _get_file_type(self):
         if not self.file:
@@ -454,24 +517,7 @@ class File(models.Model):
 
     @property
     def human_readable_size(self):
-        size = self._get_actual_file_size()
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} TB"
-
-    def _get_actual_file_size(self):
-        if (self.size == 0 and not self.is_deleted and 
-            hasattr(self.file, 'path') and os.path.exists(self.file.path)):
-            try:
-                self.size = os.path.getsize(self.file.path)                
-                self.save(update_fields=['size'])
-            except (FileNotFoundError, OSError):
-                self.size = 0
-            except Exception as e:
-                logger.error(f"Error updating file size: {str(e)}")
-        return self.size
+        return format_size(self.size)
 
     def can_be_accessed_by(self, user):
         if self.is_deleted:
@@ -487,4 +533,368 @@ class File(models.Model):
         if request:
             return request.build_absolute_uri(f'/public/files/{self.shared_link}/')
         else:            
-            return f'/public/files/{self.shared_link}/'
\ No newline at end of file
+            return f'/public/files/{self.shared_link}/'
+
+
+class QuotaReservation(models.Model):
+    """
+    Резерв места в хранилище на время загрузки.
+    Сумма размеров файлов и действующих резервов не превышает квоту пользователя.
+    """
+    id = models.UUIDField(
+        _('id'),
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='quota_reservations',
+        verbose_name=_('user'),
+    )
+
+    size = models.BigIntegerField(
+        _('reserved size'),
+        help_text=_('Зарезервированный объем в байтах'),
+    )
+
+    created_at = models.DateTimeField(
+        _('created at'),
+        auto_now_add=True,
+    )
+
+    expires_at = models.DateTimeField(
+        _('expires at'),
+    )
+
+    class Meta:
+        verbose_name = _('quota reservation')
+        verbose_name_plural = _('quota reservations')
+        indexes = [
+            models.Index(fields=['user', 'expires_at']),
+            models.Index(fields=['expires_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(size__gte=0), name='quota_reservation_size_positive')
+        ]
+
+    def __str__(self):
+        return f"{self.size} B (Пользователь: {self.user_id})"
+
+
+
+class StorageUsageRollup(models.Model):
+    """
+    Агрегат использования хранилища по срезам: тип файла, месяц загрузки,
+    публичность и удаление. Обновляется инкрементально при изменении файлов.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='storage_rollups',
+        verbose_name=_('user'),
+    )
+
+    file_type = models.CharField(
+        _('file type'),
+        max_length=50,
+        choices=File.FileType.choices,
+    )
+
+    month = models.DateField(
+        _('upload month'),
+    )
+
+    is_public = models.BooleanField(
+        _('is public'),
+    )
+
+    is_deleted = models.BooleanField(
+        _('is deleted'),
+    )
+
+    bytes = models.BigIntegerField(
+        _('bytes'),
+        default=0,
+    )
+
+    files_count = models.BigIntegerField(
+        _('files count'),
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = _('storage usage rollup')
+        verbose_name_plural = _('storage usage rollups')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'file_type', 'month', 'is_public', 'is_deleted'],
+                name='storage_rollup_unique_bucket'
+            )
+        ]
+
+
+class StorageUsageDaily(models.Model):
+    """Дневные изменения занятого места (без учета удаленных файлов)."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='storage_daily',
+        verbose_name=_('user'),
+    )
+
+    day = models.DateField(
+        _('day'),
+    )
+
+    bytes_added = models.BigIntegerField(
+        _('bytes added'),
+        default=0,
+    )
+
+    bytes_removed = models.BigIntegerField(
+        _('bytes removed'),
+        default=0,
+    )
+
+    files_added = models.BigIntegerField(
+        _('files added'),
+        default=0,
+    )
+
+    files_removed = models.BigIntegerField(
+        _('files removed'),
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = _('daily storage usage')
+        verbose_name_plural = _('daily storage usage')
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='storage_daily_unique_day')
+        ]
+
+
+class FileChange(models.Model):
+    """
+    Запись журнала изменений файлов пользователя для синхронизации клиентов.
+    ID записи служит курсором: клиент запрашивает изменения после последнего
+    полученного ID. Ссылка на файл хранится без внешнего ключа, чтобы запись
+    об окончательном удалении (tombstone) пережила сам файл.
+    """
+    class Action(models.TextChoices):
+        CREATED = 'created', _('Created')
+        RENAMED = 'renamed', _('Renamed')
+        COMMENTED = 'commented', _('Comment changed')
+        SHARED = 'shared', _('Sharing changed')
+        UPDATED = 'updated', _('Updated')
+        DELETED = 'deleted', _('Deleted')
+        RESTORED = 'restored', _('Restored')
+        PURGED = 'purged', _('Purged')
+
+    id = models.BigAutoField(primary_key=True)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='file_changes',
+        verbose_name=_('user'),
+    )
+
+    file_id = models.UUIDField(
+        _('file id'),
+    )
+
+    action = models.CharField(
+        _('action'),
+        max_length=20,
+        choices=Action.choices,
+    )
+
+    created_at = models.DateTimeField(
+        _('created at'),
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = _('file change')
+        verbose_name_plural = _('file changes')
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['user', 'file_id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.file_id} (Пользователь: {self.user_id})"
+
+
+class FileChangeWatermark(models.Model):
+    """
+    Граница сжатия журнала изменений пользователя: записи с ID не больше
+    compacted_through удалены, поэтому курсор меньше этой границы устарел.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='file_change_watermark',
+        verbose_name=_('user'),
+    )
+
+    compacted_through = models.BigIntegerField(
+        _('compacted through'),
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = _('file change watermark')
+        verbose_name_plural = _('file change watermarks')
+
+    def __str__(self):
+        return f"{self.compacted_through} (Пользователь: {self.user_id})"
+
+
+class MultipartUpload(models.Model):
+    """
+    Незавершенная загрузка большого файла частями (accounts/multipart.py).
+    Части записываются во временный файл заранее выделенного размера по
+    смещениям (номер - 1) * part_size; после завершения файл переносится
+    на постоянное место без копирования.
+    """
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', _('Uploading')
+        COMPLETING = 'completing', _('Completing')
+
+    id = models.UUIDField(
+        _('id'),
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='multipart_uploads',
+        verbose_name=_('user'),
+    )
+
+    original_name = models.CharField(
+        _('original filename'),
+        max_length=255,
+    )
+
+    comment = models.TextField(
+        _('comment'),
+        blank=True,
+        max_length=500,
+    )
+
+    size = models.BigIntegerField(
+        _('file size'),
+        help_text=_('Полный размер файла в байтах'),
+    )
+
+    part_size = models.BigIntegerField(
+        _('part size'),
+        help_text=_('Размер каждой части, кроме последней, в байтах'),
+    )
+
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=Status.choices,
+        default=Status.UPLOADING,
+    )
+
+    # Начало завершения: прерванное завершение (сбой процесса) через
+    # MULTIPART_COMPLETE_TIMEOUT может перехватить другой запрос
+    completing_since = models.DateTimeField(
+        _('completing since'),
+        null=True,
+        blank=True,
+    )
+
+    quota_reservation = models.ForeignKey(
+        QuotaReservation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('quota reservation'),
+    )
+
+    created_at = models.DateTimeField(
+        _('created at'),
+        auto_now_add=True,
+    )
+
+    expires_at = models.DateTimeField(
+        _('expires at'),
+    )
+
+    class Meta:
+        verbose_name = _('multipart upload')
+        verbose_name_plural = _('multipart uploads')
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(size__gt=0), name='multipart_upload_size_positive'),
+            models.CheckConstraint(check=models.Q(part_size__gt=0), name='multipart_upload_part_size_positive'),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} (Пользователь: {self.user_id})"
+
+    @property
+    def parts_count(self):
+        return -(-self.size // self.part_size)
+
+    def part_range(self, number):
+        """Смещение и размер части с номером number (с 1)."""
+        offset = (number - 1) * self.part_size
+        return offset, min(self.part_size, self.size - offset)
+
+
+class MultipartUploadPart(models.Model):
+    """Принятая часть загрузки с SHA-256 ее содержимого."""
+    upload = models.ForeignKey(
+        MultipartUpload,
+        on_delete=models.CASCADE,
+        related_name='parts',
+        verbose_name=_('upload'),
+    )
+
+    number = models.PositiveIntegerField(
+        _('part number'),
+    )
+
+    size = models.BigIntegerField(
+        _('part size'),
+    )
+
+    sha256 = models.CharField(
+        _('SHA-256'),
+        max_length=64,
+    )
+
+    created_at = models.DateTimeField(
+        _('created at'),
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = _('multipart upload part')
+        verbose_name_plural = _('multipart upload parts')
+        ordering = ['number']
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'number'], name='multipart_upload_part_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id} #{self.number}"
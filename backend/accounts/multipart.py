@@ -0,0 +1,387 @@
+import os
+import re
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ValidationError
+from . import bandwidth, metrics, quota
+from .exceptions import MultipartUploadBusy, PartChecksumMismatch
+from .models import File, MultipartUpload, MultipartUploadPart
+
+logger = logging.getLogger(__name__)
+
+# Загрузка больших файлов частями (как multipart upload в S3).
+#
+# Клиент начинает загрузку (размер и имя файла), получает размер части и
+# загружает части с номерами 1..N в любом порядке и параллельно из нескольких
+# соединений: PUT с телом части и ее SHA-256 в заголовке X-Content-SHA256.
+# Квота резервируется на весь файл при начале загрузки.
+#
+# Временный файл создается сразу полного размера (posix_fallocate), и каждая
+# часть записывается через pwrite по смещению (номер - 1) * part_size, поэтому
+# сборка частей не требует ни склейки, ни дополнительной копии: после
+# завершения файл переносится на постоянное место переименованием в пределах
+# MEDIA_ROOT. SHA-256 части проверяется при приеме; при завершении клиент
+# присылает список частей с хешами, и сервер сверяет его с принятыми частями.
+# Файл при завершении не читается: запрос укладывается в таймаут воркера при
+# любом размере файла. Часть, которую параллельный запрос перезаписывал во время
+# завершения, к концу переноса пропадет из принятых или сменит хеш — такое
+# завершение откатывается. SHA-256 всего файла (File.sha256) считается позже:
+# manage.py backfill_files --hashes.
+#
+# ID файла совпадает с ID загрузки, поэтому его постоянный путь известен и
+# после сбоя. Завершение, прерванное падением процесса, оставляет загрузку в
+# состоянии COMPLETING; через MULTIPART_COMPLETE_TIMEOUT ее перехватывают
+# повторное завершение, отмена или expire_multipart_uploads: собранный файл
+# возвращается во временный.
+#
+# Незавершенные загрузки удаляются вместе с временными файлами и резервами
+# квоты через MULTIPART_UPLOAD_TTL секунд: manage.py expire_multipart_uploads.
+
+UPLOADS_DIRECTORY = 'multipart_uploads'
+CHUNK_SIZE = 1024 * 1024
+SHA256_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+
+def temp_path(upload_id):
+    hex_id = upload_id.hex if hasattr(upload_id, 'hex') else str(upload_id).replace('-', '')
+    return os.path.join(settings.MEDIA_ROOT, UPLOADS_DIRECTORY, f'{hex_id}.part')
+
+
+def _preallocate(path, size):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+    try:
+        try:
+            # Блоки выделяются сразу: нехватка места обнаружится до загрузки частей
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            # ФС без fallocate (или не Linux) — разреженный файл нужного размера
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def choose_part_size(size, part_size=None):
+    """Размер части: запрошенный клиентом или по умолчанию, увеличенный до MULTIPART_MAX_PARTS частей."""
+    if part_size is None:
+        part_size = max(settings.MULTIPART_PART_SIZE, -(-size // settings.MULTIPART_MAX_PARTS))
+        return min(part_size, settings.MULTIPART_MAX_PART_SIZE)
+    if -(-size // part_size) > settings.MULTIPART_MAX_PARTS:
+        raise ValidationError({'part_size': _('Слишком много частей: не более %(max)s.') % {
+            'max': settings.MULTIPART_MAX_PARTS
+        }})
+    return part_size
+
+
+def _validate_name(original_name, comment):
+    errors = {}
+    for field_name, field, value in (
+        ('original_name', File._meta.get_field('original_name'), original_name),
+        ('original_name', File._meta.get_field('file'), ContentFile(b'', name=original_name)),
+        ('comment', File._meta.get_field('comment'), comment),
+    ):
+        try:
+            field.run_validators(value)
+        except DjangoValidationError as e:
+            errors.setdefault(field_name, []).extend(e.messages)
+    if errors:
+        raise ValidationError(errors)
+
+
+def initiate(user, original_name, size, comment='', part_size=None):
+    """Начинает загрузку частями: резервирует квоту и создает временный файл полного размера."""
+    _validate_name(original_name, comment)
+    part_size = choose_part_size(size, part_size)
+
+    reservation = quota.reserve(user, size, ttl=settings.MULTIPART_UPLOAD_TTL)
+    upload = MultipartUpload.objects.create(
+        user=user,
+        original_name=original_name,
+        comment=comment,
+        size=size,
+        part_size=part_size,
+        quota_reservation=reservation,
+        expires_at=reservation.expires_at,
+    )
+    path = temp_path(upload.pk)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _preallocate(path, size)
+    except Exception:
+        _remove(path)
+        upload.delete()
+        quota.release(reservation)
+        raise
+
+    metrics.MULTIPART_UPLOADS.labels(result='initiated').inc()
+    logger.info(
+        f"User {user.username} started multipart upload {upload.pk} "
+        f"({original_name}, {size} bytes, {upload.parts_count} parts)"
+    )
+    return upload
+
+
+def get_upload(user, upload_id):
+    """Действующая загрузка пользователя или 404."""
+    upload = MultipartUpload.objects.filter(
+        pk=upload_id, user=user, expires_at__gt=timezone.now()
+    ).select_related('user', 'quota_reservation').first()
+    if upload is None:
+        raise NotFound(_('Загрузка не найдена или истекла.'))
+    return upload
+
+
+def upload_part(upload, number, stream, length, sha256, throttle=None):
+    """
+    Принимает часть number из потока stream (length байт по Content-Length)
+    и записывает ее во временный файл по смещению части.
+    """
+    if not SHA256_PATTERN.match(sha256 or ''):
+        raise ValidationError({'sha256': _('Укажите SHA-256 части в заголовке X-Content-SHA256.')})
+    if not 1 <= number <= upload.parts_count:
+        raise ValidationError({'number': _('Номер части должен быть от 1 до %(max)s.') % {
+            'max': upload.parts_count
+        }})
+    offset, expected = upload.part_range(number)
+    if length != expected:
+        raise ValidationError({'size': _('Размер части %(number)s должен быть %(size)s байт.') % {
+            'number': number, 'size': expected
+        }})
+    if upload.status != MultipartUpload.Status.UPLOADING:
+        raise MultipartUploadBusy()
+
+    # Прежняя версия части перестает считаться принятой до конца записи
+    MultipartUploadPart.objects.filter(upload=upload, number=number).delete()
+
+    digest = hashlib.sha256()
+    chunk_size = bandwidth.QUANTUM if throttle else CHUNK_SIZE
+    written = 0
+    fd = os.open(temp_path(upload.pk), os.O_WRONLY)
+    try:
+        while written < expected:
+            chunk = stream.read(min(chunk_size, expected - written))
+            if not chunk:
+                break
+            os.pwrite(fd, chunk, offset + written)
+            digest.update(chunk)
+            written += len(chunk)
+            if throttle:
+                throttle.wait(len(chunk))
+    finally:
+        os.close(fd)
+
+    if written != expected:
+        metrics.MULTIPART_PARTS.labels(result='incomplete').inc()
+        raise ValidationError({'size': _('Получено %(received)s байт из %(size)s.') % {
+            'received': written, 'size': expected
+        }})
+    received = digest.hexdigest()
+    if not constant_time_compare(received, sha256.lower()):
+        logger.warning(f"Checksum mismatch for part {number} of multipart upload {upload.pk}")
+        metrics.MULTIPART_PARTS.labels(result='checksum_failed').inc()
+        raise PartChecksumMismatch()
+
+    try:
+        part = MultipartUploadPart.objects.create(upload=upload, number=number, size=written, sha256=received)
+    except IntegrityError:
+        # Ту же часть параллельно загрузил другой запрос: принятой считается последняя
+        MultipartUploadPart.objects.filter(upload=upload, number=number).update(size=written, sha256=received)
+        part = MultipartUploadPart(upload=upload, number=number, size=written, sha256=received)
+    metrics.MULTIPART_PARTS.labels(result='accepted').inc()
+    return part
+
+
+def _check_manifest(upload, manifest):
+    parts = {part.number: part for part in upload.parts.all()}
+    numbers = [item['number'] for item in manifest]
+    if numbers != list(range(1, upload.parts_count + 1)):
+        raise ValidationError({'parts': _('Нужны все части с 1 по %(max)s по порядку.') % {
+            'max': upload.parts_count
+        }})
+    missing = [number for number in numbers if number not in parts]
+    if missing:
+        raise ValidationError({'parts': _('Части не загружены: %(numbers)s.') % {
+            'numbers': ', '.join(map(str, missing))
+        }})
+    for item in manifest:
+        if not constant_time_compare(item['sha256'].lower(), parts[item['number']].sha256):
+            raise PartChecksumMismatch(_('Хеш части %(number)s не совпадает с принятой частью.') % {
+                'number': item['number']
+            })
+    return {number: part.sha256 for number, part in parts.items()}
+
+
+def _target(upload):
+    """Файл, который создает завершение загрузки (еще не сохраненный)."""
+    file = File(id=upload.pk, owner=upload.user, original_name=upload.original_name,
+                comment=upload.comment, size=upload.size)
+    file.file.name = File._meta.get_field('file').generate_filename(file, upload.original_name)
+    return file
+
+
+def _stuck():
+    """Условие для загрузок, завершение которых прервалось."""
+    stale = timezone.now() - timedelta(seconds=settings.MULTIPART_COMPLETE_TIMEOUT)
+    return Q(status=MultipartUpload.Status.COMPLETING) & (
+        Q(completing_since__lte=stale) | Q(completing_since__isnull=True)
+    )
+
+
+def _take_back(upload):
+    """Возвращает во временный файл собранный файл прерванного завершения."""
+    path = _target(upload).file.path
+    if os.path.exists(path) and not File.objects.filter(pk=upload.pk).exists():
+        os.replace(path, temp_path(upload.pk))
+        logger.warning(f"Moved back assembled file of interrupted multipart upload {upload.pk}")
+
+
+def _claim(upload):
+    """
+    Переводит загрузку в COMPLETING одним условным UPDATE: из параллельных
+    запросов ее получает только один. Загрузка, завершение которой прервалось,
+    перехватывается, и собранный файл возвращается во временный.
+    """
+    now = timezone.now()
+    claimed = MultipartUpload.objects.filter(pk=upload.pk).filter(
+        Q(status=MultipartUpload.Status.UPLOADING) | _stuck()
+    ).update(status=MultipartUpload.Status.COMPLETING, completing_since=now)
+    if not claimed:
+        raise MultipartUploadBusy()
+    if upload.status == MultipartUpload.Status.COMPLETING:
+        logger.warning(f"Taking over multipart upload {upload.pk} stuck completing since {upload.completing_since}")
+        _take_back(upload)
+    upload.status = MultipartUpload.Status.COMPLETING
+    upload.completing_since = now
+
+
+def _release_claim(upload):
+    MultipartUpload.objects.filter(pk=upload.pk).update(
+        status=MultipartUpload.Status.UPLOADING, completing_since=None
+    )
+
+
+def complete(upload, manifest):
+    """
+    Завершает загрузку по списку частей [{'number', 'sha256'}] и создает файл.
+    Временный файл переносится на постоянное место без копирования и без чтения.
+    """
+    _claim(upload)
+
+    user = upload.user
+    upload_id = upload.pk
+    source = temp_path(upload_id)
+    path = None
+    try:
+        expected = _check_manifest(upload, manifest)
+
+        file = _target(upload)
+        path = file.file.path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+
+        # Запись части, начатая до завершения, удаляет ее из принятых до записи данных
+        accepted = dict(MultipartUploadPart.objects.filter(upload=upload).values_list('number', 'sha256'))
+        changed = sorted(number for number, sha256 in expected.items() if accepted.get(number) != sha256)
+        if changed:
+            logger.warning(f"Part {changed[0]} of multipart upload {upload_id} changed during completion")
+            raise PartChecksumMismatch(_('Часть %(number)s изменилась во время завершения. Загрузите ее заново.') % {
+                'number': changed[0]
+            })
+
+        # Резерв мог истечь: тогда квота проверяется заново при фиксации
+        reservation = upload.quota_reservation or quota.reserve(user, upload.size)
+        with quota.commit(reservation):
+            file.save()
+            upload.delete()
+    except Exception as e:
+        if path is not None and os.path.exists(path):
+            os.replace(path, source)
+        _release_claim(upload)
+        if isinstance(e, DjangoValidationError):
+            raise ValidationError(e.message_dict)
+        raise
+
+    metrics.MULTIPART_UPLOADS.labels(result='completed').inc()
+    logger.info(
+        f"User {user.username} completed multipart upload {upload_id} "
+        f"as file {file.pk} ({upload.parts_count} parts)"
+    )
+    return file
+
+
+def _discard(upload):
+    if upload.status == MultipartUpload.Status.COMPLETING:
+        _take_back(upload)
+    _remove(temp_path(upload.pk))
+    if upload.quota_reservation_id is not None:
+        quota.release(upload.quota_reservation)
+    upload.delete()
+
+
+def abort(upload):
+    """Отменяет загрузку: удаляет временный файл, части и резерв квоты."""
+    _claim(upload)
+    upload_id = upload.pk
+    _discard(upload)
+    metrics.MULTIPART_UPLOADS.labels(result='aborted').inc()
+    logger.info(f"Multipart upload {upload_id} aborted by user {upload.user_id}")
+
+
+def expire():
+    """
+    Возвращает к приему частей загрузки с прерванным завершением, удаляет
+    истекшие загрузки и временные файлы без записи в БД (остатки после сбоев),
+    которые старше MULTIPART_UPLOAD_TTL. Возвращает (удалено, возвращено, файлов).
+    """
+    now = timezone.now()
+    expired = 0
+    # Идущее сейчас завершение не трогаем, даже если срок загрузки истек
+    completing = Q(status=MultipartUpload.Status.COMPLETING) & ~_stuck()
+    queryset = MultipartUpload.objects.exclude(completing).select_related('user', 'quota_reservation')
+    for upload in queryset.filter(expires_at__lte=now).iterator():
+        _discard(upload)
+        expired += 1
+    if expired:
+        metrics.MULTIPART_UPLOADS.labels(result='expired').inc(expired)
+        logger.info(f"Expired {expired} multipart uploads")
+
+    recovered = 0
+    for upload in queryset.filter(_stuck()).iterator():
+        _take_back(upload)
+        _release_claim(upload)
+        recovered += 1
+    if recovered:
+        logger.info(f"Recovered {recovered} multipart uploads with interrupted completion")
+
+    directory = os.path.join(settings.MEDIA_ROOT, UPLOADS_DIRECTORY)
+    cutoff = (now - timedelta(seconds=settings.MULTIPART_UPLOAD_TTL)).timestamp()
+    active = {upload_id.hex for upload_id in MultipartUpload.objects.values_list('id', flat=True)}
+    orphans = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        name, extension = os.path.splitext(entry.name)
+        if extension != '.part' or name in active or entry.stat().st_mtime > cutoff:
+            continue
+        _remove(entry.path)
+        orphans += 1
+    if orphans:
+        logger.info(f"Removed {orphans} orphaned multipart upload files")
+    return expired, recovered, orphans
@@ -0,0 +1,219 @@
+import os
+import io
+import csv
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from .hashing import hash_passwords
+from .models import User, username_validator, email_validator, full_name_validator
+from .signals import sync_permissions_for_users
+from .validators import PasswordValidator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP_NAME = 'Пользователи'
+
+password_validator = PasswordValidator()
+
+
+def create_storage_directories(users, workers=8):
+    """Создает каталоги хранения пользователей параллельно в пуле потоков."""
+    def create(user):
+        try:
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, user.storage_directory), exist_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to create storage directory for user {user.username}: {str(e)}")
+
+    if len(users) == 1:
+        create(users[0])
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(create, users))
+
+
+def provision_users(users, workers=8):
+    """
+    Побочные действия для новых пользователей, выполняемые пачкой:
+    каталог хранения, группа по умолчанию, права группы и токен.
+    Количество запросов не зависит от числа пользователей. Созданные токены
+    кешируются на экземплярах, поэтому user.auth_token не требует запроса.
+    """
+    if not users:
+        return
+
+    group, _created = Group.objects.get_or_create(name=DEFAULT_GROUP_NAME)
+    memberships_model = User.groups.through
+    memberships_model.objects.bulk_create(
+        [memberships_model(user_id=user.pk, group_id=group.pk) for user in users],
+        ignore_conflicts=True,
+    )
+    sync_permissions_for_users([user.pk for user in users])
+
+    tokens = Token.objects.bulk_create(
+        [Token(user=user, key=Token.generate_key()) for user in users],
+        ignore_conflicts=True,
+    )
+    for user, token in zip(users, tokens):
+        user.auth_token = token
+    transaction.on_commit(lambda: create_storage_directories(users, workers))
+
+
+def read_records(stream, fmt):
+    """
+    Читает записи пользователей из CSV (с заголовком) или JSONL.
+    Поля: username, email, full_name, password или password_hash, storage_quota, is_admin.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.StringIO(stream.decode('utf-8-sig'))
+    if fmt == 'csv':
+        try:
+            yield from csv.DictReader(stream)
+        except csv.Error as e:
+            raise ValueError(str(e))
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f'строка {line_number}: {str(e)}')
+    else:
+        raise ValueError(f'Unknown format: {fmt}')
+
+
+def import_file(stream, fmt, **options):
+    """
+    Импорт из текстового потока с поддержкой seek в два прохода: сначала файл
+    целиком разбирается без сохранения записей в памяти, затем читается заново
+    и импортируется. Ошибка формата в середине файла (ValueError) возникает
+    до создания первой пачки пользователей.
+    """
+    for _record in read_records(stream, fmt):
+        pass
+    stream.seek(0)
+    return import_users(read_records(stream, fmt), **options)
+
+
+def _validate(record):
+    username = (record.get('username') or '').strip()
+    email = (record.get('email') or '').strip()
+    full_name = (record.get('full_name') or '').strip()
+
+    username_validator(username)
+    email_validator(email)
+    full_name_validator(full_name)
+
+    password = record.get('password') or None
+    password_hash = record.get('password_hash') or None
+    if password:
+        password_validator.validate(password)
+    elif password_hash:
+        identify_hasher(password_hash)
+
+    quota = record.get('storage_quota')
+    is_admin = str(record.get('is_admin', '')).lower() in ('1', 'true', 'yes')
+    user = User(
+        username=username,
+        email=User.objects.normalize_email(email),
+        full_name=full_name,
+        storage_directory=f'user_{username}',
+        is_admin=is_admin,
+        is_staff=is_admin,
+    )
+    if quota not in (None, ''):
+        user.storage_quota = int(quota)
+    if password_hash:
+        user.password = password_hash
+    return user, password
+
+
+def import_users(records, batch_size=1000, workers=8, dry_run=False):
+    """
+    Массовое создание пользователей из итератора записей.
+    Записи проверяются пачками; пароли в открытом виде хешируются в пуле
+    процессов, готовые хеши (password_hash) сохраняются как есть, без пароля
+    создается пользователь с неиспользуемым паролем. Возвращает статистику.
+    """
+    started = time.perf_counter()
+    stats = {'created': 0, 'skipped': 0, 'errors': []}
+
+    batch = []
+    for line_number, record in enumerate(records, start=1):
+        batch.append((line_number, record))
+        if len(batch) >= batch_size:
+            _import_batch(batch, stats, workers, dry_run)
+            batch = []
+    if batch:
+        _import_batch(batch, stats, workers, dry_run)
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 2)
+    stats['users_per_second'] = round(stats['created'] / elapsed, 1) if elapsed else 0
+    logger.info(f"Bulk import finished: {stats['created']} created, {stats['skipped']} skipped in {elapsed:.1f}s")
+    return stats
+
+
+def _import_batch(batch, stats, workers, dry_run):
+    candidates = []
+    seen_usernames, seen_emails = set(), set()
+    for line_number, record in batch:
+        try:
+            user, password = _validate(record)
+        except (ValidationError, ValueError, TypeError) as e:
+            stats['skipped'] += 1
+            stats['errors'].append({'line': line_number, 'error': _error_text(e)})
+            continue
+        if user.username in seen_usernames or user.email in seen_emails:
+            stats['skipped'] += 1
+            stats['errors'].append({'line': line_number, 'error': 'Дубликат в файле импорта'})
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        candidates.append((line_number, user, password))
+
+    existing_usernames = set(
+        User.objects.filter(username__in=seen_usernames).values_list('username', flat=True)
+    )
+    existing_emails = set(User.objects.filter(email__in=seen_emails).values_list('email', flat=True))
+
+    users, passwords, with_password = [], [], []
+    for line_number, user, password in candidates:
+        if user.username in existing_usernames or user.email in existing_emails:
+            stats['skipped'] += 1
+            stats['errors'].append({'line': line_number, 'error': 'Пользователь уже существует'})
+            continue
+        users.append(user)
+        if password:
+            with_password.append(user)
+            passwords.append(password)
+        elif not user.password:
+            user.password = make_password(None)
+
+    if dry_run or not users:
+        # При пробном запуске created — количество пользователей, прошедших проверку
+        stats['created'] += len(users) if dry_run else 0
+        return
+
+    for user, encoded in zip(with_password, hash_passwords(passwords)):
+        user.password = encoded
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(users, batch_size=len(users))
+        provision_users(created, workers)
+    stats['created'] += len(created)
+
+
+def _error_text(error):
+    if isinstance(error, ValidationError):
+        return '; '.join(str(message) for message in error.messages)
+    return str(error)
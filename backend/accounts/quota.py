@@ -0,0 +1,104 @@
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from . import metrics
+from .exceptions import StorageQuotaExceeded
+from .models import File, QuotaReservation, User
+
+logger = logging.getLogger(__name__)
+
+# Резервирование квоты без блокировок: запись резерва вставляется сразу,
+# затем одним запросом проверяется сумма файлов и действующих резервов.
+# Параллельные загрузки видят резервы друг друга, поэтому вместе не могут
+# превысить квоту; в худшем случае обе получат отказ и повторят попытку.
+
+
+def _usage(user_id, now):
+    files = File.objects.filter(
+        owner=OuterRef('pk'), is_deleted=False
+    ).values('owner').annotate(total=Sum('size')).values('total')
+    reserved = QuotaReservation.objects.filter(
+        user=OuterRef('pk'), expires_at__gt=now
+    ).values('user').annotate(total=Sum('size')).values('total')
+
+    return User.objects.filter(pk=user_id).annotate(
+        files_total=Coalesce(Subquery(files), Value(0)),
+        reserved_total=Coalesce(Subquery(reserved), Value(0)),
+    ).values_list('files_total', 'reserved_total', 'storage_quota').get()
+
+
+def _verify(reservation, slack=0):
+    files_total, reserved_total, storage_quota = _usage(reservation.user_id, timezone.now())
+    if files_total + reserved_total > storage_quota + slack:
+        QuotaReservation.objects.filter(pk=reservation.pk).delete()
+        available = max(0, storage_quota - files_total - (reserved_total - reservation.size))
+        logger.warning(
+            f"Quota reservation rejected for user {reservation.user_id}: "
+            f"{reservation.size} bytes, available {available}"
+        )
+        metrics.QUOTA_REJECTIONS.labels(reason='quota').inc()
+        raise StorageQuotaExceeded(
+            _('Недостаточно места в хранилище. Доступно: %(available)s байт') % {
+                'available': available
+            }
+        )
+
+
+def reserve(user, size, slack=0, ttl=None):
+    """
+    Резервирует size байт квоты пользователя.
+    slack допускает превышение на время, пока точный размер неизвестен
+    (например, запас на служебные части multipart).
+    ttl — время жизни резерва в секундах (по умолчанию QUOTA_RESERVATION_TTL).
+    """
+    reservation = QuotaReservation.objects.create(
+        user=user,
+        size=size,
+        expires_at=timezone.now() + timedelta(seconds=ttl or settings.QUOTA_RESERVATION_TTL),
+    )
+    _verify(reservation, slack)
+    return reservation
+
+
+def resize(reservation, size):
+    """Уточняет размер резерва и повторно проверяет квоту без запаса."""
+    QuotaReservation.objects.filter(pk=reservation.pk).update(size=size)
+    reservation.size = size
+    _verify(reservation)
+    return reservation
+
+
+def release(reservation):
+    """Освобождает резерв. Повторный вызов безопасен."""
+    QuotaReservation.objects.filter(pk=reservation.pk).delete()
+
+
+@contextmanager
+def commit(reservation):
+    """
+    Фиксирует загрузку: создание файла внутри блока и удаление резерва
+    выполняются в одной транзакции, поэтому сумма «файлы + резервы» не растет.
+    """
+    with transaction.atomic():
+        yield
+        deleted, _unused = QuotaReservation.objects.filter(pk=reservation.pk).delete()
+        if not deleted:
+            # Резерв истек до завершения загрузки — проверяем квоту заново
+            files_total, reserved_total, storage_quota = _usage(reservation.user_id, timezone.now())
+            if files_total + reserved_total > storage_quota:
+                metrics.QUOTA_REJECTIONS.labels(reason='quota').inc()
+                raise StorageQuotaExceeded()
+
+
+def expire_stale():
+    """Удаляет истекшие резервы. Возвращает количество удаленных записей."""
+    deleted, _unused = QuotaReservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    if deleted:
+        logger.info(f"Expired {deleted} stale quota reservations")
+    return deleted
@@ -0,0 +1,111 @@
+import time
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Кеш ответов списка и карточки файла с версионной инвалидацией.
+#
+# У каждого пользователя есть номер версии его файлов, у системы — общий номер
+# (для администраторов, которые видят файлы всех пользователей). Номер входит
+# в ключ кеша, поэтому любое изменение файлов владельца (загрузка, удаление,
+# переименование, публикация, комментарий) сбрасывает все его ответы одним
+# увеличением счетчика, без поиска ключей. Старые записи вытесняются по времени
+# жизни. Счетчики увеличиваются после фиксации транзакции, чтобы параллельный
+# запрос не сохранил под новой версией данные до изменения.
+
+VERSION_KEY = 'files:version:{}'
+GLOBAL_SCOPE = 'all'
+
+
+def _version_key(scope):
+    return VERSION_KEY.format(scope)
+
+
+def _initial_version():
+    # Счетчик, вытесненный из кеша, начинается с нового значения, а не с нуля,
+    # чтобы не совпасть с версией записей, сохраненных до вытеснения
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    """Текущие версии для областей (ID пользователя или GLOBAL_SCOPE) одним обращением к кешу."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def invalidate(*owner_ids):
+    """Сбрасывает кешированные ответы с файлами владельцев после фиксации транзакции."""
+    scopes = {owner_id for owner_id in owner_ids if owner_id is not None}
+    scopes.add(GLOBAL_SCOPE)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def request_key(request, view, version):
+    """
+    Ключ ответа: действие, пользователь, версия, объект, набор полей и
+    остальные параметры запроса (в каноническом порядке), а также хост,
+    от которого зависят абсолютные ссылки в ответе.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        if name not in ('fields', 'omit')
+        for value in values
+    )
+    raw = repr((request.scheme, request.get_host(), view.kwargs.get(view.lookup_field), params))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'files:{view.action}:{request.user.pk}:{version}:{view.get_fieldset_key()}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    ViewSet, кеширующий успешные ответы list и retrieve.
+    Ответы пользователя зависят от версии его файлов, ответы администратора —
+    от общей версии. Заголовок X-Cache показывает попадание (HIT) или промах (MISS).
+    """
+    cache_name = 'files'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return handler(request, *args, **kwargs)
+
+        scope = GLOBAL_SCOPE if request.user.is_admin else request.user.pk
+        key = request_key(request, self, versions(scope)[0])
+        data = cache.get(key)
+        metrics.cache_result(self.cache_name, data is not None)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,242 @@
+import io
+import os
+import math
+import uuid
+import random
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import File, User
+from . import response_cache
+from .provisioning import provision_users
+from .storage import sharded_name, storage_key
+
+logger = logging.getLogger(__name__)
+
+# Распределения синтетических данных. Размеры — логнормальные с медианой
+# по типу файла, владельцы — по закону Ципфа (немного активных пользователей
+# с большим числом файлов), даты загрузки смещены к недавним.
+FILE_TYPES = {
+    # тип: (вес, расширения, медиана размера в байтах)
+    File.FileType.IMAGE: (45, ('.jpg', '.png'), 1_500_000),
+    File.FileType.PDF: (20, ('.pdf',), 400_000),
+    File.FileType.TEXT: (20, ('.txt',), 8_000),
+    File.FileType.WORD: (15, ('.docx',), 120_000),
+}
+SIZE_SIGMA = 1.3
+NAME_WORDS = (
+    'report', 'photo', 'scan', 'invoice', 'contract', 'notes', 'draft', 'summary',
+    'backup', 'presentation', 'budget', 'plan', 'letter', 'resume', 'receipt',
+)
+
+
+class Generator:
+    """Генератор строк File с воспроизводимыми распределениями."""
+
+    def __init__(self, users, seed=1, months=24, public_ratio=0.1, deleted_ratio=0.05,
+                 downloaded_ratio=0.3, zipf=1.1):
+        self.random = random.Random(seed)
+        self.users = users
+        self.now = timezone.now()
+        self.span = timedelta(days=30 * months).total_seconds()
+        self.public_ratio = public_ratio
+        self.deleted_ratio = deleted_ratio
+        self.downloaded_ratio = downloaded_ratio
+        self.max_size = settings.MAX_UPLOAD_SIZE
+
+        types = list(FILE_TYPES.items())
+        self.types = [file_type for file_type, _spec in types]
+        self.type_weights = [spec[0] for _file_type, spec in types]
+        owner_weights = [1 / (rank + 1) ** zipf for rank in range(len(users))]
+        total = sum(owner_weights)
+        self.owner_cumulative = []
+        running = 0
+        for weight in owner_weights:
+            running += weight / total
+            self.owner_cumulative.append(running)
+
+    def _owner(self):
+        return self.users[min(
+            _bisect(self.owner_cumulative, self.random.random()), len(self.users) - 1
+        )]
+
+    def _size(self, median):
+        size = int(self.random.lognormvariate(math.log(median), SIZE_SIGMA))
+        return max(1, min(size, self.max_size))
+
+    def _upload_date(self):
+        # Экспоненциальное распределение возраста: большинство файлов недавние
+        age = min(self.random.expovariate(3 / self.span), self.span)
+        return self.now - timedelta(seconds=age)
+
+    def row(self, number):
+        rnd = self.random
+        owner = self._owner()
+        file_type = rnd.choices(self.types, self.type_weights)[0]
+        _weight, extensions, median = FILE_TYPES[file_type]
+        extension = rnd.choice(extensions)
+        # id не зависит от seed, чтобы повторный запуск добавлял новые строки
+        file_id = uuid.uuid4()
+        original_name = f'{rnd.choice(NAME_WORDS)}_{number}{extension}'
+        upload_date = self._upload_date()
+        is_public = rnd.random() < self.public_ratio
+        last_download = None
+        if rnd.random() < self.downloaded_ratio:
+            last_download = upload_date + (self.now - upload_date) * rnd.random()
+
+        return {
+            'id': file_id,
+            'owner_id': owner.pk,
+            'original_name': original_name,
+            'file': sharded_name(owner.storage_directory, file_id, storage_key(file_id, original_name)),
+            'size': self._size(median),
+            'upload_date': upload_date,
+            'last_download': last_download,
+            'comment': '',
+            'shared_link': file_id.hex[:16] if is_public else None,
+            'is_public': is_public,
+            'is_deleted': rnd.random() < self.deleted_ratio,
+            'file_type': file_type,
+        }
+
+
+def _bisect(cumulative, value):
+    low, high = 0, len(cumulative)
+    while low < high:
+        middle = (low + high) // 2
+        if cumulative[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def create_users(count, prefix='seed', password='Seed-Passw0rd!', batch_size=5000, workers=8):
+    """
+    Создает пользователей пачками с одним общим хешем пароля и
+    подготавливает их (группа, права, токены, каталоги) через provision_users.
+    """
+    password_hash = make_password(password)
+    existing = User.objects.filter(username__startswith=prefix).count()
+    created = []
+    for start in range(existing, existing + count, batch_size):
+        users = [
+            User(
+                username=f'{prefix}{number:07d}',
+                email=f'{prefix}{number:07d}@seed.local',
+                full_name='Seed User',
+                storage_directory=f'user_{prefix}{number:07d}',
+                password=password_hash,
+            )
+            for number in range(start, min(start + batch_size, existing + count))
+        ]
+        with transaction.atomic():
+            users = User.objects.bulk_create(users, batch_size=batch_size)
+            provision_users(users, workers)
+        created.extend(users)
+    return created
+
+
+def _copy_batch(rows):
+    """Вставка пачки через COPY (PostgreSQL) — на порядок быстрее INSERT."""
+    columns = [File._meta.get_field(name).column for name in rows[0]]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row.values()))
+        buffer.write('\n')
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {File._meta.db_table} ({", ".join(columns)}) FROM STDIN', buffer
+        )
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _insert_batch(rows):
+    """
+    Вставка пачки через executemany без создания экземпляров модели:
+    File.save, сигналы и auto_now_add не участвуют, значения приводятся
+    к формату СУБД методами полей.
+    """
+    fields = [File._meta.get_field(name) for name in rows[0]]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(File._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row.values())]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _write_physical(rows, mode, small_max, workers):
+    """Создает физические файлы: разреженные (нужный размер без занятия места) или маленькие."""
+    directories = {os.path.dirname(os.path.join(settings.MEDIA_ROOT, row['file'])) for row in rows}
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    def write(row):
+        path = os.path.join(settings.MEDIA_ROOT, row['file'])
+        with open(path, 'wb') as f:
+            if mode == 'sparse':
+                f.truncate(row['size'])
+            else:
+                f.write(b'\0' * row['size'])
+
+    if mode == 'small':
+        for row in rows:
+            row['size'] = min(row['size'], small_max)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write, rows))
+
+
+def create_files(users, count, generator, batch_size=10000, physical='sparse', small_max=4096,
+                 workers=8, progress=None):
+    """
+    Создает count строк File пачками в обход File.save и сигналов.
+    На PostgreSQL используется COPY, на остальных СУБД — executemany.
+    physical: 'none' — только строки в БД, 'sparse' — разреженные файлы
+    полного размера, 'small' — настоящие файлы не больше small_max байт.
+    """
+    insert = _copy_batch if connection.vendor == 'postgresql' else _insert_batch
+    created = 0
+    while created < count:
+        rows = [generator.row(created + offset) for offset in range(min(batch_size, count - created))]
+        if physical != 'none':
+            _write_physical(rows, physical, small_max, workers)
+        with transaction.atomic():
+            insert(rows)
+            response_cache.invalidate(*{row['owner_id'] for row in rows})
+        created += len(rows)
+        if progress:
+            progress(created)
+    return created
+
+
+def fit_quotas(user_ids):
+    """Поднимает квоты сгенерированных пользователей до занятого места с запасом 25%."""
+    used = File.objects.filter(owner=OuterRef('pk'), is_deleted=False).values('owner').annotate(
+        total=Sum('size')
+    ).values('total')
+    User.objects.filter(pk__in=user_ids).update(
+        storage_quota=Greatest('storage_quota', Coalesce(Subquery(used), 0) * 5 / 4)
+    )
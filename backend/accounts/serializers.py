@@ -1,11 +1,18 @@
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
-from .models import File, User
+from .fieldsets import SparseFieldsMixin
+from .models import File, User, format_size, username_validator, email_validator
 from .validators import PasswordValidator
 
-class FileSerializer(serializers.ModelSerializer):
+class FileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для модели File"""
     owner = serializers.StringRelatedField(read_only=True)
     human_readable_size = serializers.ReadOnlyField()
@@ -38,26 +45,165 @@ class FileSerializer(serializers.ModelSerializer):
 
         return super().create(validated_data)
 
-    def validate_file(self, value):
-        """Валидация файла перед загрузкой"""
+
+class FileListSerializer(SparseFieldsMixin, serializers.Serializer):
+    """
+    Сериализатор для списков файлов с тем же набором полей, что и FileSerializer.
+    Представление строится напрямую из атрибутов модели, без обхода полей DRF,
+    обращений к диску и записи в БД. Владелец должен быть загружен заранее
+    (select_related('owner')). Часовой пояс и префикс URL файлов вычисляются
+    один раз на весь список. Читаются только атрибуты выбранных полей, поэтому
+    столбцы остальных полей можно не загружать (only()).
+    Поля не объявляются заново, а берутся из FileSerializer.
+    """
+
+    class Meta:
+        fields = FileSerializer.Meta.fields
+
+    def get_fields(self):
+        # Те же поля и типы (для схемы API), что у FileSerializer, только для чтения
+        fields = FileSerializer().get_fields()
+        for field in fields.values():
+            field.read_only = True
+            field.required = False
+        return fields
+
+    @cached_property
+    def _timezone(self):
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    @cached_property
+    def _media_prefix(self):
+        """Префикс URL файлов или None, если хранилище строит URL иначе, чем FileSystemStorage."""
+        storage = File._meta.get_field('file').storage
+        if not isinstance(storage, FileSystemStorage):
+            return None
         request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            raise serializers.ValidationError(_("Вы должны быть авторизованы для загрузки файлов."))
-        
-        user = request.user
-        
-        if hasattr(value, 'size') and not user.can_upload_file(value.size):
+        return request.build_absolute_uri(storage.base_url) if request is not None else storage.base_url
+
+    def _format_datetime(self, value):
+        # Тот же формат, что у DateTimeField: ISO 8601, UTC обозначается 'Z'
+        if value is None:
+            return None
+        if self._timezone is not None and timezone.is_aware(value):
+            value = value.astimezone(self._timezone)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def _file_url(self, instance):
+        name = instance.file.name
+        if not name:
+            return None
+        if self._media_prefix is not None:
+            return self._media_prefix + filepath_to_uri(name).lstrip('/')
+        url = instance.file.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    @cached_property
+    def _getters(self):
+        getters = {
+            'id': lambda instance: str(instance.id),
+            'owner': lambda instance: str(instance.owner),
+            'original_name': lambda instance: instance.original_name,
+            'file': self._file_url,
+            'size': lambda instance: instance.size,
+            'human_readable_size': lambda instance: format_size(instance.size),
+            'upload_date': lambda instance: self._format_datetime(instance.upload_date),
+            'last_download': lambda instance: self._format_datetime(instance.last_download),
+            'comment': lambda instance: instance.comment,
+            'shared_link': lambda instance: instance.shared_link,
+            'is_public': lambda instance: instance.is_public,
+            'file_type': lambda instance: instance.file_type,
+            'is_deleted': lambda instance: instance.is_deleted,
+        }
+        return [(name, getters[name]) for name in self.fields]
+
+    def to_representation(self, instance):
+        return {name: getter(instance) for name, getter in self._getters}
+
+
+class UploadPrecheckSerializer(serializers.Serializer):
+    """Запрос предварительной проверки загрузки: хеш и размер файла"""
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=True)
+    size = serializers.IntegerField(min_value=1, required=True)
+
+    def validate_size(self, value):
+        if value > settings.MAX_UPLOAD_SIZE:
             raise serializers.ValidationError(
-                _("Файл превышает квоту хранилища. Доступно: %(available)s байт") % {
-                    'available': user.storage_left
+                _("Файл превышает максимально допустимый размер: %(max)s байт") % {'max': settings.MAX_UPLOAD_SIZE}
+            )
+        return value
+
+    def validate_sha256(self, value):
+        return value.lower()
+
+
+class InstantUploadSerializer(serializers.Serializer):
+    """Подтверждение загрузки без передачи данных: ответ на проверку и данные файла"""
+    challenge_id = serializers.CharField(required=True, max_length=64)
+    proof = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=True)
+    original_name = serializers.CharField(required=True, max_length=255)
+    comment = serializers.CharField(required=False, allow_blank=True, max_length=500, default='')
+
+
+class MultipartInitiateSerializer(serializers.Serializer):
+    """Начало загрузки частями: данные файла и, при желании, размер части"""
+    original_name = serializers.CharField(required=True, max_length=255)
+    size = serializers.IntegerField(min_value=1, required=True)
+    comment = serializers.CharField(required=False, allow_blank=True, max_length=500, default='')
+    part_size = serializers.IntegerField(required=False, default=None, allow_null=True)
+
+    def validate_size(self, value):
+        if value > settings.MULTIPART_MAX_SIZE:
+            raise serializers.ValidationError(
+                _("Файл превышает максимально допустимый размер: %(max)s байт") % {'max': settings.MULTIPART_MAX_SIZE}
+            )
+        return value
+
+    def validate_part_size(self, value):
+        if value is not None and not settings.MULTIPART_MIN_PART_SIZE <= value <= settings.MULTIPART_MAX_PART_SIZE:
+            raise serializers.ValidationError(
+                _("Размер части должен быть от %(min)s до %(max)s байт") % {
+                    'min': settings.MULTIPART_MIN_PART_SIZE, 'max': settings.MULTIPART_MAX_PART_SIZE
                 }
             )
         return value
 
 
-class UserSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели User с количеством файлов"""
-    files_count = serializers.SerializerMethodField()
+class MultipartPartSerializer(serializers.Serializer):
+    """Часть загрузки: номер и SHA-256 содержимого"""
+    number = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    size = serializers.IntegerField(read_only=True)
+
+
+class MultipartUploadSerializer(serializers.Serializer):
+    """Состояние загрузки частями с уже принятыми частями"""
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    original_name = serializers.CharField(read_only=True)
+    size = serializers.IntegerField(read_only=True)
+    part_size = serializers.IntegerField(read_only=True)
+    parts_count = serializers.IntegerField(read_only=True)
+    expires_at = serializers.DateTimeField(read_only=True)
+    parts = MultipartPartSerializer(many=True, read_only=True)
+
+
+class MultipartCompleteSerializer(serializers.Serializer):
+    """Завершение загрузки частями: все части по порядку номеров с их SHA-256"""
+    parts = MultipartPartSerializer(many=True, allow_empty=False)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для модели User с количеством файлов.
+    Для списков используйте User.objects.with_usage(), тогда
+    storage_used и files_count берутся из аннотаций без дополнительных запросов.
+    """
+    files_count = serializers.ReadOnlyField()
+    storage_used = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -68,11 +214,15 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = (
             'id', 'is_active', 'storage_directory',
             'storage_quota', 'storage_used', 'date_joined', 'files_count'
-        )        
+        )
+
 
-    def get_files_count(self, obj):
-        """Получение количества файлов пользователя"""
-        return obj.files.filter(is_deleted=False).count()
+class AuthUserSerializer(serializers.ModelSerializer):
+    """Облегченные данные пользователя для ответов входа и регистрации (без агрегатов)"""
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'full_name', 'is_admin', 'storage_quota')
+        read_only_fields = fields
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -85,7 +235,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения профиля пользователя с количеством файлов"""
-    files_count = serializers.SerializerMethodField()
+    files_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -93,11 +243,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'id', 'username', 'email', 'full_name', 'is_admin', 'is_active',
             'storage_quota', 'storage_used', 'date_joined', 'files_count'
         )
-        read_only_fields = fields  
-
-    def get_files_count(self, obj):
-        """Получение количества файлов пользователя"""
-        return obj.files.filter(is_deleted=False).count()
+        read_only_fields = fields
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -118,37 +264,54 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email', 'full_name', 'password', 'confirm_password')
         read_only_fields = ('id',)
+        # Уникальность username и email проверяется в validate() одним запросом
+        # вместо отдельных UniqueValidator на каждое поле
         extra_kwargs = {
-            'email': {'required': True},
+            'username': {'validators': [username_validator]},
+            'email': {'required': True, 'validators': [email_validator]},
             'full_name': {'required': False},
         }
 
     def validate(self, data):
-        """Проверка, что пароли совпадают"""
+        """Проверка, что пароли совпадают, и уникальности username и email"""
         if data['password'] != data['confirm_password']:
             raise serializers.ValidationError({"confirm_password": _("Пароли не совпадают.")})
+
+        errors = self._uniqueness_errors(data['username'], data['email'])
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
-    def validate_email(self, value):
-        """Проверка уникальности email"""
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError(_("Пользователь с таким email уже существует."))
-        return value
-
-    def validate_username(self, value):
-        """Проверка уникальности username"""
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError(_("Пользователь с таким именем уже существует."))
-        return value
+    def _uniqueness_errors(self, username, email):
+        errors = {}
+        taken = User.objects.filter(Q(username=username) | Q(email=email)).values_list('username', 'email')
+        for taken_username, taken_email in taken:
+            if taken_username == username:
+                errors['username'] = [_("Пользователь с таким именем уже существует.")]
+            if taken_email == email:
+                errors['email'] = [_("Пользователь с таким email уже существует.")]
+        return errors
 
     def create(self, validated_data):
-        """Создание нового пользователя"""
+        """
+        Создание нового пользователя. Каталог, группа, права и токен
+        создаются обработчиком post_save пачкой (provisioning.provision_users).
+        """
         validated_data.pop('confirm_password')
         password = validated_data.pop('password')
+        # Хеш может быть заранее вычислен вне потока запроса (serializer.save(password_hash=...))
+        password_hash = validated_data.pop('password_hash', None)
         user = User(**validated_data)
-        user.set_password(password)
-        user.save()        
-        Token.objects.get_or_create(user=user)
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(password)
+        try:
+            user.save()
+        except IntegrityError:
+            # Параллельная регистрация с теми же данными успела раньше;
+            # транзакция уже прервана, поэтому без повторного запроса
+            raise serializers.ValidationError(_("Пользователь с таким именем или email уже существует."))
         return user
 
 
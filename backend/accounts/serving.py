@@ -0,0 +1,222 @@
+import io
+import os
+import mmap
+import asyncio
+import logging
+import mimetypes
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from . import bandwidth
+
+logger = logging.getLogger(__name__)
+
+# Отдача файлов без копирования через буферы Python (FILE_SERVING_MODE=zerocopy).
+#
+# Под WSGI ответ передается серверу как file_to_stream: gunicorn отправляет
+# его через os.sendfile прямо из страничного кеша в сокет, начиная с текущей
+# позиции файла и ровно Content-Length байт, поэтому диапазоны (Range) тоже
+# отправляются через sendfile. Где sendfile недоступен (ASGI, сервер без
+# wsgi.file_wrapper), файл отображается в память (mmap) и отдается срезами
+# memoryview по FILE_SERVING_BLOCK_SIZE байт без промежуточных копий.
+# При ограничении скорости (accounts/bandwidth.py) sendfile не используется:
+# блоки отдаются по мере наполнения корзин.
+#
+# FILE_SERVING_MODE=django — прежний путь через FileResponse (блоки по 4 КБ,
+# без поддержки Range). Сравнение режимов: manage.py bench_serving.
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Диапазон (начало, длина) из заголовка Range или None для всего файла.
+    Поддерживается один диапазон; несколько диапазонов отдаются целым файлом.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N: последние N байт
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1) - start + 1
+
+
+class FileRegion:
+    """
+    Участок файла (или содержимого в памяти) для отдачи.
+    fileno и read нужны wsgi.file_wrapper (sendfile), итерация дает срезы memoryview.
+    """
+
+    def __init__(self, start, length, block_size, file=None, content=None, throttle=None):
+        self.start = start
+        self.length = length
+        self.block_size = block_size
+        self.file = file
+        self.content = content
+        self.throttle = throttle
+        self.position = 0
+        self._mmap = None
+        self._view = None
+        if file is not None:
+            # sendfile в gunicorn начинает с текущей позиции дескриптора
+            file.seek(start)
+
+    def fileno(self):
+        if self.file is None or self.throttle:
+            raise io.UnsupportedOperation('fileno')
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        if size <= 0:
+            return b''
+        if self.file is not None:
+            data = self.file.read(size)
+        else:
+            data = self.content[self.start + self.position:self.start + self.position + size]
+        self.position += len(data)
+        if self.throttle:
+            self.throttle.wait(len(data))
+        return data
+
+    def _buffer(self):
+        if self._view is None:
+            if self.file is not None:
+                self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+                self._view = memoryview(self._mmap)
+            else:
+                self._view = memoryview(self.content)
+        return self._view
+
+    def _blocks(self):
+        # При ограничении скорости — блоки по кванту корзины, чтобы не было длинных пауз
+        block_size = min(self.block_size, bandwidth.QUANTUM) if self.throttle else self.block_size
+        view = self._buffer()
+        end = self.start + self.length
+        for offset in range(self.start + self.position, end, block_size):
+            block = view[offset:min(offset + block_size, end)]
+            self.position += len(block)
+            yield block
+
+    def __iter__(self):
+        for block in self._blocks():
+            if self.throttle:
+                self.throttle.wait(len(block))
+            yield block
+
+    async def ablocks(self):
+        for block in self._blocks():
+            if self.throttle:
+                delay = await self.throttle.adelay(len(block))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield block
+
+    def close(self):
+        if self._view is not None:
+            try:
+                self._view.release()
+                if self._mmap is not None:
+                    self._mmap.close()
+            except BufferError:
+                # Срезы еще используются сервером; mmap закроется при сборке мусора
+                pass
+            self._view = self._mmap = None
+        if self.file is not None:
+            self.file.close()
+
+
+class FileRegionResponse(StreamingHttpResponse):
+    """
+    Потоковый ответ с участком файла. Под WSGI участок передается серверу как
+    file_to_stream (sendfile через wsgi.file_wrapper), под ASGI — асинхронными
+    срезами memoryview, которые не копируются в bytes.
+    """
+
+    def __init__(self, region, asynchronous, *args, **kwargs):
+        self.zero_copy = asynchronous
+        super().__init__(region.ablocks() if asynchronous else region, *args, **kwargs)
+        self._resource_closers.append(region.close)
+        self.file_to_stream = None if asynchronous else region
+        self.block_size = region.block_size
+        self['Content-Length'] = str(region.length)
+
+    def make_bytes(self, value):
+        if self.zero_copy and isinstance(value, memoryview):
+            return value
+        return super().make_bytes(value)
+
+
+def _legacy_response(path, filename, content_type, throttle, content):
+    handle = io.BytesIO(content) if content is not None else open(path, 'rb')
+    return FileResponse(
+        bandwidth.throttled(handle, throttle),
+        content_type=content_type,
+        as_attachment=True,
+        filename=filename,
+    )
+
+
+def file_response(request, path, filename, throttle=None, content=None):
+    """
+    Ответ для скачивания файла path как вложения filename с поддержкой Range.
+    content — содержимое файла, уже находящееся в памяти (accounts/hot_files.py).
+    Отсутствие файла — FileNotFoundError.
+    """
+    mime_type, _encoding = mimetypes.guess_type(path)
+    content_type = mime_type or 'application/octet-stream'
+    if settings.FILE_SERVING_MODE != 'zerocopy':
+        return _legacy_response(path, filename, content_type, throttle, content)
+
+    file = open(path, 'rb') if content is None else None
+    try:
+        size = len(content) if file is None else os.fstat(file.fileno()).st_size
+        requested = None
+        if 'If-Range' not in request.headers:
+            requested = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        if file is not None:
+            file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    except Exception:
+        if file is not None:
+            file.close()
+        raise
+
+    start, length = requested or (0, size)
+    if length == 0:
+        # mmap не отображает пустые файлы
+        if file is not None:
+            file.close()
+        response = HttpResponse(b'', content_type=content_type)
+    else:
+        region = FileRegion(start, length, settings.FILE_SERVING_BLOCK_SIZE, file=file, content=content, throttle=throttle)
+        # DRF оборачивает HttpRequest в Request
+        asynchronous = isinstance(getattr(request, '_request', request), ASGIRequest)
+        response = FileRegionResponse(region, asynchronous, content_type=content_type)
+    if requested is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
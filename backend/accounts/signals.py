@@ -1,11 +1,11 @@
-import os
 import logging
-from django.db.models.signals import post_save, m2m_changed
+from collections import defaultdict
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.conf import settings
 from django.contrib.auth.models import Group
-from rest_framework.authtoken.models import Token
-from .models import User
+from .models import User, File, FileChange, file_renamed
+from . import analytics, changes, events, hot_files, response_cache
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -14,62 +14,203 @@ logger = logging.getLogger(__name__)
 def create_user_storage_and_token(sender, instance, created, **kwargs):
     """
     Обработчик сигнала post_save для модели User.
-    Создает директорию для хранения файлов, добавляет пользователя в группу "Пользователи"
-    и создает токен для нового пользователя.
+    Создает директорию для хранения файлов, добавляет пользователя в группу "Пользователи",
+    синхронизирует права и создает токен — тем же кодом, что и массовый импорт.
+    Созданный токен кешируется на экземпляре (instance.auth_token).
     """
     if created:
-        try:            
-            user_storage_path = os.path.join(settings.MEDIA_ROOT, instance.storage_directory)
-            os.makedirs(user_storage_path, exist_ok=True)
-            logger.info(f"Storage directory created for user {instance.username} at {user_storage_path}")
-        except Exception as e:
-            logger.error(f"Failed to create storage directory for user {instance.username}: {str(e)}")
+        from .provisioning import provision_users
 
-        try:            
-            group, created = Group.objects.get_or_create(name='Пользователи')
-            instance.groups.add(group)
-            logger.info(f"User {instance.username} added to group 'Пользователи'")
+        try:
+            provision_users([instance])
+            logger.info(f"User {instance.username} provisioned: group, permissions and token")
         except Exception as e:
-            logger.error(f"Failed to add user {instance.username} to group 'Пользователи': {str(e)}")
+            logger.error(f"Failed to provision user {instance.username}: {str(e)}")
+            raise
 
-        try:            
-            token, created = Token.objects.get_or_create(user=instance)
-            logger.info(f"Token {'created' if created else 'already exists'} for user {instance.username}")
-        except Exception as e:
-            logger.error(f"Failed to create token for user {instance.username}: {str(e)}")
+@receiver(post_save, sender=User)
+def invalidate_file_responses_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Имя владельца и права входят в ответы списка файлов, поэтому изменение
+    пользователя сбрасывает их кеш. Обновление только last_login (вход) пропускается.
+    """
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    response_cache.invalidate(instance.pk)
+    # Квота могла измениться — открытые вкладки пользователя получат новые значения
+    transaction.on_commit(lambda: events.publish_quota(instance.pk))
 
-        try:            
-            sync_user_permissions(instance)
-            logger.info(f"Permissions synced for user {instance.username} during creation")
-        except Exception as e:
-            logger.error(f"Failed to sync permissions for user {instance.username} during creation: {str(e)}")
+@receiver(post_delete, sender=User)
+def invalidate_file_responses_on_user_delete(sender, instance, **kwargs):
+    """Файлы удаленного пользователя удаляются каскадно, без сигналов для каждого файла."""
+    response_cache.invalidate(instance.pk)
 
 @receiver(m2m_changed, sender=User.groups.through)
-def update_user_permissions_on_group_change(sender, instance, action, **kwargs):
+def update_user_permissions_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
     """
     Обработчик сигнала m2m_changed для связи User.groups.
-    Обновляет права пользователя при изменении его групп (добавление, удаление).
+    Обновляет права пользователей при изменении членства в группах. Массовые
+    операции со стороны группы (group.custom_user_set.add/remove) вызывают
+    одну синхронизацию для всех затронутых пользователей.
     """
-    if action in ['post_add', 'post_remove', 'post_clear']:
-        try:
-            sync_user_permissions(instance)
-            logger.info(f"Permissions updated for user {instance.username} after group change (action: {action})")
-        except Exception as e:
-            logger.error(f"Failed to update permissions for user {instance.username} after group change: {str(e)}")
+    if action == 'pre_clear' and reverse:
+        instance._cleared_user_ids = list(
+            User.groups.through.objects.filter(group_id=instance.pk).values_list('user_id', flat=True)
+        )
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_user_ids', [])
+    else:
+        user_ids = pk_set or []
+
+    try:
+        sync_permissions_for_users(user_ids)
+        logger.info(f"Permissions updated for {len(user_ids)} users after group change (action: {action})")
+    except Exception as e:
+        logger.error(f"Failed to update permissions after group change (action: {action}): {str(e)}")
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def update_user_permissions_on_group_permissions_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Обработчик сигнала m2m_changed для связи Group.permissions.
+    Передает изменение прав группы всем ее участникам одной синхронизацией.
+    """
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    group_ids = [instance.pk] if not reverse else list(pk_set or [])
+    if reverse and action == 'post_clear':
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+
+    user_ids = User.groups.through.objects.filter(
+        group_id__in=group_ids
+    ).values_list('user_id', flat=True).distinct()
+    try:
+        sync_permissions_for_users(list(user_ids))
+    except Exception as e:
+        logger.error(f"Failed to propagate group permissions change (action: {action}): {str(e)}")
+
+@receiver(post_save, sender=File)
+def update_storage_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Обработчик сигнала post_save для модели File.
+    Инкрементально обновляет агрегаты аналитики хранилища.
+    """
+    if raw:
+        return
+    try:
+        analytics.record_file_saved(instance, created)
+    except Exception as e:
+        logger.error(f"Failed to update storage rollups for file {instance.pk}: {str(e)}")
+    # Прежний владелец тоже, если файл передан другому пользователю
+    previous_owner_id = getattr(instance, '_loaded_values', {}).get('owner_id')
+    response_cache.invalidate(instance.owner_id, previous_owner_id)
+
+@receiver(post_save, sender=File)
+def record_file_change_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Добавляет изменение файла в журнал синхронизации (accounts/changes.py).
+    Ошибка не подавляется: без записи в журнале клиенты пропустили бы изменение,
+    поэтому сохранение файла откатывается вместе с ней.
+    """
+    if raw:
+        return
+    changes.record_file_saved(instance, created)
+
+@receiver(file_renamed, sender=File)
+def record_file_change_on_rename(sender, instance, **kwargs):
+    """Переименование в журнале синхронизации: File.rename обновляет имя через update()."""
+    changes.record(instance.owner_id, instance.pk, FileChange.Action.RENAMED)
+
+@receiver(post_delete, sender=File)
+def update_storage_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Обработчик сигнала post_delete для модели File.
+    При удалении пользователя агрегаты удаляются каскадно, поэтому пропускается.
+    """
+    if isinstance(origin, User):
+        return
+    try:
+        analytics.record_file_deleted(instance)
+    except Exception as e:
+        logger.error(f"Failed to update storage rollups for deleted file {instance.pk}: {str(e)}")
+    response_cache.invalidate(instance.owner_id)
+
+@receiver(post_delete, sender=File)
+def drop_hot_file_on_delete(sender, instance, **kwargs):
+    """Освобождает память кеша популярных файлов (accounts/hot_files.py) этого процесса."""
+    hot_files.invalidate(instance.pk)
+
+@receiver(post_delete, sender=File)
+def record_file_change_on_delete(sender, instance, origin=None, **kwargs):
+    """Tombstone в журнале синхронизации. Журнал удаленного пользователя удаляется каскадно."""
+    if isinstance(origin, User):
+        return
+    changes.record_file_deleted(instance)
 
 def sync_user_permissions(user):
     """
     Синхронизирует права пользователя с правами всех групп, в которых он состоит.
     """
-    try:        
-        groups = user.groups.all()        
-        permissions = set()
-        for group in groups:
-            permissions.update(group.permissions.all())        
-        
-        user.user_permissions.set(permissions)
-        user.save()
-        logger.debug(f"Permissions synced for user {user.username}: {permissions}")
-    except Exception as e:
-        logger.error(f"Error syncing permissions for user {user.username}: {str(e)}")
-        raise  
+    sync_permissions_for_users([user.pk])
+
+
+def sync_permissions_for_users(user_ids, batch_size=1000):
+    """
+    Приводит прямые права пользователей к объединению прав их групп.
+    Работает множествами: для пачки пользователей читает членство и права
+    тремя запросами, затем удаляет лишние строки одним DELETE на каждое право
+    и добавляет недостающие через bulk_create. Число запросов не зависит
+    от количества пользователей в пачке.
+    """
+    user_ids = list(set(user_ids))
+    memberships_model = User.groups.through
+    group_permissions_model = Group.permissions.through
+    user_permissions_model = User.user_permissions.through
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+
+        memberships = list(
+            memberships_model.objects.filter(user_id__in=batch).values_list('user_id', 'group_id')
+        )
+        group_permissions = defaultdict(set)
+        for group_id, permission_id in group_permissions_model.objects.filter(
+            group_id__in={group_id for _, group_id in memberships}
+        ).values_list('group_id', 'permission_id'):
+            group_permissions[group_id].add(permission_id)
+
+        desired = {
+            (user_id, permission_id)
+            for user_id, group_id in memberships
+            for permission_id in group_permissions[group_id]
+        }
+        current = set(
+            user_permissions_model.objects.filter(user_id__in=batch).values_list('user_id', 'permission_id')
+        )
+
+        stale_by_permission = defaultdict(list)
+        for user_id, permission_id in current - desired:
+            stale_by_permission[permission_id].append(user_id)
+        for permission_id, stale_user_ids in stale_by_permission.items():
+            user_permissions_model.objects.filter(
+                permission_id=permission_id, user_id__in=stale_user_ids
+            ).delete()
+
+        user_permissions_model.objects.bulk_create(
+            [
+                user_permissions_model(user_id=user_id, permission_id=permission_id)
+                for user_id, permission_id in desired - current
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        logger.debug(
+            f"Permissions synced for {len(batch)} users: "
+            f"+{len(desired - current)} / -{len(current - desired)}"
+        )
@@ -0,0 +1,78 @@
+import os
+import shutil
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def shard_prefix(file_id):
+    """
+    Возвращает относительный путь шард-подкаталогов для файла по его UUID.
+    Например, для id 3f2a9c... и глубины 2 получится "3f/2a".
+    """
+    hex_id = file_id.hex if hasattr(file_id, 'hex') else str(file_id).replace('-', '')
+    width = settings.FILE_STORAGE_SHARD_WIDTH
+    depth = settings.FILE_STORAGE_SHARD_DEPTH
+    return os.path.join(*[hex_id[i * width:(i + 1) * width] for i in range(depth)]) if depth else ''
+
+
+def storage_key(file_id, filename):
+    """
+    Неизменяемое имя физического файла: id файла и исходное расширение.
+    Отображаемое имя хранится только в БД, поэтому переименование не трогает диск.
+    """
+    hex_id = file_id.hex if hasattr(file_id, 'hex') else str(file_id).replace('-', '')
+    return f'{hex_id}{os.path.splitext(filename)[1].lower()}'
+
+
+def sharded_name(storage_directory, file_id, filename):
+    """Относительный (от MEDIA_ROOT) путь файла в шардированной раскладке."""
+    return os.path.join(storage_directory, shard_prefix(file_id), filename)
+
+
+def link_or_copy(source_path, target_path):
+    """
+    Создает жесткую ссылку на файл, а если ФС ее не поддерживает (или пути
+    на разных устройствах) — копию. Удаление одного из путей не затрагивает другой.
+    """
+    try:
+        os.link(source_path, target_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+
+def relocate(old_name, new_name):
+    """
+    Переносит физический файл между двумя путями относительно MEDIA_ROOT.
+
+    Сначала создается жесткая ссылка на новом месте, старый путь удаляется
+    только после вызова. Пока запись в БД не обновлена, файл доступен
+    по обоим путям, поэтому параллельные скачивания не обрываются.
+    Возвращает функцию, удаляющую старый путь.
+    """
+    old_path = os.path.join(settings.MEDIA_ROOT, old_name)
+    new_path = os.path.join(settings.MEDIA_ROOT, new_name)
+
+    if old_path == new_path:
+        return lambda: None
+
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+
+    if os.path.exists(new_path):
+        if os.path.exists(old_path) and not os.path.samefile(old_path, new_path):
+            raise FileExistsError(f"Target already exists: {new_path}")
+    else:
+        link_or_copy(old_path, new_path)
+
+    def cleanup():
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove old file {old_path}: {str(e)}")
+
+    return cleanup
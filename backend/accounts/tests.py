@@ -0,0 +1,849 @@
+import io
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from . import async_views, bandwidth, changes, events, hot_files, multipart, response_cache, serving
+from .budgets import enforce
+from .middleware import QueryBudgetMiddleware
+from .models import File, FileChange, MultipartUpload, MultipartUploadPart, QuotaReservation, User
+from .provisioning import DEFAULT_GROUP_NAME
+from .serializers import FileListSerializer, FileSerializer
+from .upload_handlers import QuotaUploadHandler
+
+PASSWORD = 'Passw0rd!x'
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class BudgetTestCase(TestCase):
+    """
+    Тесты выполняются со строгими бюджетами SQL-запросов: превышение бюджета
+    представления проваливает тест, и бюджеты не расходятся с кодом.
+    """
+
+
+class MediaRootMixin:
+    """Файлы тестов пишутся во временный MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class UploadLimitsTests(MediaRootMixin, BudgetTestCase):
+    """QuotaUploadHandler проверяет размер и квоту до разбора тела при любой аутентификации."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('uploader1', 'uploader1@example.com', 'Uploader', PASSWORD)
+        calls = []
+        original = QuotaUploadHandler.handle_raw_input
+
+        def counting(handler, *args, **kwargs):
+            calls.append(handler)
+            return original(handler, *args, **kwargs)
+
+        QuotaUploadHandler.handle_raw_input = counting
+        self.addCleanup(setattr, QuotaUploadHandler, 'handle_raw_input', original)
+        self.handler_calls = calls
+
+    def session_client(self):
+        client = APIClient(enforce_csrf_checks=True)
+        client.login(username='uploader1', password=PASSWORD)
+        # Проверка CSRF для POST читает request.POST, то есть разбирает тело
+        response = client.get('/api/files/')
+        token = get_token(response.wsgi_request)
+        client.credentials(HTTP_X_CSRFTOKEN=token)
+        client.cookies['csrftoken'] = token
+        return client
+
+    def token_client(self):
+        client = APIClient()
+        token, _created = Token.objects.get_or_create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def upload(self, client, size):
+        data = {'file': SimpleUploadedFile('notes.txt', b'x' * size, content_type='text/plain'), 'original_name': 'notes.txt'}
+        return client.post('/api/files/', data, format='multipart')
+
+    def test_upload_succeeds(self):
+        for name, client in (('session', self.session_client()), ('token', self.token_client())):
+            with self.subTest(auth=name):
+                self.handler_calls.clear()
+                response = self.upload(client, 1024)
+                self.assertEqual(response.status_code, 201, response.content)
+                self.assertEqual(len(self.handler_calls), 1)
+        self.assertEqual(File.objects.filter(owner=self.user).count(), 2)
+        self.assertFalse(QuotaReservation.objects.exists())
+
+    @override_settings(MAX_UPLOAD_SIZE=128 * 1024)
+    def test_too_large_rejected(self):
+        for name, client in (('session', self.session_client()), ('token', self.token_client())):
+            with self.subTest(auth=name):
+                self.handler_calls.clear()
+                response = self.upload(client, 256 * 1024)
+                self.assertEqual(response.status_code, 413)
+                self.assertEqual(len(self.handler_calls), 1)
+        self.assertFalse(File.objects.exists())
+
+    def test_quota_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(storage_quota=16 * 1024)
+        for name, client in (('session', self.session_client()), ('token', self.token_client())):
+            with self.subTest(auth=name):
+                response = self.upload(client, 256 * 1024)
+                self.assertEqual(response.status_code, 507)
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(QuotaReservation.objects.exists())
+
+
+class InstantUploadTests(MediaRootMixin, BudgetTestCase):
+    """Ответ precheck не раскрывает, хранится ли содержимое с таким хешем."""
+
+    CONTENT = b'shared content ' * 100
+
+    def setUp(self):
+        super().setUp()
+        owner = User.objects.create_user('blobowner', 'blobowner@example.com', 'Blob Owner', PASSWORD)
+        self.user = User.objects.create_user('claimer1', 'claimer1@example.com', 'Claimer', PASSWORD)
+        client = APIClient()
+        client.force_authenticate(owner)
+        upload = SimpleUploadedFile('shared.txt', self.CONTENT, content_type='text/plain')
+        response = client.post('/api/files/', {'file': upload, 'original_name': 'shared.txt'}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def claim(self, content):
+        check = self.client.post('/api/files/precheck/', {'sha256': hashlib.sha256(content).hexdigest(), 'size': len(content)}, format='json')
+        self.assertEqual(check.status_code, 200)
+        self.assertEqual(sorted(check.data), ['challenge_id', 'length', 'nonce', 'offset', 'status'])
+        self.assertEqual(check.data['status'], 'challenge')
+        fragment = content[check.data['offset']:check.data['offset'] + check.data['length']]
+        proof = hashlib.sha256(bytes.fromhex(check.data['nonce']) + fragment).hexdigest()
+        return self.client.post('/api/files/instant-upload/', {
+            'challenge_id': check.data['challenge_id'], 'proof': proof, 'original_name': 'copy.txt',
+        }, format='json')
+
+    def test_match_creates_file(self):
+        response = self.claim(self.CONTENT)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(File.objects.get(owner=self.user).size, len(self.CONTENT))
+
+    def test_miss_indistinguishable_from_bad_proof(self):
+        response = self.claim(b'unknown content ' * 100)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'].code, 'upload_proof_invalid')
+        self.assertFalse(File.objects.filter(owner=self.user).exists())
+
+
+@override_settings(MULTIPART_MIN_PART_SIZE=1024)
+class MultipartUploadTests(MediaRootMixin, BudgetTestCase):
+    """Завершение и отмена загрузки частями, в том числе после прерванного завершения."""
+
+    PART_SIZE = 1024
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('multipart1', 'multipart1@example.com', 'Multipart', PASSWORD)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = b'a' * self.PART_SIZE + b'b' * self.PART_SIZE + b'c' * 100
+
+    def start(self):
+        response = self.client.post('/api/files/multipart/', {
+            'original_name': 'big.txt', 'size': len(self.content), 'part_size': self.PART_SIZE,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        upload = MultipartUpload.objects.get(pk=response.data['upload_id'])
+        self.url = f'/api/files/multipart/{upload.pk}/'
+        manifest = []
+        for number in range(1, upload.parts_count + 1):
+            body = self.content[(number - 1) * self.PART_SIZE:number * self.PART_SIZE]
+            sha256 = hashlib.sha256(body).hexdigest()
+            response = self.client.put(f'{self.url}parts/{number}/', body, content_type='application/octet-stream',
+                                       HTTP_X_CONTENT_SHA256=sha256)
+            self.assertEqual(response.status_code, 200, response.content)
+            manifest.append({'number': number, 'sha256': sha256})
+        return upload, manifest
+
+    def complete(self, manifest):
+        return self.client.post(f'{self.url}complete/', {'parts': manifest}, format='json')
+
+    def crash_after_move(self, upload, minutes_ago):
+        """Состояние после падения процесса между переносом файла и записью в БД."""
+        upload.refresh_from_db()
+        target = multipart._target(upload).file.path
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(multipart.temp_path(upload.pk), target)
+        MultipartUpload.objects.filter(pk=upload.pk).update(
+            status=MultipartUpload.Status.COMPLETING, completing_since=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+        return target
+
+    def test_complete(self):
+        upload, manifest = self.start()
+        response = self.complete(manifest)
+        self.assertEqual(response.status_code, 201, response.content)
+        file = File.objects.get(pk=upload.pk)
+        self.assertEqual(file.size, len(self.content))
+        with open(file.file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(multipart.temp_path(upload.pk)))
+        self.assertFalse(MultipartUpload.objects.exists())
+        self.assertFalse(QuotaReservation.objects.exists())
+
+    def test_abort(self):
+        upload, _manifest = self.start()
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(os.path.exists(multipart.temp_path(upload.pk)))
+        self.assertFalse(MultipartUpload.objects.exists())
+        self.assertFalse(QuotaReservation.objects.exists())
+
+    def test_failed_complete_can_be_retried(self):
+        upload, manifest = self.start()
+        bad = [dict(item, sha256='0' * 64) if item['number'] == 2 else item for item in manifest]
+        self.assertEqual(self.complete(bad).status_code, 400)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, MultipartUpload.Status.UPLOADING)
+        self.assertTrue(os.path.exists(multipart.temp_path(upload.pk)))
+        self.assertEqual(self.complete(manifest).status_code, 201)
+
+    def test_part_changed_during_complete(self):
+        upload, manifest = self.start()
+        original = multipart._check_manifest
+
+        def check_then_rewrite(*args):
+            expected = original(*args)
+            # Параллельная запись части 1 началась: часть больше не считается принятой
+            MultipartUploadPart.objects.filter(upload=upload, number=1).delete()
+            return expected
+
+        multipart._check_manifest = check_then_rewrite
+        self.addCleanup(setattr, multipart, '_check_manifest', original)
+        self.assertEqual(self.complete(manifest).status_code, 400)
+        self.assertTrue(os.path.exists(multipart.temp_path(upload.pk)))
+        self.assertFalse(File.objects.exists())
+
+    @override_settings(MULTIPART_COMPLETE_TIMEOUT=600)
+    def test_interrupted_complete_taken_over(self):
+        upload, manifest = self.start()
+        target = self.crash_after_move(upload, minutes_ago=1)
+        # Завершение еще может идти в другом процессе
+        self.assertEqual(self.complete(manifest).status_code, 409)
+        self.assertEqual(self.client.delete(self.url).status_code, 409)
+
+        MultipartUpload.objects.filter(pk=upload.pk).update(completing_since=timezone.now() - timedelta(minutes=11))
+        response = self.complete(manifest)
+        self.assertEqual(response.status_code, 201, response.content)
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    @override_settings(MULTIPART_COMPLETE_TIMEOUT=600)
+    def test_interrupted_complete_aborted(self):
+        upload, _manifest = self.start()
+        target = self.crash_after_move(upload, minutes_ago=11)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(os.path.exists(target))
+        self.assertFalse(os.path.exists(multipart.temp_path(upload.pk)))
+        self.assertFalse(QuotaReservation.objects.exists())
+
+    @override_settings(MULTIPART_COMPLETE_TIMEOUT=600)
+    def test_expire_cleans_interrupted_complete(self):
+        stuck, _manifest = self.start()
+        stuck_target = self.crash_after_move(stuck, minutes_ago=11)
+        expired, _manifest = self.start()
+        expired_target = self.crash_after_move(expired, minutes_ago=11)
+        MultipartUpload.objects.filter(pk=expired.pk).update(expires_at=timezone.now())
+
+        self.assertEqual(multipart.expire(), (1, 1, 0))
+        self.assertFalse(os.path.exists(expired_target))
+        self.assertFalse(os.path.exists(multipart.temp_path(expired.pk)))
+        self.assertFalse(os.path.exists(stuck_target))
+        self.assertTrue(os.path.exists(multipart.temp_path(stuck.pk)))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, MultipartUpload.Status.UPLOADING)
+
+    def test_abort_after_reservation_expired(self):
+        self.start()
+        QuotaReservation.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(MultipartUpload.objects.exists())
+
+
+class RenameTests(MediaRootMixin, BudgetTestCase):
+    """Переименование через update() попадает в журнал изменений и укладывается в бюджет."""
+
+    def test_rename_recorded(self):
+        user = User.objects.create_user('renamer1', 'renamer1@example.com', 'Renamer', PASSWORD)
+        file = File.objects.create(owner=user, original_name='before.txt', file=SimpleUploadedFile('before.txt', b'data'))
+        client = APIClient()
+        client.force_authenticate(user)
+        with enforce(queries=4, duplicates=0):
+            response = client.patch(f'/api/files/{file.pk}/rename/', {'new_name': 'after'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['original_name'], 'after.txt')
+        self.assertEqual(FileChange.objects.filter(file_id=file.pk).latest('id').action, FileChange.Action.RENAMED)
+
+
+class BulkImportTests(MediaRootMixin, BudgetTestCase):
+    """Ошибка формата в середине файла импорта не оставляет созданных пачек."""
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_user('importadm', 'importadm@example.com', 'Import Admin', PASSWORD, is_admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def post(self, lines):
+        upload = SimpleUploadedFile('users.jsonl', '\n'.join(lines).encode('utf-8'))
+        return self.client.post('/api/users/bulk-import/', {'file': upload}, format='multipart')
+
+    def record(self, number):
+        return json.dumps({'username': f'bulk{number:05d}', 'email': f'bulk{number:05d}@example.com', 'full_name': 'Bulk User'})
+
+    def test_parse_error_after_first_batch(self):
+        users_before = User.objects.count()
+        response = self.post([self.record(number) for number in range(1001)] + ['{not json'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('строка 1002', response.data['detail'])
+        self.assertEqual(User.objects.count(), users_before)
+
+    def test_import(self):
+        response = self.post([self.record(number) for number in range(3)])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['created'], 3)
+        self.assertTrue(User.objects.filter(username='bulk00002').exists())
+
+
+class AuthQueryCountTests(MediaRootMixin, BudgetTestCase):
+    """Число SQL-запросов регистрации и входа (бюджеты RegisterView и LoginView)."""
+
+    def test_register(self):
+        # Группа по умолчанию уже существует, как на работающем сервере
+        Group.objects.get_or_create(name=DEFAULT_GROUP_NAME)
+        client = APIClient()
+        with self.assertNumQueries(10):
+            response = client.post('/api/auth/register/', {
+                'username': 'newuser1',
+                'email': 'newuser1@example.com',
+                'full_name': 'New User',
+                'password': PASSWORD,
+                'confirm_password': PASSWORD,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['token'], Token.objects.get(user__username='newuser1').key)
+
+    def test_login(self):
+        User.objects.create_user('loginuser1', 'loginuser1@example.com', 'Login User', PASSWORD)
+        client = APIClient()
+        with self.assertNumQueries(2):
+            response = client.post('/api/auth/login/', {'username': 'loginuser1', 'password': PASSWORD}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['user']['username'], 'loginuser1')
+        self.assertTrue(response.data['token'])
+
+
+@override_settings(FILE_SERVING_MODE='zerocopy', FILE_SERVING_BLOCK_SIZE=1000)
+class ServingTests(MediaRootMixin, BudgetTestCase):
+    """Отдача файлов в режиме zerocopy: диапазоны, пустые файлы и ограничение скорости."""
+
+    CONTENT = bytes(range(256)) * 16
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(tempfile.mkdtemp(), 'data.bin')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.path), ignore_errors=True)
+        with open(self.path, 'wb') as handle:
+            handle.write(self.CONTENT)
+
+    def serve(self, path=None, throttle=None, **headers):
+        request = RequestFactory().get('/download/', headers=headers)
+        response = serving.file_response(request, path or self.path, 'data.bin', throttle=throttle)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return content
+
+    def test_parse_range(self):
+        size = len(self.CONTENT)
+        self.assertEqual(serving.parse_range('bytes=0-99', size), (0, 100))
+        self.assertEqual(serving.parse_range('bytes=4000-', size), (4000, size - 4000))
+        self.assertEqual(serving.parse_range('bytes=4000-99999', size), (4000, size - 4000))
+        self.assertEqual(serving.parse_range('bytes=-100', size), (size - 100, 100))
+        self.assertEqual(serving.parse_range('bytes=-99999', size), (0, size))
+        self.assertIsNone(serving.parse_range('bytes=0-1,5-6', size))
+        self.assertIsNone(serving.parse_range('bytes=abc', size))
+        self.assertIsNone(serving.parse_range('items=0-1', size))
+        self.assertIsNone(serving.parse_range('bytes=10-5', size))
+        self.assertIsNone(serving.parse_range(None, size))
+        with self.assertRaises(serving.RangeNotSatisfiable):
+            serving.parse_range(f'bytes={size}-', size)
+
+    def test_full_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('Content-Range', response)
+        self.assertIsNotNone(response.file_to_stream.fileno())
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_range(self):
+        response = self.serve(Range='bytes=1000-2499')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-2499/{len(self.CONTENT)}')
+        self.assertEqual(response['Content-Length'], '1500')
+        self.assertEqual(self.body(response), self.CONTENT[1000:2500])
+
+    def test_suffix_range(self):
+        size = len(self.CONTENT)
+        response = self.serve(Range='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {size - 10}-{size - 1}/{size}')
+        self.assertEqual(self.body(response), self.CONTENT[-10:])
+
+    def test_range_not_satisfiable(self):
+        response = self.serve(Range=f'bytes={len(self.CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+
+    def test_full_file_fallbacks(self):
+        for headers in ({'Range': 'bytes=0-9,20-29'}, {'Range': 'bytes=0-9', 'If-Range': '"etag"'}):
+            with self.subTest(headers=headers):
+                response = self.serve(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('Content-Range', response)
+                self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_empty_file(self):
+        path = os.path.join(os.path.dirname(self.path), 'empty.bin')
+        open(path, 'wb').close()
+        response = self.serve(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.serve(path, Range='bytes=0-').status_code, 416)
+
+    def test_throttled_without_sendfile(self):
+        throttle = bandwidth.Throttle('download', [bandwidth.TokenBucket('test-serving', 10 ** 9, 10 ** 9)])
+        response = self.serve(throttle=throttle, Range='bytes=100-')
+        with self.assertRaises(io.UnsupportedOperation):
+            response.file_to_stream.fileno()
+        self.assertEqual(self.body(response), self.CONTENT[100:])
+
+    def test_download_range(self):
+        user = User.objects.create_user('ranger1', 'ranger1@example.com', 'Ranger', PASSWORD)
+        client = APIClient()
+        client.force_authenticate(user)
+        upload = SimpleUploadedFile('data.txt', self.CONTENT, content_type='text/plain')
+        created = client.post('/api/files/', {'file': upload, 'original_name': 'data.txt'}, format='multipart')
+        self.assertEqual(created.status_code, 201, created.content)
+        response = client.get(f"/api/files/{created.data['id']}/download/", HTTP_RANGE='bytes=-256')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.CONTENT[-256:])
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(MediaRootMixin, BudgetTestCase):
+    """Каждое изменение файлов сбрасывает кешированные ответы списка и карточки."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user('cacher1', 'cacher1@example.com', 'Cacher', PASSWORD)
+        self.other = User.objects.create_user('cacher2', 'cacher2@example.com', 'Other Cacher', PASSWORD)
+        self.admin = User.objects.create_superuser('cacheadmin', 'cacheadmin@example.com', 'Cache Admin', PASSWORD)
+        self.client = self.client_for(self.user)
+        self.file_id = self.upload(self.client)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def upload(self, client, name='cached.txt'):
+        data = {'file': SimpleUploadedFile(name, b'cached content', content_type='text/plain'), 'original_name': name}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/files/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data['id']
+
+    def warm(self, client, *urls):
+        for url in urls:
+            client.get(url)
+            self.assertEqual(client.get(url)['X-Cache'], 'HIT', url)
+
+    def assertMiss(self, client, *urls):
+        for url in urls:
+            self.assertEqual(client.get(url)['X-Cache'], 'MISS', url)
+
+    def assertInvalidates(self, write, client=None, urls=None):
+        client = client or self.client
+        urls = urls or ('/api/files/', f'/api/files/{self.file_id}/')
+        self.warm(client, *urls)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertMiss(client, *urls)
+
+    def test_upload(self):
+        self.assertInvalidates(lambda: self.upload(self.client, 'second.txt'))
+
+    def test_delete(self):
+        second = self.upload(self.client, 'second.txt')
+        self.warm(self.client, '/api/files/', f'/api/files/{second}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/files/{second}/').status_code, 204)
+        self.assertMiss(self.client, '/api/files/')
+        self.assertEqual(self.client.get(f'/api/files/{second}/').status_code, 404)
+
+    def test_rename(self):
+        url = f'/api/files/{self.file_id}/rename/'
+        self.assertInvalidates(lambda: self.assertEqual(self.client.patch(url, {'new_name': 'renamed.txt'}).status_code, 200))
+        self.assertEqual(self.client.get(f'/api/files/{self.file_id}/').data['original_name'], 'renamed.txt')
+
+    def test_share(self):
+        url = f'/api/files/{self.file_id}/share/'
+        self.assertInvalidates(lambda: self.assertEqual(self.client.post(url).status_code, 200))
+
+    def test_comment(self):
+        url = f'/api/files/{self.file_id}/'
+        self.assertInvalidates(lambda: self.assertEqual(self.client.patch(url, {'comment': 'note'}).status_code, 200))
+
+    def test_mark_downloaded(self):
+        def download():
+            response = self.client.get(f'/api/files/{self.file_id}/download/')
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+        self.assertInvalidates(download)
+
+    def test_owner_transfer(self):
+        other_client = self.client_for(self.other)
+        self.warm(other_client, '/api/files/')
+
+        def transfer():
+            file = File.objects.get(pk=self.file_id)
+            file.owner = self.other
+            file.save()
+
+        self.assertInvalidates(transfer, urls=['/api/files/'])
+        self.assertMiss(other_client, '/api/files/')
+        self.assertEqual(other_client.get('/api/files/').data['count'], 1)
+
+    def test_admin_global_scope(self):
+        admin_client = self.client_for(self.admin)
+        before = response_cache.versions(response_cache.GLOBAL_SCOPE)[0]
+        self.assertInvalidates(lambda: self.upload(self.client, 'second.txt'), client=admin_client, urls=['/api/files/'])
+        self.assertGreater(response_cache.versions(response_cache.GLOBAL_SCOPE)[0], before)
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTests(MediaRootMixin, BudgetTestCase):
+    """Журнал изменений: сжатие, граница сжатия, tombstone и постраничная выдача."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('syncer1', 'syncer1@example.com', 'Syncer', PASSWORD)
+        self.other = User.objects.create_user('syncer2', 'syncer2@example.com', 'Other Syncer', PASSWORD)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cursor = self.client.get('/api/files/changes/').data['cursor']
+
+    def upload(self, name):
+        data = {'file': SimpleUploadedFile(name, b'synced', content_type='text/plain'), 'original_name': name}
+        response = self.client.post('/api/files/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data['id']
+
+    def feed(self, client=None, since=None, **params):
+        response = (client or self.client).get('/api/files/changes/', {'since': self.cursor if since is None else since, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_compact_superseded(self):
+        file_id = self.upload('draft.txt')
+        self.client.patch(f'/api/files/{file_id}/rename/', {'new_name': 'second.txt'})
+        self.client.patch(f'/api/files/{file_id}/rename/', {'new_name': 'final.txt'})
+
+        self.assertEqual(changes.compact(retention_days=30), (2, 0))
+        self.assertEqual(
+            list(FileChange.objects.filter(file_id=file_id).values_list('action', flat=True)),
+            [FileChange.Action.RENAMED],
+        )
+        entries = self.feed()['changes']
+        self.assertEqual([(entry['id'], entry['file']['original_name']) for entry in entries], [(file_id, 'final.txt')])
+
+    def test_expired_entries_raise_watermark(self):
+        old_id = self.upload('old.txt')
+        new_id = self.upload('new.txt')
+        old_entry = FileChange.objects.get(file_id=old_id)
+        FileChange.objects.filter(pk=old_entry.pk).update(created_at=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(changes.compact(retention_days=30), (0, 1))
+        self.assertEqual(self.user.file_change_watermark.compacted_through, old_entry.pk)
+        self.assertEqual(self.client.get('/api/files/changes/', {'since': self.cursor}).status_code, 410)
+        self.assertGreaterEqual(self.client.get('/api/files/changes/').data['cursor'], old_entry.pk)
+        self.assertEqual([entry['id'] for entry in self.feed(since=old_entry.pk)['changes']], [new_id])
+
+    def test_purge_tombstone(self):
+        file_id = self.upload('purged.txt')
+        self.assertEqual(self.client.delete(f'/api/files/{file_id}/').status_code, 204)
+        self.assertEqual(self.feed()['changes'], [
+            {'id': file_id, 'action': FileChange.Action.PURGED, 'deleted': True, 'file': None},
+        ])
+
+    def test_transfer_tombstone(self):
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        other_cursor = other_client.get('/api/files/changes/').data['cursor']
+        file_id = self.upload('transferred.txt')
+
+        file = File.objects.get(pk=file_id)
+        file.owner = self.other
+        file.save()
+
+        self.assertEqual(self.feed()['changes'], [
+            {'id': file_id, 'action': FileChange.Action.PURGED, 'deleted': True, 'file': None},
+        ])
+        [entry] = self.feed(other_client, since=other_cursor)['changes']
+        self.assertEqual((entry['id'], entry['action'], entry['deleted']), (file_id, FileChange.Action.CREATED, False))
+
+    def test_has_more(self):
+        file_ids = [self.upload(f'page{number}.txt') for number in range(3)]
+
+        first = self.feed(limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([entry['id'] for entry in first['changes']], file_ids[:2])
+        second = self.feed(since=first['cursor'], limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual([entry['id'] for entry in second['changes']], file_ids[2:])
+        self.assertEqual(self.feed(since=second['cursor']), {'cursor': second['cursor'], 'has_more': False, 'changes': []})
+
+
+class HotFileCacheTests(MediaRootMixin, BudgetTestCase):
+    """Кеш популярных файлов: допуск по числу обращений, вытеснение по частоте, сброс."""
+
+    def hit(self, hot, key, times):
+        for _ in range(times):
+            hot.get(key, 'v1')
+
+    def test_min_hits_admission(self):
+        hot = hot_files.HotFileCache(capacity=100, max_size=50, min_hits=2)
+        self.hit(hot, 'a', 1)
+        self.assertFalse(hot.wants('a', 10))
+        self.hit(hot, 'a', 1)
+        self.assertTrue(hot.wants('a', 10))
+        self.assertFalse(hot.wants('a', 51))
+        self.assertTrue(hot.put('a', 'v1', b'x' * 10))
+        self.assertEqual(hot.get('a', 'v1'), b'x' * 10)
+
+    def test_less_popular_does_not_evict(self):
+        hot = hot_files.HotFileCache(capacity=100, max_size=100, min_hits=1)
+        self.hit(hot, 'popular', 5)
+        self.assertTrue(hot.put('popular', 'v1', b'p' * 80))
+        self.hit(hot, 'rare', 1)
+        self.assertFalse(hot.put('rare', 'v1', b'r' * 40))
+        self.assertEqual(hot.get('popular', 'v1'), b'p' * 80)
+
+        self.hit(hot, 'rising', 10)
+        self.assertTrue(hot.put('rising', 'v1', b'n' * 40))
+        self.assertIsNone(hot.get('popular', 'v1'))
+        self.assertEqual(hot.size, 40)
+
+    def test_version_change_drops_entry(self):
+        hot = hot_files.HotFileCache(capacity=100, max_size=100, min_hits=1)
+        self.hit(hot, 'a', 1)
+        hot.put('a', 'v1', b'x' * 10)
+        self.assertIsNone(hot.get('a', 'v2'))
+        self.assertEqual(hot.size, 0)
+        self.assertIsNone(hot.get('a', 'v1'))
+
+    def test_delete_drops_entry(self):
+        hot = hot_files.HotFileCache(capacity=1024, max_size=1024, min_hits=1)
+        self.addCleanup(setattr, hot_files, 'files_cache', hot_files.files_cache)
+        hot_files.files_cache = hot
+
+        user = User.objects.create_user('hotowner', 'hotowner@example.com', 'Hot Owner', PASSWORD)
+        client = APIClient()
+        client.force_authenticate(user)
+        upload = SimpleUploadedFile('hot.txt', b'hot content', content_type='text/plain')
+        file_id = client.post('/api/files/', {'file': upload, 'original_name': 'hot.txt'}, format='multipart').data['id']
+        file = File.objects.get(pk=file_id)
+        self.assertEqual(hot_files.read(file), b'hot content')
+        self.assertEqual(hot.size, len(b'hot content'))
+
+        self.assertEqual(client.delete(f'/api/files/{file_id}/').status_code, 204)
+        self.assertEqual(hot.size, 0)
+        self.assertNotIn(file.pk, hot._frequency)
+
+
+class TokenBucketTests(BudgetTestCase):
+    """GCRA: запас burst без ожидания, дальше — пауза по скорости; ключ занятой корзины продлевается."""
+
+    RATE = 1000
+    BURST = 2000
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.now = 0
+        clock = mock.patch.object(bandwidth, '_now_us', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.bucket = bandwidth.TokenBucket('test', self.RATE, self.BURST)
+
+    def at(self, seconds):
+        self.now = int(seconds * 1_000_000)
+
+    def test_burst_then_rate(self):
+        self.at(1000)
+        self.assertEqual(self.bucket.consume(2000), 0)
+        self.assertEqual(self.bucket.consume(1000), 1.0)
+        self.assertEqual(self.bucket.consume(500), 1.5)
+        # Через 2.5 с ожидание погашено, но в корзине накоплено лишь 1000 байт запаса
+        self.at(1002.5)
+        self.assertEqual(self.bucket.consume(1000), 0)
+        self.assertEqual(self.bucket.consume(1000), 1.0)
+
+    def test_idle_bucket_is_full(self):
+        self.at(1000)
+        self.bucket.consume(5000)
+        self.at(1010)
+        self.assertEqual(self.bucket.consume(2000), 0)
+        self.assertEqual(cache.get(self.bucket.key), 1012 * 1_000_000)
+
+    def test_busy_bucket_refreshes_ttl(self):
+        start = bandwidth.REFRESH_US // 1_000_000 - 10
+        self.at(start)
+        with mock.patch.object(bandwidth.cache, 'touch', wraps=bandwidth.cache.touch) as touch:
+            for second in range(60):
+                # Корзина занята: каждую секунду списывается весь ее приток
+                self.at(start + second)
+                self.bucket.consume(self.RATE)
+        self.assertEqual(touch.call_count, 1)
+        touch.assert_called_with(self.bucket.key, bandwidth.BUCKET_TIMEOUT)
+
+    def test_async_matches_sync(self):
+        other = bandwidth.TokenBucket('test-async', self.RATE, self.BURST)
+        self.at(1000)
+        for amount in (2000, 1000, 500):
+            self.assertEqual(async_to_sync(other.aconsume)(amount), self.bucket.consume(amount))
+
+    def test_throttle_waits_for_slowest_bucket(self):
+        slow = bandwidth.TokenBucket('test-slow', self.RATE // 2, 0)
+        throttle = bandwidth.Throttle('download', [self.bucket, slow, bandwidth.TokenBucket('test-off', 0, 0)])
+        self.at(1000)
+        self.assertEqual(len(throttle.buckets), 2)
+        self.assertEqual(throttle.delay(1000), 2.0)
+        self.assertEqual(async_to_sync(throttle.adelay)(1000), 4.0)
+
+
+class FileListSerializerTests(MediaRootMixin, BudgetTestCase):
+    """Быстрый сериализатор списков выдает то же, что FileSerializer."""
+
+    def test_parity(self):
+        user = User.objects.create_user('lister1', 'lister1@example.com', 'Lister', PASSWORD)
+        client = APIClient()
+        client.force_authenticate(user)
+        upload = SimpleUploadedFile('parity.txt', b'parity', content_type='text/plain')
+        file_id = client.post('/api/files/', {'file': upload, 'original_name': 'parity.txt', 'comment': 'note'}, format='multipart').data['id']
+        client.post(f'/api/files/{file_id}/share/')
+        client.get(f'/api/files/{file_id}/download/').close()
+
+        file = File.objects.select_related('owner').get(pk=file_id)
+        context = {'request': APIRequestFactory().get('/api/files/')}
+        self.assertEqual(FileListSerializer.Meta.fields, FileSerializer.Meta.fields)
+        self.assertEqual(FileListSerializer(file, context=context).data, FileSerializer(file, context=context).data)
+        self.assertEqual(
+            FileListSerializer(file, context=context, fields=('id', 'last_download')).data,
+            FileSerializer(file, context=context, fields=('id', 'last_download')).data,
+        )
+        self.assertTrue(all(field.read_only for field in FileListSerializer().fields.values()))
+
+
+class QueryBudgetMiddlewareTests(BudgetTestCase):
+    """Под ASGI middleware бюджетов не уводит запрос в поток и не записывает SQL."""
+
+    def test_async_passthrough(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        middleware = QueryBudgetMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(iscoroutinefunction(middleware.process_view))
+        response = async_to_sync(middleware)(AsyncRequestFactory().get('/api/files/'))
+        self.assertEqual(response.content, b'ok')
+
+    def test_wrapper_removed_after_request(self):
+        wrappers = list(connection.execute_wrappers)
+        self.client.get('/api/files/')
+        self.assertEqual(connection.execute_wrappers, wrappers)
+
+
+class MetricsAccessTests(BudgetTestCase):
+    """Без METRICS_TOKEN метрики закрыты, кроме DEBUG и адресов из METRICS_ALLOWED_IPS."""
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=[])
+    def test_denied_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_allowed_ip(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.6').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class EventTicketTests(BudgetTestCase):
+    """Поток событий принимает в адресе только короткоживущий билет, а не токен."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('streamer1', 'streamer1@example.com', 'Streamer', PASSWORD)
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+
+    def authenticate(self, **params):
+        return async_to_sync(async_views._authenticate)(AsyncRequestFactory().get('/api/events/', params))
+
+    def test_ticket(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        response = client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.authenticate(ticket=response.data['ticket']), self.user)
+        self.assertEqual(APIClient().post('/api/events/ticket/').status_code, 403)
+
+    def test_token_in_query_rejected(self):
+        self.assertIsNone(self.authenticate(token=self.token))
+        self.assertIsNone(self.authenticate(ticket=self.token))
+
+    def test_expired_ticket(self):
+        ticket = events.issue_ticket(self.user)
+        with override_settings(EVENTS_TICKET_MAX_AGE=-1):
+            self.assertIsNone(self.authenticate(ticket=ticket))
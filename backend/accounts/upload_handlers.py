@@ -0,0 +1,98 @@
+import hashlib
+import logging
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from . import bandwidth, metrics, quota
+from .exceptions import UploadTooLarge, StorageQuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+# Запас на заголовки частей multipart и служебные поля формы
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, отклоняющий запрос до чтения тела.
+
+    По Content-Length проверяется MAX_UPLOAD_SIZE и резервируется квота
+    пользователя еще до разбора multipart. Во время приема данных считаются
+    фактические байты, поэтому неверный или отсутствующий Content-Length
+    не позволяет обойти лимиты. После разбора резерв уменьшается до точного
+    размера и сохраняется в request.quota_reservation для фиксации во view.
+    Попутно считается SHA-256 каждого файла (request.upload_digests по имени
+    поля формы) — для поиска совпадений при загрузке без передачи данных —
+    и ограничивается скорость приема (BANDWIDTH_UPLOAD_RATE).
+    Должен стоять первым в списке request.upload_handlers.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_upload_size = settings.MAX_UPLOAD_SIZE
+        self.reservation = None
+        self.file_received = 0
+        self.total_received = 0
+        self.digest = None
+        self.throttle = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        content_length = content_length or 0
+        if content_length - MULTIPART_OVERHEAD > self.max_upload_size:
+            self._reject_too_large(content_length)
+
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            self.reservation = quota.reserve(user, content_length, slack=MULTIPART_OVERHEAD)
+            self.request.quota_reservation = self.reservation
+            self.throttle = bandwidth.upload_throttle(user)
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file_received = 0
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file_received += len(raw_data)
+        self.total_received += len(raw_data)
+
+        if self.file_received > self.max_upload_size:
+            self._reject_too_large(self.file_received)
+        if self.reservation is not None and self.total_received > self.reservation.size:
+            self._reject_quota(self.total_received)
+        self.digest.update(raw_data)
+        if self.throttle:
+            # Пауза перед чтением следующего блока замедляет отправителя через TCP
+            self.throttle.wait(len(raw_data))
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_digests'):
+                self.request.upload_digests = {}
+            self.request.upload_digests[self.field_name] = self.digest.hexdigest()
+        return None
+
+    def upload_complete(self):
+        if self.reservation is not None:
+            quota.resize(self.reservation, self.total_received)
+
+    def _reject_too_large(self, size):
+        logger.warning(f"Upload rejected: {size} bytes exceeds MAX_UPLOAD_SIZE {self.max_upload_size}")
+        metrics.QUOTA_REJECTIONS.labels(reason='too_large').inc()
+        raise UploadTooLarge(
+            _('Файл превышает максимально допустимый размер: %(max)s байт') % {
+                'max': self.max_upload_size
+            }
+        )
+
+    def _reject_quota(self, size):
+        logger.warning(f"Upload rejected: {size} bytes exceeds declared size {self.reservation.size}")
+        metrics.QUOTA_REJECTIONS.labels(reason='declared_size').inc()
+        quota.release(self.reservation)
+        raise StorageQuotaExceeded(
+            _('Объем загрузки превышает заявленный размер: %(declared)s байт') % {
+                'declared': self.reservation.size
+            }
+        )
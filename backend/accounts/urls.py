@@ -1,12 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     FileViewSet,
     UserViewSet,
     RegisterView,
     LoginView,
     LogoutView,
-    PublicFileDownloadView
+    PublicFileDownloadView,
+    StorageAnalyticsView,
+    EventTicketView
 )
 
 # Создание роутера для автоматической генерации URL-адресов для ViewSet'ов
@@ -19,10 +22,15 @@ auth_urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),  
     path('login/', LoginView.as_view(), name='login'),          
     path('logout/', LogoutView.as_view(), name='logout'),       
+    path('async/login/', async_views.login_view, name='async-login'),
+    path('async/register/', async_views.register_view, name='async-register'),
 ]
 
 # Основные URL-паттерны приложения
 urlpatterns = [
     path('auth/', include(auth_urlpatterns)),      
+    path('analytics/storage/', StorageAnalyticsView.as_view(), name='storage-analytics'),
+    path('events/ticket/', EventTicketView.as_view(), name='events-ticket'),
+    path('events/', async_views.events_view, name='events'),
     path('', include(router.urls)),  
 ]
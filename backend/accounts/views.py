@@ -1,11 +1,14 @@
+import io
 import os
 import uuid
 import logging
-import mimetypes
-from django.http import FileResponse, Http404
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth import logout
+from django.db import transaction
 from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -20,7 +23,15 @@ from drf_yasg import openapi
 from .models import File, User
 from .serializers import (
     FileSerializer,
+    FileListSerializer,
+    UploadPrecheckSerializer,
+    InstantUploadSerializer,
+    MultipartInitiateSerializer,
+    MultipartUploadSerializer,
+    MultipartPartSerializer,
+    MultipartCompleteSerializer,
     UserSerializer,
+    AuthUserSerializer,
     RegisterSerializer,
     LoginSerializer
 )
@@ -28,6 +39,12 @@ from .permissions import (
     IsAdminUser,
     IsOwnerOrAdmin
 )
+from .upload_handlers import QuotaUploadHandler
+from .budgets import Budget, query_budget
+from .fieldsets import SparseFieldsetViewMixin
+from .response_cache import CachedResponseMixin
+from . import analytics, bandwidth, changes, dedup, events, hot_files, metrics, multipart, quota, serving
+from .provisioning import import_file
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +53,7 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class FileViewSet(viewsets.ModelViewSet):
+class FileViewSet(CachedResponseMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = File.objects.all()
     serializer_class = FileSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -46,9 +63,29 @@ class FileViewSet(viewsets.ModelViewSet):
     ordering = ['-upload_date']
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
     pagination_class = StandardResultsSetPagination
+    # Бюджеты SQL-запросов для унаследованных действий (см. accounts/budgets.py)
+    query_budgets = {
+        'list': Budget(queries=4, duplicates=0),
+        'retrieve': Budget(queries=3, duplicates=0),
+        'create': Budget(queries=28, duplicates=1),
+        'destroy': Budget(queries=8, duplicates=0),
+    }
+    # Столбцы для ?fields= / ?omit= (см. accounts/fieldsets.py). Владелец
+    # загружается всегда: по нему проверяются права доступа к файлу
+    fieldset_columns = {
+        'owner': ('owner__username', 'owner__full_name'),
+        'human_readable_size': ('size',),
+    }
+    fieldset_required = ('owner', 'owner__id')
+
+    def get_serializer_class(self):
+        # Для списков — облегченный сериализатор без побочных эффектов
+        if self.action == 'list':
+            return FileListSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(is_deleted=False)         
+        queryset = super().get_queryset().filter(is_deleted=False).select_related('owner')
         
         if self.request.user.is_admin:            
             owner_id = self.request.query_params.get('owner')
@@ -57,7 +94,23 @@ class FileViewSet(viewsets.ModelViewSet):
         else:            
             queryset = queryset.filter(owner=self.request.user)
         
-        return queryset
+        return self.prune_columns(queryset)
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'create':
+            # Проверка размера и квоты до чтения тела запроса. Обработчик ставится
+            # до аутентификации: проверка CSRF для сессий читает request.POST,
+            # и тело разбирается еще до вызова create
+            request.upload_handlers.insert(0, QuotaUploadHandler(request))
+        return drf_request
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Резерв незавершенной загрузки (ошибка проверки, CSRF, аутентификации)
+        reservation = getattr(request, 'quota_reservation', None)
+        if reservation is not None:
+            quota.release(reservation)
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def perform_create(self, serializer):
         file_obj = self.request.FILES.get('file')
@@ -66,12 +119,17 @@ class FileViewSet(viewsets.ModelViewSet):
         
         current_user = self.request.user        
         
-        if current_user.storage_left < file_obj.size:
-            raise ValidationError(
-                {"detail": f"Недостаточно места в хранилище. Доступно: {current_user.storage_left} байт"}
-            )        
-        
-        serializer.save(owner=current_user)
+        reservation = getattr(self.request, 'quota_reservation', None)
+        if reservation is None:
+            reservation = quota.reserve(current_user, file_obj.size)
+            self.request.quota_reservation = reservation
+
+        # SHA-256 посчитан QuotaUploadHandler при приеме данных
+        digests = getattr(self.request, 'upload_digests', {})
+        with quota.commit(reservation):
+            serializer.save(owner=current_user, sha256=digests.get('file'))
+        # Резерв удален при фиксации, освобождать в finalize_response нечего
+        self.request.quota_reservation = None
         logger.info(f"User {current_user.username} uploaded file {file_obj.name}")
 
     def perform_destroy(self, instance):
@@ -89,6 +147,7 @@ class FileViewSet(viewsets.ModelViewSet):
             404: 'Файл не найден'
         }
     )
+    @query_budget(queries=3, duplicates=0)
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         file = self.get_object()        
@@ -99,31 +158,17 @@ class FileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        file.last_download = timezone.now()
-        file.save()
+        file.mark_downloaded()
 
-        file_handle = None
         try:
-            file_path = file.file.path
-            if not os.path.exists(file_path):
-                logger.error(f"File not found: {file_path}")
-                raise Http404("Файл не найден на сервере.")
-            
-            mime_type, _ = mimetypes.guess_type(file_path)
-            file_handle = open(file_path, 'rb')
-            response = FileResponse(
-                file_handle,
-                content_type=mime_type or 'application/octet-stream',
-                as_attachment=True,
-                filename=file.original_name
-            )            
-            
-            file_handle = None
-            return response
-            
+            return serving.file_response(
+                request, file.file.path, file.original_name,
+                throttle=bandwidth.download_throttle(request.user),
+            )
+        except FileNotFoundError:
+            logger.error(f"File not found: {file.file.name}")
+            raise Http404("Файл не найден на сервере.")
         except Exception as e:
-            if file_handle:
-                file_handle.close()
             logger.error(f"Download error: {str(e)}")
             raise Http404(f"Ошибка при скачивании: {str(e)}")
 
@@ -148,6 +193,8 @@ class FileViewSet(viewsets.ModelViewSet):
             400: 'Ошибка запроса'
         }
     )
+    # Первая публикация создает строку агрегата публичных файлов (+2 запроса)
+    @query_budget(queries=14, duplicates=1)
     @action(detail=True, methods=['post', 'delete'])
     def share(self, request, pk=None):
         file = self.get_object()
@@ -199,6 +246,7 @@ class FileViewSet(viewsets.ModelViewSet):
             400: 'Неверное имя файла'
         }
     )
+    @query_budget(queries=4, duplicates=0)
     @action(detail=True, methods=['patch'], url_path='rename')
     def rename(self, request, pk=None):
         file = self.get_object()        
@@ -217,22 +265,225 @@ class FileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )        
         
-        old_name = file.original_name
-        file.original_name = new_name
-        
         try:
-            file.save()  
+            file.rename(new_name)
             return Response(
-                {'id': file.id, 'original_name': new_name},
+                {'id': file.id, 'original_name': file.original_name},
                 status=status.HTTP_200_OK
             )
-        except ValidationError as e:            
-            file.original_name = old_name
+        except ValidationError as e:
             return Response(
                 {'detail': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @swagger_auto_schema(
+        operation_description=(
+            "Предварительная проверка загрузки по SHA-256 и размеру файла. "
+            "Всегда возвращается проверка владения: клиент считает SHA-256 от nonce "
+            "и байтов [offset, offset + length) и вызывает instant-upload. Хранится ли "
+            "такое содержимое, ответ не раскрывает: без совпадения instant-upload "
+            "отвечает 403, и файл загружается обычным способом."
+        ),
+        request_body=UploadPrecheckSerializer,
+        responses={
+            200: openapi.Response('Результат проверки', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'status': openapi.Schema(type=openapi.TYPE_STRING, enum=['challenge']),
+                    'challenge_id': openapi.Schema(type=openapi.TYPE_STRING),
+                    'offset': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'length': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'nonce': openapi.Schema(type=openapi.TYPE_STRING),
+                }
+            )),
+            400: 'Некорректный запрос'
+        }
+    )
+    @query_budget(queries=3, duplicates=0)
+    @action(detail=False, methods=['post'])
+    def precheck(self, request):
+        serializer = UploadPrecheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        challenge = dedup.issue_challenge(request.user, **serializer.validated_data)
+        if challenge is None:
+            return Response({'status': 'upload'}, status=status.HTTP_200_OK)
+        return Response(dict(challenge, status='challenge'), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Создание файла без передачи данных после предварительной проверки",
+        request_body=InstantUploadSerializer,
+        responses={
+            201: FileSerializer,
+            200: 'Содержимое больше недоступно, загрузите файл полностью (status=upload)',
+            400: 'Проверка не найдена или истекла',
+            403: 'Доказательство владения не совпало или содержимое не найдено',
+            507: 'Недостаточно места в хранилище'
+        }
+    )
+    @query_budget(queries=27, duplicates=1)
+    @action(detail=False, methods=['post'], url_path='instant-upload')
+    def instant_upload(self, request):
+        serializer = InstantUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = dedup.claim(request.user, **serializer.validated_data)
+        if file is None:
+            return Response({'status': 'upload'}, status=status.HTTP_200_OK)
+        return Response(FileSerializer(file, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Начало загрузки большого файла частями. Квота резервируется на весь файл. "
+            "Части с номерами 1..parts_count загружаются параллельно запросами "
+            "PUT multipart/{upload_id}/parts/{number}/, затем вызывается complete."
+        ),
+        request_body=MultipartInitiateSerializer,
+        responses={
+            201: MultipartUploadSerializer,
+            400: 'Некорректные данные файла',
+            507: 'Недостаточно места в хранилище'
+        }
+    )
+    @query_budget(queries=6, duplicates=0)
+    @action(detail=False, methods=['post'], url_path='multipart')
+    def multipart_initiate(self, request):
+        serializer = MultipartInitiateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = multipart.initiate(request.user, **serializer.validated_data)
+        return Response(MultipartUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Состояние загрузки частями и принятые части (для продолжения после обрыва)",
+        responses={200: MultipartUploadSerializer, 404: 'Загрузка не найдена или истекла'}
+    )
+    @swagger_auto_schema(
+        method='delete',
+        operation_description="Отмена загрузки частями: временный файл и резерв квоты удаляются",
+        responses={204: 'Загрузка отменена', 404: 'Загрузка не найдена или истекла', 409: 'Загрузка уже завершается'}
+    )
+    @query_budget(queries=9, duplicates=1)
+    @action(detail=False, methods=['get', 'delete'], url_path=r'multipart/(?P<upload_id>[0-9a-f-]{32,36})')
+    def multipart_upload(self, request, upload_id=None):
+        upload = multipart.get_upload(request.user, upload_id)
+        if request.method == 'DELETE':
+            multipart.abort(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(MultipartUploadSerializer(upload).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Загрузка части: тело запроса — содержимое части (application/octet-stream), "
+            "заголовок X-Content-SHA256 — SHA-256 части. Размер всех частей, кроме "
+            "последней, равен part_size. Повторная загрузка части заменяет ее."
+        ),
+        manual_parameters=[
+            openapi.Parameter('X-Content-SHA256', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: MultipartPartSerializer,
+            400: 'Неверный размер или контрольная сумма части',
+            404: 'Загрузка не найдена или истекла',
+            409: 'Загрузка уже завершается'
+        }
+    )
+    @query_budget(queries=9, duplicates=1)
+    @action(detail=False, methods=['put'], url_path=r'multipart/(?P<upload_id>[0-9a-f-]{32,36})/parts/(?P<number>[0-9]+)')
+    def multipart_part(self, request, upload_id=None, number=None):
+        upload = multipart.get_upload(request.user, upload_id)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        part = multipart.upload_part(
+            upload, int(number), request.stream, length, request.headers.get('X-Content-SHA256', ''),
+            throttle=bandwidth.upload_throttle(request.user),
+        )
+        return Response(MultipartPartSerializer(part).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Завершение загрузки частями по списку всех частей с их SHA-256. "
+            "Список сверяется с принятыми частями, файл создается без чтения и копирования. "
+            "Прерванное сбоем завершение через MULTIPART_COMPLETE_TIMEOUT можно повторить."
+        ),
+        request_body=MultipartCompleteSerializer,
+        responses={
+            201: FileSerializer,
+            400: 'Части отсутствуют или их контрольные суммы не совпали',
+            404: 'Загрузка не найдена или истекла',
+            409: 'Загрузка уже завершается',
+            507: 'Недостаточно места в хранилище'
+        }
+    )
+    @query_budget(queries=31, duplicates=1)
+    @action(detail=False, methods=['post'], url_path=r'multipart/(?P<upload_id>[0-9a-f-]{32,36})/complete')
+    def multipart_complete(self, request, upload_id=None):
+        serializer = MultipartCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = multipart.get_upload(request.user, upload_id)
+        file = multipart.complete(upload, serializer.validated_data['parts'])
+        return Response(FileSerializer(file, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Изменения файлов текущего пользователя после курсора since: по одному "
+            "элементу на файл — текущее состояние или tombstone (deleted=true). "
+            "Без since возвращается только текущий курсор (запросите его перед полной "
+            "синхронизацией). 410 — курсор устарел после сжатия журнала, нужна полная синхронизация."
+        ),
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: openapi.Response('Изменения', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'cursor': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'has_more': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'changes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'id': openapi.Schema(type=openapi.TYPE_STRING),
+                            'action': openapi.Schema(type=openapi.TYPE_STRING),
+                            'deleted': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                            'file': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        }
+                    )),
+                }
+            )),
+            400: 'Некорректный курсор',
+            410: 'Курсор устарел'
+        }
+    )
+    @query_budget(queries=4, duplicates=0)
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': changes.latest_cursor(request.user), 'has_more': False, 'changes': []})
+        try:
+            since = int(since)
+            limit = min(int(request.query_params.get('limit', settings.CHANGE_FEED_PAGE_SIZE)), settings.CHANGE_FEED_PAGE_SIZE)
+        except ValueError:
+            return Response({'detail': 'since и limit должны быть целыми числами'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'detail': 'since и limit должны быть положительными'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor, has_more, entries = changes.changes_since(request.user, since, limit)
+        serializer = FileListSerializer(context={'request': request})
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'changes': [
+                {
+                    'id': str(file_id),
+                    'action': action,
+                    'deleted': file is None,
+                    'file': serializer.to_representation(file) if file is not None else None,
+                }
+                for file_id, action, file in entries
+            ],
+        })
+
 class PublicFileDownloadView(APIView):
     permission_classes = [AllowAny]
 
@@ -243,38 +494,71 @@ class PublicFileDownloadView(APIView):
             404: 'Файл не найден или недоступен'
         }
     )
+    @query_budget(queries=2, duplicates=0)
     def get(self, request, shared_link):
         try:
             file = File.objects.get(shared_link=shared_link, is_public=True, is_deleted=False)
         except File.DoesNotExist:
             raise Http404("Файл не найден или недоступен")
 
-        file.last_download = timezone.now()
-        file.save()
+        file.mark_downloaded()
 
-        file_handle = None
         try:
-            file_path = file.file.path
-            if not os.path.exists(file_path):
-                raise Http404("Файл не найден на сервере")
-
-            mime_type, _ = mimetypes.guess_type(file_path)
-            file_handle = open(file_path, 'rb')
-            response = FileResponse(
-                file_handle,
-                content_type=mime_type or 'application/octet-stream'
+            # Популярные небольшие файлы отдаются из памяти, без обращения к диску
+            return serving.file_response(
+                request, file.file.path, file.original_name,
+                throttle=bandwidth.link_throttle(shared_link),
+                content=hot_files.read(file),
             )
-            response['Content-Disposition'] = f'attachment; filename="{file.original_name}"'
-                        
-            file_handle = None
-            return response
-            
+        except FileNotFoundError:
+            raise Http404("Файл не найден на сервере")
         except Exception as e:
-            if file_handle:
-                file_handle.close()
             logger.error(f"Public download error: {str(e)}")
             raise Http404(f"Ошибка скачивания: {str(e)}")
 
+class StorageAnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Аналитика использования хранилища: разбивка по типам файлов, "
+                              "месяцам загрузки, публичности и удалению, дневная история",
+        manual_parameters=[
+            openapi.Parameter('user', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='ID пользователя (только для администраторов)'),
+            openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Глубина истории в днях (1-365, по умолчанию 30)'),
+        ],
+        responses={
+            200: openapi.Response('Сводка использования хранилища'),
+            403: 'Нет доступа',
+            404: 'Пользователь не найден'
+        }
+    )
+    @query_budget(queries=3, duplicates=0)
+    def get(self, request):
+        user = request.user
+        user_id = request.query_params.get('user')
+        if user_id and str(user_id) != str(user.pk):
+            if not user.is_admin:
+                return Response(
+                    {"detail": "У вас нет доступа к аналитике этого пользователя."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            try:
+                user = User.objects.get(pk=user_id)
+            except (User.DoesNotExist, ValueError):
+                raise Http404("Пользователь не найден")
+
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            return Response(
+                {'detail': 'Параметр days должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(analytics.user_storage_analytics(user, days=days))
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -282,20 +566,22 @@ class RegisterView(APIView):
         operation_description="Регистрация нового пользователя",
         request_body=RegisterSerializer,
         responses={
-            201: openapi.Response('Успешная регистрация', UserSerializer),
+            201: openapi.Response('Успешная регистрация', AuthUserSerializer),
             400: 'Ошибка валидации'
         }
     )
+    @query_budget(queries=10, duplicates=0)
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            Token.objects.filter(user=user).delete()
-            token = Token.objects.create(user=user)
-            
+            # Пользователь, группа, права и токен создаются в одной транзакции;
+            # токен, созданный при подготовке пользователя, возвращается как есть
+            with transaction.atomic():
+                user = serializer.save()
+
             return Response({
-                'user': UserSerializer(user).data,
-                'token': token.key
+                'user': AuthUserSerializer(user).data,
+                'token': user.auth_token.key
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -307,10 +593,11 @@ class LoginView(APIView):
         operation_description="Аутентификация пользователя",
         request_body=LoginSerializer,
         responses={
-            200: openapi.Response('Успешный вход', UserSerializer),
+            200: openapi.Response('Успешный вход', AuthUserSerializer),
             400: 'Неверные учетные данные'
         }
     )
+    @query_budget(queries=3, duplicates=0)
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if not serializer.is_valid():
@@ -320,7 +607,7 @@ class LoginView(APIView):
         token, _ = Token.objects.get_or_create(user=user)
         
         return Response({
-            'user': UserSerializer(user).data,
+            'user': AuthUserSerializer(user).data,
             'token': token.key
         }, status=status.HTTP_200_OK)
 
@@ -351,16 +638,59 @@ class LogoutView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class UserViewSet(viewsets.ModelViewSet):
+class EventTicketView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Короткоживущий билет для подключения к потоку событий: "
+            "GET /api/events/?ticket=<билет>. Билет действует EVENTS_TICKET_MAX_AGE секунд."
+        ),
+        responses={
+            200: openapi.Response('Билет', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'ticket': openapi.Schema(type=openapi.TYPE_STRING),
+                    'expires_in': openapi.Schema(type=openapi.TYPE_INTEGER),
+                }
+            )),
+            401: 'Пользователь не аутентифицирован'
+        }
+    )
+    @query_budget(queries=2, duplicates=0)
+    def post(self, request):
+        return Response(
+            {'ticket': events.issue_ticket(request.user), 'expires_in': settings.EVENTS_TICKET_MAX_AGE},
+            status=status.HTTP_200_OK
+        )
+
+class UserViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     pagination_class = StandardResultsSetPagination
+    query_budgets = {
+        'list': Budget(queries=3, duplicates=0),
+        'retrieve': Budget(queries=2, duplicates=0),
+    }
+
+    # storage_used и files_count — аннотации with_usage(), а не столбцы
+    fieldset_columns = {
+        'storage_used': (),
+        'files_count': (),
+    }
 
     def get_queryset(self):
+        fieldset = self.get_fieldset()
+        if fieldset is None or {'storage_used', 'files_count'} & set(fieldset):
+            users = User.objects.with_usage()
+        else:
+            # Без агрегатов не нужны ни JOIN с файлами, ни GROUP BY
+            users = User.objects.all()
+        users = self.prune_columns(users)
         if self.request.user.is_admin:
-            return User.objects.all()
-        return User.objects.filter(id=self.request.user.id)
+            return users
+        return users.filter(id=self.request.user.id)
 
     @swagger_auto_schema(
         operation_description="Получение данных текущего пользователя",
@@ -369,11 +699,55 @@ class UserViewSet(viewsets.ModelViewSet):
             401: 'Не авторизован'
         }
     )
+    @query_budget(queries=2, duplicates=0)
     @action(detail=False, methods=['get'])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        serializer = self.get_serializer(User.objects.with_usage().get(pk=request.user.pk))
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description="Массовое создание пользователей из CSV или JSONL файла (только для администраторов)",
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True),
+            openapi.Parameter('format', openapi.IN_FORM, type=openapi.TYPE_STRING, enum=['csv', 'jsonl']),
+            openapi.Parameter('dry_run', openapi.IN_FORM, type=openapi.TYPE_BOOLEAN),
+        ],
+        responses={
+            200: 'Статистика импорта',
+            400: 'Некорректный файл',
+            403: 'Нет прав'
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-import')
+    def bulk_import(self, request):
+        if not request.user.is_admin:
+            return Response(
+                {"detail": "Массовый импорт доступен только администраторам."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Необходимо передать файл'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            return Response({'detail': 'Поддерживаются форматы csv и jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        # Файл читается потоком, без загрузки целиком в память
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            stats = import_file(stream, fmt, dry_run=dry_run)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'detail': f'Не удалось прочитать файл: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            # Загруженный файл закрывает Django
+            stream.detach()
+
+        logger.info(f"Bulk import by {request.user.username}: {stats['created']} created, {stats['skipped']} skipped")
+        return Response(stats, status=status.HTTP_200_OK)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance == request.user:
@@ -381,4 +755,19 @@ class UserViewSet(viewsets.ModelViewSet):
                 {"detail": "Вы не можете удалить свою учетную запись."},
                 status=status.HTTP_403_FORBIDDEN
             )
-        return super().destroy(request, *args, **kwargs)
\ No newline at end of file
+        return super().destroy(request, *args, **kwargs)
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Если задан METRICS_TOKEN, нужен
+    заголовок с токеном; без токена метрики доступны только при DEBUG или
+    с адресов из METRICS_ALLOWED_IPS.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not constant_time_compare(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    elif not settings.DEBUG and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
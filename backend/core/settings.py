@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.MetricsMiddleware',
+    'accounts.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -185,6 +187,7 @@ CORS_ALLOW_HEADERS = [
     'dnt',
     'origin',
     'user-agent',
+    'x-content-sha256',
     'x-csrftoken',
     'x-requested-with',
 ]
@@ -206,6 +209,112 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 52428800))
 
+# Шардирование каталогов пользователей: user_<username>/<ab>/<cd>/<файл>
+FILE_STORAGE_SHARD_DEPTH = int(os.getenv('FILE_STORAGE_SHARD_DEPTH', 2))
+FILE_STORAGE_SHARD_WIDTH = int(os.getenv('FILE_STORAGE_SHARD_WIDTH', 2))
+
+# Время жизни резерва квоты для незавершенной загрузки (в секундах)
+QUOTA_RESERVATION_TTL = int(os.getenv('QUOTA_RESERVATION_TTL', 3600))
+
+# Журнал изменений файлов для синхронизации клиентов (accounts/changes.py):
+# срок хранения записей до сжатия, задержка перед выдачей новых записей
+# (в секундах) и максимальный размер страницы
+CHANGE_FEED_RETENTION_DAYS = int(os.getenv('CHANGE_FEED_RETENTION_DAYS', 90))
+CHANGE_FEED_SETTLE_SECONDS = float(os.getenv('CHANGE_FEED_SETTLE_SECONDS', 2))
+CHANGE_FEED_PAGE_SIZE = int(os.getenv('CHANGE_FEED_PAGE_SIZE', 1000))
+
+# Поток событий Server-Sent Events (/api/events/, только под ASGI): брокер
+# ('accounts.events.RedisBroker' при нескольких процессах, нужен REDIS_URL),
+# интервал heartbeat (с), размер очереди соединения, пауза переподключения (мс)
+# и срок действия билета подключения (с)
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'accounts.events.LocalBroker')
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))
+EVENTS_TICKET_MAX_AGE = int(os.getenv('EVENTS_TICKET_MAX_AGE', 60))
+
+# Ограничение скорости передачи файлов (байт/с, 0 — без ограничения) и запас
+# (байт), который передается без ожидания: скачивания пользователя, скачивания
+# по публичной ссылке, загрузки пользователя. Общее для процессов при REDIS_URL
+BANDWIDTH_USER_RATE = int(os.getenv('BANDWIDTH_USER_RATE', 0))
+BANDWIDTH_USER_BURST = int(os.getenv('BANDWIDTH_USER_BURST', 8 * 1024 * 1024))
+BANDWIDTH_LINK_RATE = int(os.getenv('BANDWIDTH_LINK_RATE', 0))
+BANDWIDTH_LINK_BURST = int(os.getenv('BANDWIDTH_LINK_BURST', 8 * 1024 * 1024))
+BANDWIDTH_UPLOAD_RATE = int(os.getenv('BANDWIDTH_UPLOAD_RATE', 0))
+BANDWIDTH_UPLOAD_BURST = int(os.getenv('BANDWIDTH_UPLOAD_BURST', 8 * 1024 * 1024))
+
+# Кеш содержимого популярных небольших файлов публичных ссылок в памяти каждого
+# процесса: общий объем (байт, 0 — отключен), максимальный размер файла (байт)
+# и число скачиваний, после которого файл попадает в кеш
+HOT_FILE_CACHE_SIZE = int(os.getenv('HOT_FILE_CACHE_SIZE', 64 * 1024 * 1024))
+HOT_FILE_MAX_SIZE = int(os.getenv('HOT_FILE_MAX_SIZE', 512 * 1024))
+HOT_FILE_MIN_HITS = int(os.getenv('HOT_FILE_MIN_HITS', 2))
+
+# Отдача файлов: zerocopy — sendfile под WSGI и срезы mmap под ASGI, с поддержкой
+# Range; django — прежний FileResponse. Размер блока (байт) для mmap и file_wrapper
+FILE_SERVING_MODE = os.getenv('FILE_SERVING_MODE', 'zerocopy')
+FILE_SERVING_BLOCK_SIZE = int(os.getenv('FILE_SERVING_BLOCK_SIZE', 1024 * 1024))
+
+# Загрузка больших файлов частями (accounts/multipart.py): размер части по
+# умолчанию и допустимые границы (байт), максимальные размер файла и число
+# частей, время жизни незавершенной загрузки и время, после которого
+# прерванное завершение перехватывается другим запросом (в секундах)
+MULTIPART_PART_SIZE = int(os.getenv('MULTIPART_PART_SIZE', 16 * 1024 * 1024))
+MULTIPART_MIN_PART_SIZE = int(os.getenv('MULTIPART_MIN_PART_SIZE', 1024 * 1024))
+MULTIPART_MAX_PART_SIZE = int(os.getenv('MULTIPART_MAX_PART_SIZE', 32 * 1024 * 1024))
+MULTIPART_MAX_SIZE = int(os.getenv('MULTIPART_MAX_SIZE', 10 * 1024 * 1024 * 1024))
+MULTIPART_MAX_PARTS = int(os.getenv('MULTIPART_MAX_PARTS', 10000))
+MULTIPART_UPLOAD_TTL = int(os.getenv('MULTIPART_UPLOAD_TTL', 86400))
+MULTIPART_COMPLETE_TIMEOUT = int(os.getenv('MULTIPART_COMPLETE_TIMEOUT', 600))
+
+# Загрузка без передачи данных (accounts/dedup.py): размер фрагмента файла,
+# хеш которого клиент присылает как доказательство владения, и время жизни
+# выданной проверки в секундах. Проверки хранятся в кеше Django
+DEDUP_PROOF_RANGE = int(os.getenv('DEDUP_PROOF_RANGE', 65536))
+DEDUP_CHALLENGE_TTL = int(os.getenv('DEDUP_CHALLENGE_TTL', 300))
+
+# Размер пула процессов для хеширования паролей (0 — по числу ядер)
+PASSWORD_HASHER_WORKERS = int(os.getenv('PASSWORD_HASHER_WORKERS', 0))
+# Сколько задач может ожидать в очереди пула на один процесс; сверх этого
+# асинхронные вход и регистрация отвечают 503 без ожидания
+PASSWORD_HASHER_QUEUE_PER_WORKER = int(os.getenv('PASSWORD_HASHER_QUEUE_PER_WORKER', 4))
+
+# Метрики Prometheus (/metrics). Если задан токен, запрос должен содержать
+# заголовок "Authorization: Bearer <токен>". Без токена метрики отдаются только
+# при DEBUG или на адреса из списка (через запятую; за nginx REMOTE_ADDR —
+# адрес прокси, поэтому в production задайте токен)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+# Этапы File.save дольше этого порога (мс) пишутся в лог
+FILE_SAVE_SLOW_MS = int(os.getenv('FILE_SAVE_SLOW_MS', 500))
+
+# Бюджеты SQL-запросов (см. accounts/budgets.py). В строгом режиме нарушение
+# вызывает исключение вместо записи в лог — включайте при прогонах в CI
+QUERY_BUDGETS_STRICT = os.getenv('QUERY_BUDGETS_STRICT', 'False') == 'True'
+# Бюджеты для представлений без декоратора, по имени URL
+QUERY_BUDGETS = {
+    'admin:accounts_user_changelist': {'queries': 12, 'duplicates': 1},
+    'admin:accounts_file_changelist': {'queries': 10, 'duplicates': 1},
+    'admin:auth_group_changelist': {'queries': 8, 'duplicates': 1},
+}
+
+# Общий кеш Django (версии и ответы кеша файлов, лимиты запросов). При
+# нескольких процессах gunicorn нужен общий кеш: задайте REDIS_URL (нужен пакет redis)
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Кеш ответов списка и карточки файла (accounts/response_cache.py). По умолчанию
+# включен только с общим кешем: локальный кеш процесса не видит сброс версий,
+# выполненный в других процессах
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True' if REDIS_URL else 'False') == 'True'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 # права для файлов
 FILE_UPLOAD_PERMISSIONS = 0o664  # -rw-rw-r--
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o775  # drwxrwxr-x
@@ -8,7 +8,7 @@ from drf_yasg import openapi
 from django.contrib.auth.views import LogoutView as DjangoLogoutView
 from django.http import HttpResponse
 
-from accounts.views import PublicFileDownloadView
+from accounts.views import PublicFileDownloadView, metrics_view
 
 # Настройки Swagger/OpenAPI
 schema_view = get_schema_view(
@@ -56,6 +56,9 @@ urlpatterns = [
     # API приложения
     path('api/', include('accounts.urls')),
 
+    # Метрики Prometheus
+    path('metrics', metrics_view, name='metrics'),
+
     # Стандартные URL для аутентификации DRF
     path('api/auth/', include('rest_framework.urls', namespace='rest_framework')),
 
@@ -0,0 +1,11 @@
+import os
+
+# Gunicorn загружает этот файл автоматически из рабочего каталога (backend).
+# Для сбора метрик со всех процессов задайте PROMETHEUS_MULTIPROC_DIR
+# (пустой каталог, очищаемый при перезапуске сервиса).
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
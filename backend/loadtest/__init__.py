@@ -0,0 +1,9 @@
+"""
+Нагрузочное тестирование API облачного хранилища.
+
+Сценарии запускаются против работающего сервера (runserver, gunicorn или uvicorn)
+и используют только стандартную библиотеку Python:
+
+    python -m loadtest.run --base-url http://localhost:8000 --scenario mixed --output results.json
+    python -m loadtest.compare baseline.json results.json
+"""
@@ -0,0 +1,118 @@
+import json
+import time
+import uuid
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, body=b''):
+        super().__init__(f'HTTP {status}: {body[:200]!r}')
+        self.status = status
+
+
+class Result:
+    """
+    Итог одного HTTP-запроса: статус, время (мс) и переданные байты.
+    data — разобранный JSON успешного ответа или тело ответа с ошибкой.
+    """
+    __slots__ = ('status', 'ms', 'bytes_in', 'bytes_out', 'data')
+
+    def __init__(self, status, ms, bytes_in=0, bytes_out=0, data=None):
+        self.status = status
+        self.ms = ms
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.data = data
+
+
+class ApiClient:
+    """Минимальный HTTP-клиент API на urllib с токен-аутентификацией."""
+
+    def __init__(self, base_url, token=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def url(self, path, params=None):
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        return f'{url}?{urlencode(params)}' if params else url
+
+    def request(self, method, path, params=None, json_body=None, body=None, headers=None, stream=False):
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        request = urllib.request.Request(self.url(path, params), data=body, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status = response.status
+                if stream:
+                    received = 0
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                    payload = None
+                else:
+                    raw = response.read()
+                    received = len(raw)
+                    payload = json.loads(raw) if raw and 'json' in (response.headers.get('Content-Type') or '') else None
+        except urllib.error.HTTPError as e:
+            raw = e.read()
+            return Result(e.code, (time.perf_counter() - started) * 1000, len(raw), len(body or b''), raw)
+        except (urllib.error.URLError, OSError):
+            return Result(0, (time.perf_counter() - started) * 1000, 0, len(body or b''))
+        return Result(status, (time.perf_counter() - started) * 1000, received, len(body or b''), payload)
+
+    def get(self, path, params=None, stream=False):
+        return self.request('GET', path, params=params, stream=stream)
+
+    def post(self, path, json_body=None):
+        return self.request('POST', path, json_body=json_body if json_body is not None else {})
+
+    def upload(self, filename, content, comment=''):
+        boundary = uuid.uuid4().hex
+        fields = [('original_name', filename), ('comment', comment)]
+        parts = []
+        for name, value in fields:
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            )
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return self.request(
+            'POST', '/api/files/', body=b''.join(parts),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+        )
+
+    def login(self, username, password):
+        result = self.post('/api/auth/login/', {'username': username, 'password': password})
+        if result.status != 200:
+            raise ApiError(result.status, result.data or b'')
+        self.token = result.data['token']
+        return self
+
+    def register(self, username, password):
+        result = self.post('/api/auth/register/', {
+            'username': username,
+            'email': f'{username}@loadtest.local',
+            'full_name': 'Load Test',
+            'password': password,
+            'confirm_password': password,
+        })
+        if result.status != 201:
+            raise ApiError(result.status, result.data or b'')
+        self.token = result.data['token']
+        return self
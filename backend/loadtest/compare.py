@@ -0,0 +1,77 @@
+import sys
+import json
+import argparse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.compare',
+        description='Сравнение двух прогонов нагрузочного теста',
+    )
+    parser.add_argument('baseline', help='JSON базового прогона (например, прошлого релиза)')
+    parser.add_argument('candidate', help='JSON нового прогона')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Допустимое ухудшение p95 и пропускной способности, %%')
+    return parser.parse_args(argv)
+
+
+def change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline, candidate, threshold):
+    """Возвращает строки сравнения и список регрессий по операциям."""
+    rows, regressions = [], []
+    for operation in sorted(set(baseline['operations']) & set(candidate['operations'])):
+        old, new = baseline['operations'][operation], candidate['operations'][operation]
+        p95 = change(old['p95_ms'], new['p95_ms'])
+        rps = change(old['rps'], new['rps'])
+        old_errors = old['errors'] / old['requests'] if old['requests'] else 0
+        new_errors = new['errors'] / new['requests'] if new['requests'] else 0
+        rows.append((operation, old['p95_ms'], new['p95_ms'], p95, old['rps'], new['rps'], rps))
+
+        if p95 is not None and p95 > threshold:
+            regressions.append(f'{operation}: p95 {old["p95_ms"]} -> {new["p95_ms"]} мс ({p95:+.1f}%)')
+        if rps is not None and rps < -threshold:
+            regressions.append(f'{operation}: {old["rps"]} -> {new["rps"]} запросов/с ({rps:+.1f}%)')
+        if new_errors > old_errors:
+            regressions.append(f'{operation}: доля ошибок {old_errors:.2%} -> {new_errors:.2%}')
+    return rows, regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    for name, report in (('baseline', baseline), ('candidate', candidate)):
+        meta = report['meta']
+        print(f"{name}: {meta.get('label') or '-'} @ {meta.get('revision') or '-'}, "
+              f"сценарий {meta['scenario']}, {meta['users']} пользователей, {meta['duration_s']} с")
+    if baseline['meta']['scenario'] != candidate['meta']['scenario']:
+        print('Внимание: прогоны выполнены с разными сценариями')
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'operation':<16}{'p95 old':>10}{'p95 new':>10}{'Δ%':>8}{'rps old':>10}{'rps new':>10}{'Δ%':>8}")
+    for operation, old_p95, new_p95, p95, old_rps, new_rps, rps in rows:
+        print(f'{operation:<16}{old_p95!s:>10}{new_p95!s:>10}{_pct(p95):>8}{old_rps!s:>10}{new_rps!s:>10}{_pct(rps):>8}')
+
+    if regressions:
+        print(f'Регрессии (порог {args.threshold:g}%):')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print('Регрессий не обнаружено')
+    return 0
+
+
+def _pct(value):
+    return '-' if value is None else f'{value:+.1f}'
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from .scenarios import SCENARIOS, VirtualUser
+from .stats import summarize
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.run',
+        description='Нагрузочный тест API облачного хранилища',
+    )
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--users', type=int, default=10, help='Виртуальных пользователей (потоков)')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность замера, с')
+    parser.add_argument('--warmup', type=float, default=5, help='Прогрев перед замером, с')
+    parser.add_argument('--small-files', type=int, default=10, help='Небольших файлов на пользователя')
+    parser.add_argument('--small-size', type=int, default=4096, help='Размер небольшого файла, байт')
+    parser.add_argument('--large-mb', type=float, default=10, help='Размер большого файла, МБ (0 — без него)')
+    parser.add_argument('--username', help='Существующая учетная запись для всех виртуальных пользователей')
+    parser.add_argument('--password', default='LoadTest-Passw0rd!')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=1, help='Seed генератора для воспроизводимой смеси операций')
+    parser.add_argument('--label', default='', help='Метка прогона (например, версия релиза)')
+    parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+    parser.add_argument('--keep', action='store_true', help='Не удалять загруженные файлы после прогона')
+    return parser.parse_args(argv)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_users(args):
+    run_id = f'{int(time.time()) % 10 ** 6:06d}'
+    large_size = int(args.large_mb * 2 ** 20)
+
+    def prepare(number):
+        username = args.username or f'lt{run_id}u{number}'
+        user = VirtualUser(args.base_url, username, args.password, args.timeout, random.Random(args.seed + number))
+        user.setup(args.username is None, args.small_files, args.small_size, large_size)
+        return user
+
+    with ThreadPoolExecutor(max_workers=min(args.users, 8)) as executor:
+        return list(executor.map(prepare, range(args.users)))
+
+
+def worker(user, scenario, warmup_until, deadline, samples, lock):
+    operations = list(scenario['weights'])
+    weights = [scenario['weights'][name] for name in operations]
+    burst = scenario.get('public_burst', 1)
+    think = scenario.get('think_ms', 0) / 1000
+    local = []
+
+    while time.monotonic() < deadline:
+        operation = user.rng.choices(operations, weights)[0]
+        if operation == 'public':
+            results = user.op_public(burst)
+        else:
+            results = getattr(user, f'op_{operation}')()
+        if time.monotonic() >= warmup_until:
+            local.extend((operation, result) for result in results)
+        if think:
+            time.sleep(think)
+
+    with lock:
+        samples.extend(local)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenario = SCENARIOS[args.scenario]
+    print(f"Сценарий {args.scenario}: {scenario['description']}")
+    print(f'Подготовка {args.users} пользователей на {args.base_url}...')
+    users = prepare_users(args)
+
+    samples, lock = [], threading.Lock()
+    started = time.monotonic()
+    warmup_until = started + args.warmup
+    deadline = warmup_until + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(user, scenario, warmup_until, deadline, samples, lock),
+            daemon=True,
+        )
+        for user in users
+    ]
+    print(f'Прогрев {args.warmup:g} с, замер {args.duration:g} с...')
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {
+        'meta': {
+            'label': args.label,
+            'revision': git_revision(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'base_url': args.base_url,
+            'scenario': args.scenario,
+            'weights': scenario['weights'],
+            'users': args.users,
+            'duration_s': args.duration,
+            'python': platform.python_version(),
+        },
+        'operations': summarize(samples, args.duration),
+    }
+
+    if not args.keep:
+        for user in users:
+            user.teardown()
+
+    print_summary(report['operations'])
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Результаты сохранены в {args.output}')
+    return 0 if report['operations'].get('total', {}).get('requests') else 1
+
+
+def print_summary(operations):
+    columns = ['requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mb_in_per_s']
+    print(f"{'operation':<16}" + ''.join(f'{column:>12}' for column in columns))
+    for operation, row in operations.items():
+        print(f'{operation:<16}' + ''.join(f'{str(row[column]):>12}' for column in columns))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+from urllib.parse import urlparse
+from .client import ApiClient, ApiError
+
+# Смеси операций виртуального пользователя: вес операции и пауза между запросами.
+# public_burst — сколько обращений к публичной ссылке выполняется подряд.
+SCENARIOS = {
+    'listing': {
+        'description': 'Много небольших запросов списка, поиска и карточки файла',
+        'weights': {'list': 60, 'search': 25, 'retrieve': 15},
+        'think_ms': 0,
+    },
+    'downloads': {
+        'description': 'Скачивание больших файлов с редкими запросами списка',
+        'weights': {'download_large': 70, 'download_small': 20, 'list': 10},
+        'think_ms': 0,
+    },
+    'public-burst': {
+        'description': 'Всплески анонимных скачиваний по публичным ссылкам',
+        'weights': {'public': 90, 'share': 10},
+        'public_burst': 20,
+        'think_ms': 200,
+    },
+    'uploads': {
+        'description': 'Загрузка небольших файлов и просмотр списка',
+        'weights': {'upload': 60, 'list': 40},
+        'think_ms': 0,
+    },
+    'mixed': {
+        'description': 'Типичная смесь операций пользователя веб-интерфейса',
+        'weights': {
+            'list': 35, 'search': 10, 'retrieve': 10, 'download_small': 15,
+            'download_large': 5, 'upload': 10, 'share': 5, 'public': 10,
+        },
+        'public_burst': 5,
+        'think_ms': 50,
+    },
+}
+
+SEARCH_TERMS = ['report', 'photo', 'notes', 'invoice', 'draft']
+
+
+class VirtualUser:
+    """Учетная запись нагрузочного теста с заранее загруженными файлами."""
+
+    def __init__(self, base_url, username, password, timeout, rng):
+        self.client = ApiClient(base_url, timeout=timeout)
+        self.anonymous = ApiClient(base_url, timeout=timeout)
+        self.username = username
+        self.password = password
+        # Все случайные выборы пользователя берутся из его генератора с seed прогона
+        self.rng = rng
+        self.small_files = []
+        self.large_files = []
+        self.uploaded = []
+        # Повторная публикация создает новую ссылку, поэтому храним по одной на файл
+        self.public_links = {}
+
+    def setup(self, register, small_files, small_size, large_size):
+        if register:
+            self.client.register(self.username, self.password)
+        else:
+            self.client.login(self.username, self.password)
+
+        for number in range(small_files):
+            name = f'{self.rng.choice(SEARCH_TERMS)}-{number}.txt'
+            result = self._upload_with_retry(name, os.urandom(small_size // 2).hex().encode())
+            self.small_files.append(result.data['id'])
+        if large_size:
+            result = self._upload_with_retry('large-archive.txt', b'0' * large_size)
+            self.large_files.append(result.data['id'])
+
+        if self.small_files:
+            self._share(self.small_files[0])
+        if not self.small_files or not self.public_links:
+            raise ApiError(0, f'Не удалось подготовить файлы пользователя {self.username}'.encode())
+
+    def _upload_with_retry(self, name, content, attempts=3):
+        for _attempt in range(attempts):
+            result = self.client.upload(name, content)
+            if result.status == 201:
+                return result
+        raise ApiError(result.status, result.data or b'')
+
+    def teardown(self):
+        for file_id in self.uploaded + self.small_files + self.large_files:
+            self.client.request('DELETE', f'/api/files/{file_id}/')
+
+    def _share(self, file_id):
+        result = self.client.post(f'/api/files/{file_id}/share/')
+        if result.status == 200:
+            self.public_links[file_id] = urlparse(result.data['shared_link']).path
+        return result
+
+    # Операции: каждая возвращает список Result (для всплесков — несколько)
+
+    def op_list(self):
+        return [self.client.get('/api/files/', {'page_size': 20})]
+
+    def op_search(self):
+        return [self.client.get('/api/files/', {'search': self.rng.choice(SEARCH_TERMS)})]
+
+    def op_retrieve(self):
+        return [self.client.get(f'/api/files/{self.rng.choice(self.small_files)}/')]
+
+    def op_download_small(self):
+        return [self.client.get(f'/api/files/{self.rng.choice(self.small_files)}/download/', stream=True)]
+
+    def op_download_large(self):
+        files = self.large_files or self.small_files
+        return [self.client.get(f'/api/files/{self.rng.choice(files)}/download/', stream=True)]
+
+    def op_upload(self):
+        result = self.client.upload(f'upload-{self.rng.randrange(10 ** 6)}.txt', os.urandom(2048))
+        if result.status == 201:
+            self.uploaded.append(result.data['id'])
+        return [result]
+
+    def op_share(self):
+        return [self._share(self.rng.choice(self.small_files))]
+
+    def op_public(self, burst=1):
+        link = self.rng.choice(list(self.public_links.values()))
+        return [self.anonymous.get(link, stream=True) for _ in range(burst)]
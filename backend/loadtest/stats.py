@@ -0,0 +1,45 @@
+import math
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, seconds):
+    """
+    Сводка по операциям: количество, ошибки, перцентили задержки (мс),
+    запросов и мегабайт в секунду. samples — список (операция, Result).
+    """
+    by_operation = {}
+    for operation, result in samples:
+        by_operation.setdefault(operation, []).append(result)
+    by_operation['total'] = [result for _operation, result in samples]
+
+    summary = {}
+    for operation, results in sorted(by_operation.items()):
+        latencies = sorted(result.ms for result in results)
+        errors = [result.status for result in results if not 200 <= result.status < 300]
+        bytes_in = sum(result.bytes_in for result in results)
+        bytes_out = sum(result.bytes_out for result in results)
+        summary[operation] = {
+            'requests': len(results),
+            'errors': len(errors),
+            'error_statuses': sorted(set(errors)),
+            'rps': round(len(results) / seconds, 2) if seconds else 0,
+            'p50_ms': _round(percentile(latencies, 0.50)),
+            'p90_ms': _round(percentile(latencies, 0.90)),
+            'p95_ms': _round(percentile(latencies, 0.95)),
+            'p99_ms': _round(percentile(latencies, 0.99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+            'mb_in_per_s': round(bytes_in / seconds / 2 ** 20, 3) if seconds else 0,
+            'mb_out_per_s': round(bytes_out / seconds / 2 ** 20, 3) if seconds else 0,
+        }
+    return summary
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
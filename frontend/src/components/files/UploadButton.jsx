@@ -1,7 +1,8 @@
 import React, { useState } from 'react';
 import { useDispatch } from 'react-redux';
+import { useSnackbar } from 'notistack';
 import { Button, LinearProgress, Dialog, DialogTitle, DialogContent, DialogActions, TextField, CircularProgress, Typography } from '@mui/material';
-import { uploadFile } from '../../services/files';
+import { MULTIPART_THRESHOLD, tryInstantUpload, uploadFile, uploadFileInParts } from '../../services/files';
 import { addFile } from '../../store/slices/filesSlice';
 
 export const UploadButton = ({ onSuccess, userId }) => {
@@ -11,6 +12,7 @@ export const UploadButton = ({ onSuccess, userId }) => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [comment, setComment] = useState('');
   const dispatch = useDispatch();
+  const { enqueueSnackbar } = useSnackbar();
 
   const handleFileChange = (e) => {
     const file = e.target.files[0];
@@ -34,6 +36,28 @@ export const UploadButton = ({ onSuccess, userId }) => {
     setDialogOpen(false);
 
     try {
+      // Большие файлы — частями; хеш всего файла для загрузки без передачи
+      // данных потребовал бы прочитать его в память целиком
+      if (selectedFile.size > MULTIPART_THRESHOLD) {
+        const uploaded = await uploadFileInParts(selectedFile, selectedFile.name, comment.trim(), setProgress);
+        dispatch(addFile(uploaded));
+        if (onSuccess) {
+          onSuccess(uploaded);
+        }
+        return;
+      }
+
+      // Если такой файл уже хранится на сервере, данные не передаются
+      const instant = await tryInstantUpload(selectedFile, selectedFile.name, comment.trim());
+      if (instant) {
+        setProgress(100);
+        dispatch(addFile(instant));
+        if (onSuccess) {
+          onSuccess(instant);
+        }
+        return;
+      }
+
       const formData = new FormData();
       formData.append('file', selectedFile);
       formData.append('original_name', selectedFile.name);
@@ -57,6 +81,12 @@ export const UploadButton = ({ onSuccess, userId }) => {
       }
     } catch (error) {
       console.error('Upload failed:', error);
+      const errorMessage = error.response?.data?.detail ||
+                           (error.response || error.isAxiosError ? 'Ошибка при загрузке файла' : error.message);
+      enqueueSnackbar(errorMessage, {
+        variant: 'error',
+        autoHideDuration: 5000
+      });
     } finally {
       setUploading(false);
       setProgress(0);
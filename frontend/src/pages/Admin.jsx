@@ -18,7 +18,7 @@ import {
   Alert,
   Snackbar,
 } from '@mui/material';
-import { getUsers, updateUser, deleteUser, getUserFiles } from '../services/users';
+import { getUsers, updateUser, deleteUser } from '../services/users';
 
 export default function Admin() {
   const [users, setUsers] = useState([]);
@@ -39,22 +39,8 @@ export default function Admin() {
         setLoading(true);
         setError(null);
         const data = await getUsers();
-        const usersData = data.results || data;
-        
-        const updatedUsers = await Promise.all(
-          usersData.map(async (user) => {
-            try {
-              const filesData = await getUserFiles(user.id);
-              const files = filesData.results || filesData;
-              return { ...user, files_count: files.length };
-            } catch (err) {
-              console.error(`Error fetching files for user ${user.username}:`, err);
-              return { ...user, files_count: 0 };
-            }
-          })
-        );
-
-        setUsers(updatedUsers);
+        // files_count и storage_used приходят в ответе API
+        setUsers(data.results || data);
       } catch (error) {
         console.error('Error fetching users:', error);
         setError('Failed to load users. Please try again later.');
@@ -15,6 +15,8 @@ import { FileList, UploadButton } from '../components/files';
 import { RenameDialog } from '../components/files/RenameDialog';
 import { CommentDialog } from '../components/files/CommentDialog';
 import api from '../services/api';
+import { FILE_LIST_FIELDS } from '../services/files';
+import { subscribeToEvents } from '../services/events';
 
 const Dashboard = () => {
   const [files, setFiles] = useState([]);
@@ -44,6 +46,7 @@ const Dashboard = () => {
         params: {
           page: pagination.page,
           page_size: pagination.pageSize,
+          fields: FILE_LIST_FIELDS,
         },
         signal,
       });
@@ -93,6 +96,29 @@ const Dashboard = () => {
     };
   }, [fetchFiles]);
 
+  // Изменения из других вкладок и устройств: серия событий — одна перезагрузка списка
+  useEffect(() => {
+    let timer = null;
+    const unsubscribe = subscribeToEvents({
+      onFileChange: () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+          if (!isMountedRef.current) return;
+          if (abortControllerRef.current) {
+            abortControllerRef.current.abort();
+          }
+          abortControllerRef.current = new AbortController();
+          fetchFiles(abortControllerRef.current.signal);
+        }, 500);
+      },
+    });
+
+    return () => {
+      clearTimeout(timer);
+      unsubscribe();
+    };
+  }, [fetchFiles]);
+
   const handlePageChange = (event, newPage) => {
     setPagination(prev => ({
       ...prev,
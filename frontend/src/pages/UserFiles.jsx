@@ -20,6 +20,7 @@ import { FileList, UploadButton } from '../components/files';
 import { RenameDialog } from '../components/files/RenameDialog';
 import { CommentDialog } from '../components/files/CommentDialog';
 import api from '../services/api';
+import { FILE_LIST_FIELDS } from '../services/files';
 
 export default function UserFiles() {
   const { userId } = useParams();
@@ -72,6 +73,7 @@ export default function UserFiles() {
       const params = {
         page: pagination.page,
         page_size: pagination.pageSize,
+        fields: FILE_LIST_FIELDS,
       };
 
       if (currentUser?.is_admin && userId) {
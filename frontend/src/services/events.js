@@ -0,0 +1,95 @@
+import api from './api';
+
+// Поток событий сервера (Server-Sent Events, GET /api/events/): изменения файлов
+// и квоты из других вкладок и устройств. EventSource не передает заголовки,
+// поэтому перед подключением запрашивается короткоживущий билет
+// (POST /api/events/ticket/), а постоянный токен в адрес не попадает.
+// Собственное переподключение EventSource повторяет адрес со старым билетом;
+// если билет уже истек, соединение закрывается, и подписка подключается заново
+// с новым билетом и ID последнего полученного события.
+
+export const FILE_EVENTS = ['file.added', 'file.removed', 'file.renamed', 'file.updated', 'file.shared'];
+
+const RECONNECT_DELAY_MS = 3000;
+
+export const subscribeToEvents = (handlers = {}) => {
+  if (!localStorage.getItem('token') || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+
+  let source = null;
+  let timer = null;
+  let closed = false;
+  let lastEventId = '';
+
+  const reconnect = () => {
+    clearTimeout(timer);
+    timer = setTimeout(connect, RECONNECT_DELAY_MS);
+  };
+
+  const listen = (type, handler) => {
+    source.addEventListener(type, (event) => {
+      if (event.lastEventId) {
+        lastEventId = event.lastEventId;
+      }
+      if (!handler) {
+        return;
+      }
+      try {
+        handler(JSON.parse(event.data), type);
+      } catch (error) {
+        console.error('Ошибка обработки события сервера:', error);
+      }
+    });
+  };
+
+  async function connect() {
+    let ticket;
+    try {
+      ({ data: { ticket } } = await api.post('/events/ticket/'));
+    } catch (error) {
+      console.warn('Не удалось получить билет для потока событий:', error);
+      if (!closed && error.response?.status !== 401) {
+        reconnect();
+      }
+      return;
+    }
+    if (closed) {
+      return;
+    }
+
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) {
+      params.set('last_event_id', lastEventId);
+    }
+    source = new EventSource(`${process.env.REACT_APP_API_URL}/events/?${params}`);
+
+    listen('sync');
+    if (handlers.onFileChange) {
+      FILE_EVENTS.forEach(type => listen(type, handlers.onFileChange));
+      // Пропущено слишком много изменений: список нужно загрузить заново
+      listen('reset', handlers.onFileChange);
+    } else {
+      FILE_EVENTS.forEach(type => listen(type));
+    }
+    if (handlers.onQuotaChange) {
+      listen('quota.changed', handlers.onQuotaChange);
+    }
+
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED && !closed) {
+        reconnect();
+      }
+    };
+  }
+
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    if (source) {
+      source.close();
+    }
+  };
+};
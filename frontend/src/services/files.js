@@ -1,8 +1,15 @@
 import api from './api';
 
-export const getFiles = async (ownerId = null) => {
+// Поля, которые выводят списки файлов (FileList, FileGrid); остальные
+// поля не передаются и не загружаются из БД (?fields=)
+export const FILE_LIST_FIELDS = 'id,original_name,file_type,human_readable_size,upload_date,last_download,comment';
+
+export const getFiles = async (ownerId = null, fields = FILE_LIST_FIELDS) => {
   try {
     const params = {};
+    if (fields) {
+      params.fields = fields;
+    }
     if (ownerId) {
       params.owner = ownerId;
     }
@@ -40,6 +47,119 @@ export const uploadFile = async (formData, onUploadProgress) => {
   }
 };
 
+const toHex = (buffer) =>
+  Array.from(new Uint8Array(buffer)).map((byte) => byte.toString(16).padStart(2, '0')).join('');
+
+const fromHex = (hex) => new Uint8Array(hex.match(/.{2}/g).map((byte) => parseInt(byte, 16)));
+
+// Загрузка без передачи данных: сервер ищет файл по SHA-256 и размеру и
+// просит подтвердить владение хешем случайного фрагмента. Возвращает созданный
+// файл или null, если файл нужно загрузить полностью (совпадения нет, браузер
+// не поддерживает crypto.subtle или проверка не удалась).
+export const tryInstantUpload = async (file, originalName, comment = '') => {
+  if (!window.crypto?.subtle || !file.size) {
+    return null;
+  }
+  try {
+    const sha256 = toHex(await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer()));
+    const { data: check } = await api.post('/files/precheck/', { sha256, size: file.size });
+    if (check.status !== 'challenge') {
+      return null;
+    }
+
+    const fragment = new Uint8Array(await file.slice(check.offset, check.offset + check.length).arrayBuffer());
+    const nonce = fromHex(check.nonce);
+    const payload = new Uint8Array(nonce.length + fragment.length);
+    payload.set(nonce);
+    payload.set(fragment, nonce.length);
+    const proof = toHex(await window.crypto.subtle.digest('SHA-256', payload));
+
+    const response = await api.post('/files/instant-upload/', {
+      challenge_id: check.challenge_id,
+      proof,
+      original_name: originalName,
+      comment,
+    });
+    return response.status === 201 ? response.data : null;
+  } catch (error) {
+    // Нехватка места — окончательный отказ, остальные ошибки — повод загрузить файл полностью
+    if (error.response?.status === 507) {
+      throw error;
+    }
+    console.warn('Загрузка без передачи данных недоступна, файл будет загружен полностью:', error);
+    return null;
+  }
+};
+
+// Файлы больше этого размера загружаются частями (MAX_UPLOAD_SIZE сервера)
+export const MULTIPART_THRESHOLD = 50 * 1024 * 1024;
+const MULTIPART_CONCURRENCY = 4;
+const MULTIPART_RETRIES = 3;
+
+// Загрузка большого файла частями: части отправляются параллельно в
+// MULTIPART_CONCURRENCY соединений с SHA-256 в заголовке X-Content-SHA256,
+// неудачная часть повторяется до MULTIPART_RETRIES раз. После ошибки
+// загрузка отменяется, чтобы не держать резерв квоты до истечения срока.
+export const uploadFileInParts = async (file, originalName, comment = '', onProgress) => {
+  // Без crypto.subtle хеши частей не посчитать, а без них сервер части не примет.
+  // Проверяется до начала загрузки, чтобы не резервировать квоту впустую
+  if (!window.crypto?.subtle) {
+    throw new Error(
+      'Браузер не может загрузить большой файл: расчет SHA-256 (crypto.subtle) доступен только на страницах, открытых по HTTPS или с localhost.'
+    );
+  }
+  const { data: upload } = await api.post('/files/multipart/', {
+    original_name: originalName,
+    size: file.size,
+    comment,
+  });
+  const base = `/files/multipart/${upload.upload_id}`;
+  const manifest = new Array(upload.parts_count);
+  let uploaded = 0;
+  let next = 1;
+
+  const sendPart = async (number) => {
+    const start = (number - 1) * upload.part_size;
+    const body = await file.slice(start, Math.min(start + upload.part_size, file.size)).arrayBuffer();
+    const sha256 = toHex(await window.crypto.subtle.digest('SHA-256', body));
+    for (let attempt = 1; ; attempt += 1) {
+      try {
+        await api.put(`${base}/parts/${number}/`, body, {
+          headers: { 'Content-Type': 'application/octet-stream', 'X-Content-SHA256': sha256 },
+        });
+        break;
+      } catch (error) {
+        if (attempt >= MULTIPART_RETRIES || (error.response && error.response.status !== 400 && error.response.status < 500)) {
+          throw error;
+        }
+      }
+    }
+    manifest[number - 1] = { number, sha256 };
+    uploaded += body.byteLength;
+    if (onProgress) {
+      onProgress(Math.round((uploaded * 100) / file.size));
+    }
+  };
+
+  const worker = async () => {
+    while (next <= upload.parts_count) {
+      const number = next;
+      next += 1;
+      await sendPart(number);
+    }
+  };
+
+  try {
+    await Promise.all(Array.from({ length: Math.min(MULTIPART_CONCURRENCY, upload.parts_count) }, worker));
+    const response = await api.post(`${base}/complete/`, { parts: manifest });
+    return response.data;
+  } catch (error) {
+    console.error('Ошибка при загрузке файла частями:', error);
+    await api.delete(`${base}/`).catch(() => {});
+    throw error;
+  }
+};
+
 export const deleteFile = async (id) => {
   try {
     await api.delete(`/files/${id}/`);
@@ -19,3 +19,12 @@ export const getUserFiles = async (userId) => {
   const response = await api.get(`/files/?owner=${userId}`);
   return response.data;
 };
+
+export const getStorageAnalytics = async (userId = null, days = 30) => {
+  const params = { days };
+  if (userId) {
+    params.user = userId;
+  }
+  const response = await api.get('/analytics/storage/', { params });
+  return response.data;
+};